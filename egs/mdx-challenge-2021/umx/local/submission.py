@@ -14,6 +14,10 @@ parser.add_argument('--n_fft', type=int, default=4096, help='FFT length')
 parser.add_argument('--hop_length', type=int, default=1024, help='Hop length')
 parser.add_argument('--window_fn', type=str, default='hann', help='Window function')
 parser.add_argument('--sources', type=str, default="[bass,drums,other,vocals]", help='Source names')
+parser.add_argument('--max_batch_size', type=int, default=4, help='Maximum number of patches processed at once. 0: All patches of a song are processed at once.')
+parser.add_argument('--memory_budget', type=float, default=0, help='Memory budget [MiB] of input and estimated patches processed at once. 0: No limitation.')
+parser.add_argument('--quantized', type=int, default=0, help='0: Use models as they are, 1: Quantize fp32 models into int8 by dynamic quantization. int8 models made by quantize.py are loaded as they are.')
+parser.add_argument('--dtype', type=str, default='fp32', choices=['fp32', 'bf16', 'fp16'], help='Precision of model body. STFT, iSTFT, and Wiener filter are computed in fp32.')
 parser.add_argument('--model_dir', type=str, default='./tmp', help='Path to model.')
 
 def main(args):
@@ -7,6 +7,7 @@ import torch.nn.functional as F
 
 from evaluator.music_demixing import MusicDemixingPredictor
 from utils.audio import build_window
+from utils.model import estimate_sources_amplitude_by_patch
 from algorithm.frequency_mask import multichannel_wiener_filter
 from models.umx import OpenUnmix, ParallelOpenUnmix
 
@@ -14,7 +15,7 @@ __sources__ = ['bass', 'drums', 'other', 'vocals']
 BITS_PER_SAMPLE = 16
 EPS = 1e-12
 
-def separate(waveform, umx, n_fft=4096, hop_length=1024, window_fn='hann', patch_size=256, sources=__sources__, iteration_wfm=1, device="cpu"):
+def separate(waveform, umx, n_fft=4096, hop_length=1024, window_fn='hann', patch_size=256, sources=__sources__, iteration_wfm=1, max_batch_size=4, memory_budget=None, dtype='fp32', device="cpu"):
     """
     Args:
         waveform <torch.Tensor>: Mixture waveform with shape of (2, T).
@@ -25,6 +26,9 @@ def separate(waveform, umx, n_fft=4096, hop_length=1024, window_fn='hann', patch
         patch_size <int>: Default: 256
         sources <list<str>>: Target sources.
         iteration_wfm <int>: Iterations of Wiener Filter Mask.
+        max_batch_size <int>: Maximum number of patches processed at once. If None or 0, all patches are processed at once.
+        memory_budget <float>: Memory budget [MiB] of input and estimated patches processed at once. If None or 0, memory budget is not considered.
+        dtype <str>: Precision of model body. 'fp32', 'bf16', or 'fp16'. STFT, iSTFT, and Wiener filter are computed in fp32.
         device <str>: Only supports "cpu".
     Returns:
         estimates <dict<torch.Tensor>>: All estimates obtained by the separation model.
@@ -45,23 +49,9 @@ def separate(waveform, umx, n_fft=4096, hop_length=1024, window_fn='hann', patch
     with torch.no_grad():
         batch_size, _, _, n_bins, n_frames = mixture.size()
 
-        mixture_amplitude = torch.abs(mixture)
+        mixture_amplitude = torch.abs(mixture) # (batch_size, 1, n_mics, n_bins, n_frames)
 
-        estimated_sources_amplitude = {
-            target: [] for target in sources
-        }
-
-        # Serial operation
-        for _mixture_amplitude in mixture_amplitude:
-            # _mixture_amplitude: (1, n_mics, n_bins, n_frames)
-            for target in sources:
-                _estimated_source_amplitude = umx(_mixture_amplitude, target=target)
-                estimated_sources_amplitude[target].append(_estimated_source_amplitude)
-
-        estimated_sources_amplitude = [
-            torch.cat(estimated_sources_amplitude[target], dim=0).unsqueeze(dim=0) for target in sources
-        ]
-        estimated_sources_amplitude = torch.cat(estimated_sources_amplitude, dim=0) # (n_sources, batch_size, n_mics, n_bins, n_frames)
+        estimated_sources_amplitude = estimate_sources_amplitude_by_patch(umx, mixture_amplitude, sources, batch_size=max_batch_size, memory_budget=memory_budget, dtype=dtype) # (n_sources, batch_size, n_mics, n_bins, n_frames)
         estimated_sources_amplitude = estimated_sources_amplitude.permute(0, 2, 3, 1, 4).reshape(n_sources, n_mics, n_bins, batch_size * n_frames) # (n_sources, n_mics, n_bins, batch_size * n_frames)
         mixture = mixture.permute(1, 2, 3, 0, 4).reshape(1, n_mics, n_bins, batch_size * n_frames) # (1, n_mics, n_bins, batch_size * n_frames)
 
@@ -93,6 +83,10 @@ class UMXPredictor(MusicDemixingPredictor):
         self.sources = args.sources
         self.model_dir = args.model_dir
 
+        self.max_batch_size, self.memory_budget = args.max_batch_size, args.memory_budget
+        self.quantized = args.quantized
+        self.dtype = args.dtype
+
     def prediction_setup(self):
         modules = {}
 
@@ -100,7 +94,7 @@ class UMXPredictor(MusicDemixingPredictor):
             model_path = os.path.join(self.model_dir, "{}.pth".format(source))
             if not os.path.exists(model_path):
                 raise FileNotFoundError("Cannot find {}.".format(model_path))
-            modules[source] = OpenUnmix.build_model(model_path, load_state_dict=True)
+            modules[source] = OpenUnmix.build_model(model_path, load_state_dict=True, quantized=self.quantized)
 
         self.separator = ParallelOpenUnmix(modules)
         self.separator.eval()
@@ -112,7 +106,7 @@ class UMXPredictor(MusicDemixingPredictor):
         waveform, rate = torchaudio.load(mixture_file_path)
 
         # Step 2: Perform separation (includes pad and crop)
-        estimates = separate(waveform, self.separator, n_fft=self.n_fft, hop_length=self.hop_length, window_fn=self.window_fn, patch_size=self.patch_size, sources=self.sources)
+        estimates = separate(waveform, self.separator, n_fft=self.n_fft, hop_length=self.hop_length, window_fn=self.window_fn, patch_size=self.patch_size, sources=self.sources, max_batch_size=self.max_batch_size, memory_budget=self.memory_budget, dtype=self.dtype)
 
         # Step 3: Store results
         target_file_map = {
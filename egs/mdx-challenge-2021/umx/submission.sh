@@ -9,6 +9,11 @@ window_fn='hann'
 sample_rate=44100
 duration=6
 
+max_batch_size=4
+memory_budget=0 # [MiB], 0 is handled as no limitation
+quantized=0 # If 1, fp32 models are quantized into int8 at setup.
+dtype='fp32' # 'fp32', 'bf16', or 'fp16'. Precision of model body.
+
 model_choice='best'
 model_dir="./pretrained/paper-musdb18/${model_choice}" # `model_dir` must includes "bass.pth", "drums.pth", "other.pth", and "vocals.pth".
 
@@ -18,4 +23,8 @@ submission.py \
 --n_fft ${n_fft} \
 --hop_length ${hop_length} \
 --window_fn ${window_fn} \
+--max_batch_size ${max_batch_size} \
+--memory_budget ${memory_budget} \
+--quantized ${quantized} \
+--dtype ${dtype} \
 --model_dir ${model_dir}
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
 import time
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import musdb
 import museval
@@ -290,7 +292,10 @@ class EvaluaterBase:
             self.json_dir = os.path.abspath(args.json_dir)
             os.makedirs(self.json_dir, exist_ok=True)
 
+        self.n_eval_workers = args.n_eval_workers
+
         self.use_norbert = args.use_norbert
+        self.wiener_memory_budget = args.wiener_memory_budget
 
         if self.use_norbert:
             try:
@@ -299,42 +304,149 @@ class EvaluaterBase:
                 raise ImportError("Cannot import norbert.")
 
     def run(self):
-        mus = musdb.DB(root=self.musdb18_root, subsets='test', is_wav=True)
+        results = evaluate_all_tracks(self.musdb18_root, self.estimates_dir, self.sources, json_dir=self.json_dir, n_workers=self.n_eval_workers)
+
+        print(results)
 
-        results = museval.EvalStore(frames_agg='median', tracks_agg='median')
+    def apply_multichannel_wiener_filter(self, mixture, estimated_sources_amplitude, channels_first=True, eps=EPS):
+        if self.use_norbert:
+            estimated_sources = apply_multichannel_wiener_filter_norbert(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
+        else:
+            estimated_sources = apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, channels_first=channels_first, memory_budget=self.wiener_memory_budget, eps=eps)
 
-        for track in mus.tracks:
-            name = track.name
+        return estimated_sources
 
-            estimates = {}
-            estimated_accompaniment = 0
+def evaluate_all_tracks(musdb18_root, estimates_dir, sources, json_dir=None, n_workers=1, add_accompaniment=True):
+    """
+    Evaluates estimations of MUSDB18 test tracks by museval.
+    Args:
+        musdb18_root <str>: Path to MUSDB18
+        estimates_dir <str>: Directory which includes <track name>/<source>.wav
+        sources <list<str>>: Source names
+        json_dir <str>: Directory to save scores of each track. Tracks whose scores already exist in json_dir and are newer than estimations are not evaluated again.
+        n_workers <int>: Number of processes for evaluation. If n_workers <= 1, tracks are evaluated in main process.
+        add_accompaniment <bool>: If True, sum of non-vocal estimations is evaluated as accompaniment.
+    Returns:
+        results <museval.EvalStore>: Scores of all tracks.
+    """
+    mus = musdb.DB(root=musdb18_root, subsets='test', is_wav=True)
+    results = museval.EvalStore(frames_agg='median', tracks_agg='median')
 
-            for target in self.sources:
-                estimated_path = os.path.join(self.estimates_dir, name, "{}.wav".format(target))
-                estimated, _ = torchaudio.load(estimated_path)
-                estimated = estimated.numpy().transpose(1, 0)
-                estimates[target] = estimated
-                if target != 'vocals':
-                    estimated_accompaniment += estimated
+    track_indices = []
 
-            estimates['accompaniment'] = estimated_accompaniment
+    for track_idx, track in enumerate(mus.tracks):
+        json_path = None if json_dir is None else os.path.join(json_dir, track.subset, "{}.json".format(track.name))
+        estimated_paths = [os.path.join(estimates_dir, track.name, "{}.wav".format(target)) for target in sources]
+        scores = load_track_scores(json_path, track.name, estimated_paths=estimated_paths)
 
-            # Evaluate using museval
-            scores = museval.eval_mus_track(track, estimates, output_dir=self.json_dir)
+        if scores is None:
+            track_indices.append(track_idx)
+        else:
+            results.add_track(scores)
+            print(track.name)
+            print("Loaded scores from {}".format(json_path), flush=True)
+
+    if n_workers is None or n_workers <= 1:
+        for track_idx in track_indices:
+            track = mus.tracks[track_idx]
+            scores = evaluate_track(track, estimates_dir, sources, json_dir=json_dir, add_accompaniment=add_accompaniment)
             results.add_track(scores)
 
-            print(name)
+            print(track.name)
             print(scores, flush=True)
+    elif len(track_indices) > 0:
+        # Each process opens MUSDB18 once, and only track indices are sent to processes.
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_evaluation_worker, initargs=(musdb18_root,)) as executor:
+            futures = []
 
-        print(results)
+            for track_idx in track_indices:
+                future = executor.submit(_evaluate_track_in_worker, track_idx, estimates_dir, sources, json_dir=json_dir, add_accompaniment=add_accompaniment)
+                futures.append(future)
 
-    def apply_multichannel_wiener_filter(self, mixture, estimated_sources_amplitude, channels_first=True, eps=EPS):
-        if self.use_norbert:
-            estimated_sources = apply_multichannel_wiener_filter_norbert(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
-        else:
-            estimated_sources = apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
+            for future in as_completed(futures):
+                name, scores = future.result()
+                results.add_track(scores)
 
-        return estimated_sources
+                print(name)
+                print(scores, flush=True)
+
+    return results
+
+def evaluate_track(track, estimates_dir, sources, json_dir=None, add_accompaniment=True):
+    """
+    Args:
+        track <musdb.MultiTrack>: Track in MUSDB18
+        estimates_dir <str>: Directory which includes <track name>/<source>.wav
+        sources <list<str>>: Source names
+        json_dir <str>: Directory to save scores.
+        add_accompaniment <bool>: If True, sum of non-vocal estimations is evaluated as accompaniment.
+    Returns:
+        scores <museval.TrackStore>: Scores of track.
+    """
+    name = track.name
+
+    estimates = {}
+    estimated_accompaniment = 0
+
+    for target in sources:
+        estimated_path = os.path.join(estimates_dir, name, "{}.wav".format(target))
+        estimated, _ = torchaudio.load(estimated_path)
+        estimated = estimated.numpy().transpose(1, 0)
+        estimates[target] = estimated
+        if target != 'vocals':
+            estimated_accompaniment += estimated
+
+    if add_accompaniment:
+        estimates['accompaniment'] = estimated_accompaniment
+
+    # Evaluate using museval
+    scores = museval.eval_mus_track(track, estimates, output_dir=json_dir)
+
+    return scores
+
+def load_track_scores(json_path, name, estimated_paths=None):
+    """
+    Args:
+        json_path <str>: Path to scores saved by museval.eval_mus_track.
+        name <str>: Track name
+        estimated_paths <list<str>>: Paths to estimations evaluated in json_path.
+    Returns:
+        scores <pandas.DataFrame>: Scores of track. If json_path does not exist, is broken, or is older than any of estimated_paths, returns None.
+    """
+    if json_path is None or not os.path.exists(json_path):
+        return None
+
+    if estimated_paths is not None:
+        # Scores of previous estimations are stale, e.g. estimate_all is run again with another model.
+        mtime = os.path.getmtime(json_path)
+
+        for estimated_path in estimated_paths:
+            if os.path.exists(estimated_path) and os.path.getmtime(estimated_path) > mtime:
+                return None
+
+    try:
+        with open(json_path) as f:
+            json_string = json.load(f)
+        scores = museval.json2df(json_string, name)
+    except (ValueError, KeyError):
+        # e.g. file is left incomplete by interrupted evaluation.
+        return None
+
+    return scores
+
+_musdb18_test = None
+
+def _init_evaluation_worker(musdb18_root):
+    global _musdb18_test
+
+    torch.set_num_threads(1)
+    _musdb18_test = musdb.DB(root=musdb18_root, subsets='test', is_wav=True)
+
+def _evaluate_track_in_worker(track_idx, estimates_dir, sources, json_dir=None, add_accompaniment=True):
+    track = _musdb18_test.tracks[track_idx]
+    scores = evaluate_track(track, estimates_dir, sources, json_dir=json_dir, add_accompaniment=add_accompaniment)
+
+    return track.name, scores
 
 def apply_multichannel_wiener_filter_norbert(mixture, estimated_sources_amplitude, iteration=1, channels_first=True, eps=EPS):
     """
@@ -371,7 +483,7 @@ def apply_multichannel_wiener_filter_norbert(mixture, estimated_sources_amplitud
 
     return estimated_sources
 
-def apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, iteration=1, channels_first=True, eps=EPS):
+def apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, iteration=1, channels_first=True, memory_budget=None, eps=EPS):
     """
     Multichannel Wiener filter.
     Implementation is based on norbert package.
@@ -380,6 +492,7 @@ def apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude,
         estimated_sources_amplitude <torch.Tensor>: (n_sources, n_channels, n_bins, n_frames) or (batch_size, n_sources, n_channels, n_bins, n_frames)
         iteration <int>: Iteration of EM algorithm updates
         channels_first <bool>: Only supports True
+        memory_budget <float>: Memory budget [MiB] of intermediate tensors in one chunk of frames. If None or 0, all frames are processed at once.
         eps <float>: small value for numerical stability
     """
-    return multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=iteration, channels_first=channels_first, eps=eps)
+    return multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=iteration, channels_first=channels_first, memory_budget=memory_budget, eps=eps)
@@ -1,13 +1,12 @@
 import os
 
-import musdb
-import museval
 import torch
 import torchaudio
 import torch.nn as nn
 import torch.nn.functional as F
 
 from driver import TrainerBase, TesterBase
+from driver import evaluate_all_tracks
 
 BITS_PER_SAMPLE_MUSDB18 = 16
 EPS = 1e-12
@@ -236,6 +235,7 @@ class AdhocTester(TesterBase):
             os.makedirs(self.json_dir, exist_ok=True)
 
         self.use_estimate_all, self.use_evaluate_all = args.estimate_all, args.evaluate_all
+        self.n_eval_workers = args.n_eval_workers
 
         self.use_cuda = args.use_cuda
 
@@ -350,31 +350,6 @@ class AdhocTester(TesterBase):
         print(s, flush=True)
 
     def evaluate_all(self):
-        mus = musdb.DB(root=self.musdb18_root, subsets='test', is_wav=True)
-
-        results = museval.EvalStore(frames_agg='median', tracks_agg='median')
-
-        for track in mus.tracks:
-            name = track.name
-
-            estimates = {}
-            estimated_accompaniment = 0
-
-            for target in self.sources:
-                estimated_path = os.path.join(self.estimates_dir, name, "{}.wav".format(target))
-                estimated, _ = torchaudio.load(estimated_path)
-                estimated = estimated.numpy().transpose(1, 0)
-                estimates[target] = estimated
-                if target != 'vocals':
-                    estimated_accompaniment += estimated
-
-            estimates['accompaniment'] = estimated_accompaniment
-
-            # Evaluate using museval
-            scores = museval.eval_mus_track(track, estimates, output_dir=self.json_dir)
-            results.add_track(scores)
-
-            print(name)
-            print(scores, flush=True)
+        results = evaluate_all_tracks(self.musdb18_root, self.estimates_dir, self.sources, json_dir=self.json_dir, n_workers=self.n_eval_workers)
 
         print(results)
\ No newline at end of file
@@ -54,6 +54,7 @@ epochs=100
 
 estimate_all=1
 evaluate_all=1
+n_eval_workers=1 # Number of processes for museval evaluation
 
 use_cuda=1
 seed=111
@@ -111,5 +112,6 @@ test.py \
 --model_path "${model_path}" \
 --estimate_all ${estimate_all} \
 --evaluate_all ${evaluate_all} \
+--n_eval_workers ${n_eval_workers} \
 --use_cuda ${use_cuda} \
 --seed ${seed} | tee "${log_dir}/test_${time_stamp}.log"
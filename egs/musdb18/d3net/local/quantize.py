@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import argparse
+
+import torch
+
+from utils.utils import set_seed
+from utils.model import load_checkpoint
+from transforms.stft import istft
+from adhoc_dataset import SpectrogramEvalDataset
+from models.d3net import D3Net, QuantizableD3Net
+from criterion.sdr import sdr
+
+parser = argparse.ArgumentParser(description="Post training static quantization of D3Net")
+
+parser.add_argument('--musdb18_root', type=str, default=None, help='Path to MUSDB18')
+parser.add_argument('--sample_rate', '-sr', type=int, default=44100, help='Sampling rate')
+parser.add_argument('--patch_size', type=int, default=256, help='Patch size')
+parser.add_argument('--valid_duration', type=float, default=30, help='Max duration of each track for calibration and evaluation')
+parser.add_argument('--n_fft', type=int, default=4096, help='FFT length')
+parser.add_argument('--hop_length', type=int, default=1024, help='Hop length')
+parser.add_argument('--window_fn', type=str, default='hann', help='Window function')
+parser.add_argument('--sources', type=str, default="[bass,drums,other,vocals]", help='Source names')
+parser.add_argument('--model_dir', type=str, default=None, help='Directory which includes drums/<model_choice>.pth, ..., vocals/<model_choice>.pth')
+parser.add_argument('--model_choice', type=str, default='last', choices=['best', 'last'], help='Model choice. Default: last')
+parser.add_argument('--quantized_model_dir', type=str, default=None, help='Directory to save quantized models')
+parser.add_argument('--n_calibration_tracks', type=int, default=4, help='# of validation tracks used for calibration')
+parser.add_argument('--n_evaluation_tracks', type=int, default=4, help='# of validation tracks used to compare int8 model with fp32 model')
+parser.add_argument('--max_batch_size', type=int, default=4, help='Maximum number of patches processed at once')
+parser.add_argument('--backend', type=str, default='fbgemm', choices=['fbgemm', 'qnnpack'], help='Quantization backend. fbgemm: x86, qnnpack: ARM')
+parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+def main(args):
+    set_seed(args.seed)
+
+    args.sources = args.sources.replace('[', '').replace(']', '').split(',')
+    max_samples = int(args.valid_duration * args.sample_rate)
+
+    dataset = SpectrogramEvalDataset(args.musdb18_root, n_fft=args.n_fft, hop_length=args.hop_length, window_fn=args.window_fn, sample_rate=args.sample_rate, patch_size=args.patch_size, max_samples=max_samples, sources=args.sources, target=args.sources)
+    n_tracks = args.n_calibration_tracks + args.n_evaluation_tracks
+
+    assert n_tracks <= len(dataset), "# of calibration and evaluation tracks must be less than or equal to {}.".format(len(dataset))
+
+    calibration_data, evaluation_data = [], []
+
+    for idx in range(n_tracks):
+        mixture, sources, name = dataset[idx]
+
+        if idx < args.n_calibration_tracks:
+            mixture_amplitude = torch.abs(mixture.squeeze(dim=1)) # (n_patches, n_mics, n_bins, patch_size)
+            calibration_data += torch.split(mixture_amplitude, args.max_batch_size, dim=0)
+        else:
+            evaluation_data.append((mixture, sources, name))
+
+    print("Calibration: {} tracks, Evaluation: {} tracks".format(args.n_calibration_tracks, args.n_evaluation_tracks), flush=True)
+
+    s = "Target, Time (fp32) [sec], Time (int8) [sec], Speed up, SDR (fp32) [dB], SDR (int8) [dB], SDR delta [dB]"
+    print(s, flush=True)
+
+    for source_idx, target in enumerate(args.sources):
+        model_path = os.path.join(args.model_dir, target, "{}.pth".format(args.model_choice))
+        package = dict(load_checkpoint(model_path)) # Shallow copy, because loaded checkpoint is shared by cache.
+
+        model = D3Net.build_model(model_path, load_state_dict=True)
+        model.eval()
+
+        quantizable_model = QuantizableD3Net.build_from_float(model)
+        quantized_model = quantizable_model.quantize(calibration_data, backend=args.backend)
+
+        elapsed = {'fp32': 0, 'int8': 0}
+        sdr_score = {'fp32': [], 'int8': []}
+
+        with torch.no_grad():
+            for mixture, sources, name in evaluation_data:
+                """
+                    mixture: (n_patches, 1, n_mics, n_bins, patch_size)
+                    sources: (n_patches, n_sources, n_mics, n_bins, patch_size)
+                """
+                n_patches, _, n_mics, n_bins, patch_size = mixture.size()
+
+                mixture = mixture.squeeze(dim=1)
+                mixture_amplitude, mixture_angle = torch.abs(mixture), torch.angle(mixture)
+                source = sources[:, source_idx]
+
+                source = source.permute(1, 2, 0, 3).reshape(n_mics, n_bins, n_patches * patch_size)
+                source = istft(source, args.n_fft, hop_length=args.hop_length, window=dataset.window, normalized=dataset.normalize, return_complex=False) # (n_mics, T)
+
+                for key, _model in zip(['fp32', 'int8'], [model, quantized_model]):
+                    start = time.perf_counter()
+                    estimated_amplitude = []
+
+                    for _mixture_amplitude in torch.split(mixture_amplitude, args.max_batch_size, dim=0):
+                        _estimated_amplitude = _model(_mixture_amplitude)
+                        estimated_amplitude.append(_estimated_amplitude)
+
+                    estimated_amplitude = torch.cat(estimated_amplitude, dim=0) # (n_patches, n_mics, n_bins, patch_size)
+                    elapsed[key] += time.perf_counter() - start
+
+                    estimated_source = estimated_amplitude * torch.exp(1j * mixture_angle)
+                    estimated_source = estimated_source.permute(1, 2, 0, 3).reshape(n_mics, n_bins, n_patches * patch_size)
+                    estimated_source = istft(estimated_source, args.n_fft, hop_length=args.hop_length, window=dataset.window, normalized=dataset.normalize, return_complex=False) # (n_mics, T)
+
+                    sdr_score[key].append(sdr(estimated_source, source).mean().item())
+
+        sdr_fp32 = sum(sdr_score['fp32']) / len(sdr_score['fp32'])
+        sdr_int8 = sum(sdr_score['int8']) / len(sdr_score['int8'])
+
+        s = "{}, {:.3f}, {:.3f}, {:.2f}, {:.3f}, {:.3f}, {:+.3f}".format(target, elapsed['fp32'], elapsed['int8'], elapsed['fp32'] / elapsed['int8'], sdr_fp32, sdr_int8, sdr_int8 - sdr_fp32)
+        print(s, flush=True)
+
+        package['state_dict'] = quantized_model.state_dict()
+        package['quantized'] = True
+        package['backend'] = args.backend
+
+        quantized_model_path = os.path.join(args.quantized_model_dir, target, "{}.pth".format(args.model_choice))
+        os.makedirs(os.path.dirname(quantized_model_path), exist_ok=True)
+        torch.save(package, quantized_model_path)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
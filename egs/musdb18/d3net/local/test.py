@@ -10,7 +10,7 @@ import torch.nn as nn
 from utils.utils import set_seed
 from adhoc_dataset import SpectrogramTestDataset, TestDataLoader
 from adhoc_driver import AdhocTester
-from models.d3net import D3Net, ParallelD3Net
+from models.d3net import D3Net, QuantizableD3Net, ParallelD3Net
 from criterion.distance import MeanSquaredError
 
 parser = argparse.ArgumentParser(description="Evaluation of D3Net")
@@ -29,7 +29,14 @@ parser.add_argument('--json_dir', type=str, default=None, help='Json directory')
 parser.add_argument('--model_choice', type=str, default='last', choices=['best', 'last'], help='Model choice. Default: last')
 parser.add_argument('--estimate_all', type=int, default=1, help='Estimates all songs. GPU is required if use_cuda=1.')
 parser.add_argument('--evaluate_all', type=int, default=1, help='Evaluates all estimations. GPU is NOT required.')
+parser.add_argument('--n_eval_workers', type=int, default=1, help='# of processes used to evaluate tracks by museval. Tracks whose scores in json_dir are newer than their estimations are skipped.')
+parser.add_argument('--max_batch_size', type=int, default=4, help='Maximum number of patches processed at once in estimation. 0: All patches of a song are processed at once.')
+parser.add_argument('--memory_budget', type=float, default=0, help='Memory budget [MiB] of input and estimated patches processed at once. 0: No limitation.')
+parser.add_argument('--dtype', type=str, default='fp32', choices=['fp32', 'bf16', 'fp16'], help='Precision of model body in estimation. STFT, iSTFT, and Wiener filter are computed in fp32.')
+parser.add_argument('--compare_fp32', type=int, default=0, help='If 1 and dtype is not fp32, fp32 estimates are also computed and SDR of estimates against them is reported. Estimation takes about twice as long.')
 parser.add_argument('--use_norbert', type=int, default=0, help='Use norbert.wiener for multichannel wiener filetering. 0: Not use norbert, 1: Use norbert (you have to install norbert)')
+parser.add_argument('--wiener_memory_budget', type=float, default=0, help='Memory budget [MiB] of intermediate tensors in multichannel Wiener filter, which is applied to chunks of frames. 0: No limitation.')
+parser.add_argument('--quantized', type=int, default=0, help='0: Use fp32 models, 1: Use int8 models made by quantize.py. Only CPU is supported.')
 parser.add_argument('--use_cuda', type=int, default=1, help='0: Not use cuda, 1: Use cuda')
 parser.add_argument('--seed', type=int, default=42, help='Random seed')
 
@@ -43,10 +50,20 @@ def main(args):
 
     loader = TestDataLoader(test_dataset, batch_size=1, shuffle=False)
 
+    if args.quantized and args.use_cuda:
+        raise ValueError("Quantized model supports only CPU.")
+
+    if args.quantized and args.dtype != 'fp32':
+        raise ValueError("Quantized model supports only dtype='fp32'.")
+
     modules = {}
     for source in args.sources:
         model_path = os.path.join(args.model_dir, source, "{}.pth".format(args.model_choice))
-        modules[source] = D3Net.build_model(model_path)
+
+        if args.quantized:
+            modules[source] = QuantizableD3Net.build_model(model_path)
+        else:
+            modules[source] = D3Net.build_model(model_path)
 
     model = ParallelD3Net(modules)
 
@@ -0,0 +1,82 @@
+#!/bin/bash
+
+exp_dir="./exp"
+tag=""
+
+sources="[bass,drums,other,vocals]"
+patch=256
+valid_duration=30
+
+musdb18_root="../../../dataset/MUSDB18"
+sample_rate=44100
+
+window_fn='hann'
+n_fft=4096
+hop_length=1024
+
+# Criterion
+criterion='mse'
+
+# Optimizer
+optimizer='adam'
+lr=1e-3
+anneal_lr=1e-4
+weight_decay=0
+max_norm=0 # 0 is handled as no clipping
+
+batch_size=6
+samples_per_epoch=6400 # If you specified samples_per_epoch=-1, samples_per_epoch is computed as 3863, which corresponds to total duration of training data.
+epochs=50
+anneal_epoch=40
+
+# Quantization
+n_calibration_tracks=4 # Validation tracks used for calibration
+n_evaluation_tracks=4 # Validation tracks used to compare int8 model with fp32 model
+max_batch_size=4 # Maximum number of patches processed at once
+backend='fbgemm' # 'fbgemm' (x86) or 'qnnpack' (ARM)
+
+seed=111
+
+model_choice="best" # 'last' or 'best'
+
+. ./path.sh
+. parse_options.sh || exit 1
+
+if [ -z "${tag}" ]; then
+    save_dir="${exp_dir}/sr${sample_rate}/${sources}/patch${patch}/${criterion}/stft${n_fft}-${hop_length}_${window_fn}-window"
+    if [ ${samples_per_epoch} -gt 0 ]; then
+        save_dir="${save_dir}/b${batch_size}_e${epochs}-${anneal_epoch}-s${samples_per_epoch}_${optimizer}-lr${lr}-${anneal_lr}-decay${weight_decay}_clip${max_norm}/seed${seed}"
+    else
+        save_dir="${save_dir}/b${batch_size}_e${epochs}-${anneal_epoch}_${optimizer}-lr${lr}-${anneal_lr}-decay${weight_decay}_clip${max_norm}/seed${seed}"
+    fi
+else
+    save_dir="${exp_dir}/${tag}"
+fi
+
+model_dir="${save_dir}/model"
+quantized_model_dir="${save_dir}/model_int8"
+log_dir="${save_dir}/log/quantize/${model_choice}"
+
+if [ ! -e "${log_dir}" ]; then
+    mkdir -p "${log_dir}"
+fi
+
+time_stamp=`date "+%Y%m%d-%H%M%S"`
+
+quantize.py \
+--musdb18_root ${musdb18_root} \
+--sample_rate ${sample_rate} \
+--patch_size ${patch} \
+--valid_duration ${valid_duration} \
+--window_fn "${window_fn}" \
+--n_fft ${n_fft} \
+--hop_length ${hop_length} \
+--sources ${sources} \
+--model_dir "${model_dir}" \
+--model_choice "${model_choice}" \
+--quantized_model_dir "${quantized_model_dir}" \
+--n_calibration_tracks ${n_calibration_tracks} \
+--n_evaluation_tracks ${n_evaluation_tracks} \
+--max_batch_size ${max_batch_size} \
+--backend "${backend}" \
+--seed ${seed} | tee "${log_dir}/quantize_${time_stamp}.log"
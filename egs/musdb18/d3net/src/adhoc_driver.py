@@ -1,16 +1,17 @@
 import os
 import time
 
-import musdb
-import museval
 import torch
 import torchaudio
 import torch.nn as nn
 
 from utils.utils import draw_loss_curve
+from utils.model import load_checkpoint, estimate_sources_amplitude_by_patch
 from transforms.stft import istft
+from criterion.sdr import sdr
 from driver import apply_multichannel_wiener_filter_norbert, apply_multichannel_wiener_filter_torch
 from driver import TrainerBase, TesterBase
+from driver import evaluate_all_tracks
 
 BITS_PER_SAMPLE_MUSDB18 = 16
 EPS = 1e-12
@@ -245,15 +246,21 @@ class AdhocTester(TesterBase):
             os.makedirs(self.json_dir, exist_ok=True)
 
         self.use_estimate_all, self.use_evaluate_all = args.estimate_all, args.evaluate_all
+        self.n_eval_workers = args.n_eval_workers
+
+        self.max_batch_size, self.memory_budget = args.max_batch_size, args.memory_budget
+        self.dtype = args.dtype
+        self.compare_fp32 = args.compare_fp32 and self.dtype != 'fp32'
 
         self.use_cuda = args.use_cuda
         self.use_norbert = args.use_norbert
+        self.wiener_memory_budget = args.wiener_memory_budget
 
         is_data_parallel = isinstance(self.model, nn.DataParallel)
 
         for target in self.sources:
             model_path = os.path.join(self.model_dir, target, "{}.pth".format(args.model_choice))
-            config = torch.load(model_path, map_location=lambda storage, loc: storage)
+            config = load_checkpoint(model_path)
             if is_data_parallel:
                 self.model.module.net[target].load_state_dict(config['state_dict'])
             else:
@@ -276,6 +283,7 @@ class AdhocTester(TesterBase):
 
         test_loss = 0
         test_loss_improvement = 0
+        test_sdr_fp32 = 0
         n_test = len(self.loader.dataset)
 
         s = "Title, Loss:"
@@ -286,6 +294,11 @@ class AdhocTester(TesterBase):
         for target in self.sources:
             s += " ({})".format(target)
 
+        if self.compare_fp32:
+            s += ", SDR against fp32:"
+            for target in self.sources:
+                s += " ({})".format(target)
+
         print(s, flush=True)
 
         with torch.no_grad():
@@ -305,21 +318,14 @@ class AdhocTester(TesterBase):
                 mixture_amplitude = torch.abs(mixture)
                 sources_amplitude = torch.abs(sources)
 
-                estimated_sources_amplitude = {
-                    target: [] for target in self.sources
-                }
-
-                # Serial operation
-                for _mixture_amplitude in mixture_amplitude:
-                    # _mixture_amplitude: (1, n_mics, n_bins, n_frames)
-                    for target in self.sources:
-                        _estimated_sources_amplitude = self.model(_mixture_amplitude, target=target)
-                        estimated_sources_amplitude[target].append(_estimated_sources_amplitude)
-
-                estimated_sources_amplitude = [
-                    torch.cat(estimated_sources_amplitude[target], dim=0).unsqueeze(dim=0) for target in self.sources
-                ]
-                estimated_sources_amplitude = torch.cat(estimated_sources_amplitude, dim=0) # (n_sources, batch_size, n_mics, n_bins, n_frames)
+                # Batch operation over patches
+                estimated_sources_amplitude = estimate_sources_amplitude_by_patch(self.model, mixture_amplitude, self.sources, batch_size=self.max_batch_size, memory_budget=self.memory_budget, dtype=self.dtype) # (n_sources, batch_size, n_mics, n_bins, n_frames)
+
+                if self.compare_fp32:
+                    reference_sources_amplitude = estimate_sources_amplitude_by_patch(self.model, mixture_amplitude, self.sources, batch_size=self.max_batch_size, memory_budget=self.memory_budget) # (n_sources, batch_size, n_mics, n_bins, n_frames)
+                    reference_sources_amplitude = reference_sources_amplitude.permute(0, 2, 3, 1, 4)
+                    reference_sources_amplitude = reference_sources_amplitude.reshape(n_sources, n_mics, n_bins, batch_size * n_frames).cpu() # (n_sources, n_mics, n_bins, T_pad)
+
                 estimated_sources_amplitude = estimated_sources_amplitude.permute(0, 2, 3, 1, 4)
                 estimated_sources_amplitude = estimated_sources_amplitude.reshape(n_sources, n_mics, n_bins, batch_size * n_frames) # (n_sources, n_mics, n_bins, T_pad)
 
@@ -334,12 +340,13 @@ class AdhocTester(TesterBase):
                 mixture = mixture.cpu()
                 estimated_sources_amplitude = estimated_sources_amplitude.cpu()
 
-                estimated_sources = self.apply_multichannel_wiener_filter(mixture, estimated_sources_amplitude=estimated_sources_amplitude)
-                estimated_sources_channels = estimated_sources.size()[:-2]
+                estimated_sources = self.separate(mixture, estimated_sources_amplitude) # (n_sources, n_mics, T_pad)
 
-                estimated_sources = estimated_sources.view(-1, *estimated_sources.size()[-2:])
-                estimated_sources = istft(estimated_sources, self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalize, return_complex=False)
-                estimated_sources = estimated_sources.view(*estimated_sources_channels, -1) # -> (n_sources, n_mics, T_pad)
+                if self.compare_fp32:
+                    # SDR of reduced precision estimates against fp32 estimates
+                    reference_sources = self.separate(mixture, reference_sources_amplitude) # (n_sources, n_mics, T_pad)
+                    sdr_fp32 = sdr(estimated_sources[..., :samples].reshape(n_sources, -1), reference_sources[..., :samples].reshape(n_sources, -1)) # (n_sources,)
+                    test_sdr_fp32 += sdr_fp32
 
                 track_dir = os.path.join(self.estimates_dir, name)
                 os.makedirs(track_dir, exist_ok=True)
@@ -358,6 +365,11 @@ class AdhocTester(TesterBase):
                 for idx, target in enumerate(self.sources):
                     s += " {:.3f}".format(loss_improvement[idx].item())
 
+                if self.compare_fp32:
+                    s += ", SDR against fp32:"
+                    for idx, target in enumerate(self.sources):
+                        s += " {:.3f}".format(sdr_fp32[idx].item())
+
                 print(s, flush=True)
 
                 test_loss += loss # (n_sources,)
@@ -365,6 +377,7 @@ class AdhocTester(TesterBase):
 
         test_loss /= n_test
         test_loss_improvement /= n_test
+        test_sdr_fp32 /= n_test
 
         s = "Loss:"
         for idx, target in enumerate(self.sources):
@@ -374,42 +387,39 @@ class AdhocTester(TesterBase):
         for idx, target in enumerate(self.sources):
             s += " ({}) {:.3f}".format(target, test_loss_improvement[idx].item())
 
+        if self.compare_fp32:
+            s += ", SDR against fp32:"
+            for idx, target in enumerate(self.sources):
+                s += " ({}) {:.3f}".format(target, test_sdr_fp32[idx].item())
+
         print(s, flush=True)
 
     def evaluate_all(self):
-        mus = musdb.DB(root=self.musdb18_root, subsets='test', is_wav=True)
-
-        results = museval.EvalStore(frames_agg='median', tracks_agg='median')
+        results = evaluate_all_tracks(self.musdb18_root, self.estimates_dir, self.sources, json_dir=self.json_dir, n_workers=self.n_eval_workers)
 
-        for track in mus.tracks:
-            name = track.name
-
-            estimates = {}
-            estimated_accompaniment = 0
-
-            for target in self.sources:
-                estimated_path = os.path.join(self.estimates_dir, name, "{}.wav".format(target))
-                estimated, _ = torchaudio.load(estimated_path)
-                estimated = estimated.numpy().transpose(1, 0)
-                estimates[target] = estimated
-                if target != 'vocals':
-                    estimated_accompaniment += estimated
-
-            estimates['accompaniment'] = estimated_accompaniment
+        print(results)
 
-            # Evaluate using museval
-            scores = museval.eval_mus_track(track, estimates, output_dir=self.json_dir)
-            results.add_track(scores)
+    def separate(self, mixture, estimated_sources_amplitude):
+        """
+        Args:
+            mixture (1, n_mics, n_bins, n_frames)
+            estimated_sources_amplitude (n_sources, n_mics, n_bins, n_frames)
+        Returns:
+            estimated_sources (n_sources, n_mics, T)
+        """
+        estimated_sources = self.apply_multichannel_wiener_filter(mixture, estimated_sources_amplitude=estimated_sources_amplitude)
+        estimated_sources_channels = estimated_sources.size()[:-2]
 
-            print(name)
-            print(scores, flush=True)
+        estimated_sources = estimated_sources.view(-1, *estimated_sources.size()[-2:])
+        estimated_sources = istft(estimated_sources, self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalize, return_complex=False)
+        estimated_sources = estimated_sources.view(*estimated_sources_channels, -1) # -> (n_sources, n_mics, T)
 
-        print(results)
+        return estimated_sources
 
     def apply_multichannel_wiener_filter(self, mixture, estimated_sources_amplitude, channels_first=True, eps=EPS):
         if self.use_norbert:
             estimated_sources = apply_multichannel_wiener_filter_norbert(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
         else:
-            estimated_sources = apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
+            estimated_sources = apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, channels_first=channels_first, memory_budget=self.wiener_memory_budget, eps=eps)
 
         return estimated_sources
\ No newline at end of file
@@ -29,6 +29,7 @@ parser.add_argument('--estimates_dir', type=str, default=None, help='Estimated s
 parser.add_argument('--json_dir', type=str, default=None, help='Json directory')
 parser.add_argument('--estimate_all', type=int, default=1, help='Estimates all songs. GPU is required if use_cuda=1.')
 parser.add_argument('--evaluate_all', type=int, default=1, help='Evaluates all estimations. GPU is NOT required.')
+parser.add_argument('--n_eval_workers', type=int, default=1, help='# of processes used to evaluate tracks by museval. Tracks whose scores in json_dir are newer than their estimations are skipped.')
 parser.add_argument('--use_cuda', type=int, default=1, help='0: Not use cuda, 1: Use cuda')
 parser.add_argument('--seed', type=int, default=42, help='Random seed')
 
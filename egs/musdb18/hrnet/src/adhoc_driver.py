@@ -1,8 +1,6 @@
 import os
 import time
 
-import musdb
-import museval
 import torch
 import torchaudio
 import torch.nn as nn
@@ -10,6 +8,7 @@ import torch.nn as nn
 from utils.utils import draw_loss_curve
 from transforms.stft import istft
 from driver import TrainerBase, TesterBase
+from driver import evaluate_all_tracks
 
 BITS_PER_SAMPLE_MUSDB18 = 16
 EPS = 1e-12
@@ -235,6 +234,7 @@ class SingleTargetTester(TesterBase):
             os.makedirs(self.json_dir, exist_ok=True)
         
         self.use_estimate_all, self.use_evaluate_all = args.estimate_all, args.evaluate_all
+        self.n_eval_workers = args.n_eval_workers
         
         self.use_cuda = args.use_cuda
         is_data_parallel = isinstance(self.model, nn.DataParallel)
@@ -332,26 +332,6 @@ class SingleTargetTester(TesterBase):
         print(s, flush=True)
     
     def evaluate_all(self):
-        mus = musdb.DB(root=self.musdb18_root, subsets='test', is_wav=True)
-        results = museval.EvalStore(frames_agg='median', tracks_agg='median')
-
-        target = self.target
-
-        for track in mus.tracks:
-            name = track.name
-            
-            estimated_path = os.path.join(self.estimates_dir, name, "{}.wav".format(target))
-            estimated, _ = torchaudio.load(estimated_path)
-            estimated = estimated.numpy().transpose(1, 0)
-            estimates = {
-                target: estimated
-            }
-
-            # Evaluate using museval
-            scores = museval.eval_mus_track(track, estimates, output_dir=self.json_dir)
-            results.add_track(scores)
-
-            print(name)
-            print(scores, flush=True)
+        results = evaluate_all_tracks(self.musdb18_root, self.estimates_dir, [self.target], json_dir=self.json_dir, n_workers=self.n_eval_workers, add_accompaniment=False)
 
         print(results)
\ No newline at end of file
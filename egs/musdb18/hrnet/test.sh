@@ -28,6 +28,7 @@ batch_size=5
 samples_per_epoch=6400
 epochs=1000
 
+n_eval_workers=1 # Number of processes for museval evaluation
 use_cuda=1
 seed=111
 gpu_id="0"
@@ -78,5 +79,6 @@ test.py \
 --model_path "${model_path}" \
 --estimate_all ${estimate_all} \
 --evaluate_all ${evaluate_all} \
+--n_eval_workers ${n_eval_workers} \
 --use_cuda ${use_cuda} \
 --seed ${seed} | tee "${log_dir}/test_${time_stamp}.log"
\ No newline at end of file
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import glob
+import argparse
+
+from utils.utils import set_seed
+from adhoc_service import SeparationPipeline, build_separator
+
+parser = argparse.ArgumentParser(description="Batch separation of mixtures in a directory")
+
+parser.add_argument('--input_dir', type=str, default=None, help='Directory which includes mixtures. <input_dir>/<name>/mixture.wav or <input_dir>/<name>.wav')
+parser.add_argument('--estimates_dir', type=str, default=None, help='Estimated sources are saved as <estimates_dir>/<name>/<target>.wav')
+parser.add_argument('--sample_rate', '-sr', type=int, default=44100, help='Sampling rate')
+parser.add_argument('--model_type', type=str, default='umx', choices=['umx', 'd3net', 'conv-tasnet'], help='Model type')
+parser.add_argument('--model_dir', type=str, default=None, help='Directory which includes drums/<model_choice>.pth, ..., vocals/<model_choice>.pth (umx, d3net). If not given, pretrained models are used.')
+parser.add_argument('--model_path', type=str, default=None, help='Path to model (conv-tasnet). If not given, pretrained model is used.')
+parser.add_argument('--model_choice', type=str, default='best', choices=['best', 'last'], help='Model choice. Default: best')
+parser.add_argument('--sources', type=str, default="[bass,drums,other,vocals]", help='Source names')
+parser.add_argument('--n_fft', type=int, default=4096, help='FFT length')
+parser.add_argument('--hop_length', type=int, default=1024, help='Hop length')
+parser.add_argument('--window_fn', type=str, default='hann', help='Window function')
+parser.add_argument('--duration', type=float, default=6, help='Duration of patch (umx, d3net) or segment (conv-tasnet)')
+parser.add_argument('--iteration_wfm', type=int, default=1, help='Iterations of multichannel Wiener filter')
+parser.add_argument('--max_batch_size', type=int, default=4, help='Maximum number of patches processed at once. 0: All patches of a song are processed at once.')
+parser.add_argument('--num_workers', type=str, default="[2,1,1,1,2]", help='Number of workers of decode, STFT, model, Wiener filter, and encode stages')
+parser.add_argument('--queue_size', type=int, default=4, help='Maximum number of tracks waiting between stages')
+parser.add_argument('--use_cuda', type=int, default=0, help='0: Not use cuda, 1: Use cuda')
+parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+def main(args):
+    set_seed(args.seed)
+
+    args.sources = args.sources.replace('[', '').replace(']', '').split(',')
+    args.num_workers = [int(n) for n in args.num_workers.replace('[', '').replace(']', '').split(',')]
+    samples = int(args.duration * args.sample_rate)
+    padding = 2 * (args.n_fft // 2)
+    patch_size = (samples + padding - args.n_fft) // args.hop_length + 1
+
+    separator = build_separator(
+        args.model_type, model_dir=args.model_dir, model_path=args.model_path, model_choice=args.model_choice, sources=args.sources,
+        n_fft=args.n_fft, hop_length=args.hop_length, window_fn=args.window_fn, patch_size=patch_size, segment_samples=samples,
+        iteration_wfm=args.iteration_wfm, max_batch_size=args.max_batch_size, use_cuda=args.use_cuda
+    )
+    num_workers = dict(zip(['decode', 'stft', 'model', 'wiener', 'encode'], args.num_workers))
+    pipeline = SeparationPipeline(separator, sample_rate=args.sample_rate, num_workers=num_workers, queue_size=args.queue_size)
+
+    mixture_paths = sorted(glob.glob(os.path.join(args.input_dir, "*", "mixture.wav")))
+    mixture_paths += sorted(glob.glob(os.path.join(args.input_dir, "*.wav")))
+    print("{} mixtures are found.".format(len(mixture_paths)), flush=True)
+
+    start = time.perf_counter()
+    pipeline.start()
+
+    jobs = []
+
+    for mixture_path in mixture_paths:
+        if os.path.basename(mixture_path) == "mixture.wav":
+            name = os.path.basename(os.path.dirname(mixture_path))
+        else:
+            name, _ = os.path.splitext(os.path.basename(mixture_path))
+
+        job = pipeline.submit(mixture_path, os.path.join(args.estimates_dir, name))
+        jobs.append((name, job))
+
+    pipeline.stop()
+    end = time.perf_counter()
+
+    stage_names = [stage.name for stage in pipeline.stages]
+
+    s = "Name, Status"
+    for stage_name in stage_names:
+        s += ", {} [sec]".format(stage_name)
+    print(s, flush=True)
+
+    n_failed = 0
+
+    for name, job in jobs:
+        s = "{}, {}".format(name, job.status)
+        for stage_name in stage_names:
+            s += ", {:.3f}".format(job.elapsed.get(stage_name, 0))
+        if job.error is not None:
+            s += ", {}".format(job.error)
+            n_failed += 1
+        print(s, flush=True)
+
+    print("Total: {:.3f} [sec], {} / {} tracks failed.".format(end - start, n_failed, len(jobs)), flush=True)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import queue
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utils.utils import set_seed
+from adhoc_service import SeparationPipeline, build_separator
+
+parser = argparse.ArgumentParser(description="Local HTTP separation service")
+
+parser.add_argument('--host', type=str, default='127.0.0.1', help='Host name')
+parser.add_argument('--port', type=int, default=8000, help='Port number')
+parser.add_argument('--estimates_dir', type=str, default='./estimates', help='Estimated sources are saved as <estimates_dir>/<job_id>/<target>.wav unless `estimates_dir` is given by request')
+parser.add_argument('--sample_rate', '-sr', type=int, default=44100, help='Sampling rate')
+parser.add_argument('--model_type', type=str, default='umx', choices=['umx', 'd3net', 'conv-tasnet'], help='Model type')
+parser.add_argument('--model_dir', type=str, default=None, help='Directory which includes drums/<model_choice>.pth, ..., vocals/<model_choice>.pth (umx, d3net). If not given, pretrained models are used.')
+parser.add_argument('--model_path', type=str, default=None, help='Path to model (conv-tasnet). If not given, pretrained model is used.')
+parser.add_argument('--model_choice', type=str, default='best', choices=['best', 'last'], help='Model choice. Default: best')
+parser.add_argument('--sources', type=str, default="[bass,drums,other,vocals]", help='Source names')
+parser.add_argument('--n_fft', type=int, default=4096, help='FFT length')
+parser.add_argument('--hop_length', type=int, default=1024, help='Hop length')
+parser.add_argument('--window_fn', type=str, default='hann', help='Window function')
+parser.add_argument('--duration', type=float, default=6, help='Duration of patch (umx, d3net) or segment (conv-tasnet)')
+parser.add_argument('--iteration_wfm', type=int, default=1, help='Iterations of multichannel Wiener filter')
+parser.add_argument('--max_batch_size', type=int, default=4, help='Maximum number of patches processed at once. 0: All patches of a song are processed at once.')
+parser.add_argument('--num_workers', type=str, default="[2,1,1,1,2]", help='Number of workers of decode, STFT, model, Wiener filter, and encode stages')
+parser.add_argument('--queue_size', type=int, default=4, help='Maximum number of tracks waiting between stages. Requests are rejected with 503 while the first queue is full.')
+parser.add_argument('--max_jobs', type=int, default=1024, help='Maximum number of jobs whose status is kept. The oldest finished jobs are discarded beyond it.')
+parser.add_argument('--use_cuda', type=int, default=0, help='0: Not use cuda, 1: Use cuda')
+parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+def build_handler(pipeline):
+    class SeparationRequestHandler(BaseHTTPRequestHandler):
+        """
+        POST /jobs with {"mixture_path": <str>, "estimates_dir": <str> (optional)}: Submit job.
+        GET /jobs: Status of all jobs.
+        GET /jobs/<job_id>: Status of job.
+        """
+        def do_POST(self):
+            if self.path.rstrip('/') != '/jobs':
+                self._send(404, {'error': "Not found."})
+                return
+
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length))
+                mixture_path = request['mixture_path']
+            except (ValueError, KeyError, TypeError):
+                self._send(400, {'error': "Request must be JSON including `mixture_path`."})
+                return
+
+            if not os.path.exists(mixture_path):
+                self._send(400, {'error': "Cannot find {}.".format(mixture_path)})
+                return
+
+            try:
+                job = pipeline.submit(mixture_path, request.get('estimates_dir'), block=False)
+            except queue.Full:
+                self._send(503, {'error': "Queue is full."})
+                return
+
+            self._send(202, job.state_dict())
+
+        def do_GET(self):
+            path = self.path.rstrip('/')
+
+            if path == '/jobs':
+                self._send(200, [job.state_dict() for job in list(pipeline.jobs.values())])
+            elif path.startswith('/jobs/') and path[len('/jobs/'):] in pipeline.jobs:
+                job = pipeline.jobs[path[len('/jobs/'):]]
+                self._send(200, job.state_dict())
+            else:
+                self._send(404, {'error': "Not found."})
+
+        def _send(self, status, content):
+            body = json.dumps(content).encode('utf-8')
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return SeparationRequestHandler
+
+def main(args):
+    set_seed(args.seed)
+
+    args.sources = args.sources.replace('[', '').replace(']', '').split(',')
+    args.num_workers = [int(n) for n in args.num_workers.replace('[', '').replace(']', '').split(',')]
+    samples = int(args.duration * args.sample_rate)
+    padding = 2 * (args.n_fft // 2)
+    patch_size = (samples + padding - args.n_fft) // args.hop_length + 1
+
+    separator = build_separator(
+        args.model_type, model_dir=args.model_dir, model_path=args.model_path, model_choice=args.model_choice, sources=args.sources,
+        n_fft=args.n_fft, hop_length=args.hop_length, window_fn=args.window_fn, patch_size=patch_size, segment_samples=samples,
+        iteration_wfm=args.iteration_wfm, max_batch_size=args.max_batch_size, use_cuda=args.use_cuda
+    )
+    num_workers = dict(zip(['decode', 'stft', 'model', 'wiener', 'encode'], args.num_workers))
+    pipeline = SeparationPipeline(separator, sample_rate=args.sample_rate, num_workers=num_workers, queue_size=args.queue_size, max_jobs=args.max_jobs, estimates_dir=args.estimates_dir)
+    pipeline.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), build_handler(pipeline))
+    print("Serving on http://{}:{}/jobs".format(args.host, args.port), flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pipeline.stop()
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
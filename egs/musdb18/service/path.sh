@@ -0,0 +1,4 @@
+#!/bin/bash
+
+export PATH="./local:../common:$PATH"
+export PYTHONPATH="../../../src:../common/src:./src:$PYTHONPATH"
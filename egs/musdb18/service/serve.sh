@@ -0,0 +1,61 @@
+#!/bin/bash
+
+host="127.0.0.1"
+port=8000
+
+estimates_dir="./estimates"
+
+model_type='umx' # 'umx', 'd3net', or 'conv-tasnet'
+model_dir="" # Directory which includes <target>/<model_choice>.pth for umx and d3net. If empty, pretrained models are used.
+model_path="" # Path to conv-tasnet model. If empty, pretrained model is used.
+model_choice='best'
+
+sources="[bass,drums,other,vocals]"
+sample_rate=44100
+
+window_fn='hann'
+n_fft=4096
+hop_length=1024
+duration=6
+
+iteration_wfm=1
+max_batch_size=4
+num_workers="[2,1,1,1,2]" # decode, STFT, model, Wiener filter, encode
+queue_size=4
+max_jobs=1024
+
+use_cuda=0
+seed=42
+
+. ./path.sh
+. parse_options.sh || exit 1
+
+options=""
+
+if [ -n "${model_dir}" ]; then
+    options="${options} --model_dir ${model_dir}"
+fi
+
+if [ -n "${model_path}" ]; then
+    options="${options} --model_path ${model_path}"
+fi
+
+serve.py \
+--host ${host} \
+--port ${port} \
+--estimates_dir "${estimates_dir}" \
+--sample_rate ${sample_rate} \
+--model_type ${model_type} \
+--model_choice ${model_choice} \
+--sources ${sources} \
+--n_fft ${n_fft} \
+--hop_length ${hop_length} \
+--window_fn ${window_fn} \
+--duration ${duration} \
+--iteration_wfm ${iteration_wfm} \
+--max_batch_size ${max_batch_size} \
+--num_workers ${num_workers} \
+--queue_size ${queue_size} \
+--max_jobs ${max_jobs} \
+--use_cuda ${use_cuda} \
+--seed ${seed} ${options}
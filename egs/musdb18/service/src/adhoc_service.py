@@ -0,0 +1,476 @@
+import os
+import time
+import queue
+import warnings
+import threading
+
+import torch
+import torchaudio
+import torch.nn.functional as F
+
+from utils.audio import build_window
+from utils.model import load_checkpoint, estimate_sources_amplitude_by_patch
+from algorithm.frequency_mask import multichannel_wiener_filter
+from models.umx import OpenUnmix, ParallelOpenUnmix
+from models.d3net import D3Net, ParallelD3Net
+from models.conv_tasnet import ConvTasNet
+
+__sources__ = ['bass', 'drums', 'other', 'vocals']
+SAMPLE_RATE_MUSDB18 = 44100
+BITS_PER_SAMPLE_MUSDB18 = 16
+MAX_NUM_WORKERS = 32 # per stage
+EPS = 1e-12
+
+class SeparationJob:
+    """
+    Unit of work passed through stages of SeparationPipeline.
+    Intermediate results (waveform, spectrogram, estimates, ...) are stored in `data` and released after encoding.
+    """
+    def __init__(self, job_id, mixture_path, estimates_dir):
+        self.job_id = job_id
+        self.mixture_path = mixture_path
+        self.estimates_dir = estimates_dir
+
+        self.status = 'queued'
+        self.error = None
+        self.elapsed = {}
+        self.data = {}
+
+        self._done = threading.Event()
+
+    def finish(self, error=None):
+        self.data = {}
+
+        if error is None:
+            self.status = 'done'
+        else:
+            self.status = 'failed'
+            self.error = "{}: {}".format(type(error).__name__, error)
+
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout=timeout)
+
+    def state_dict(self):
+        state = {
+            'job_id': self.job_id,
+            'mixture_path': self.mixture_path,
+            'estimates_dir': self.estimates_dir,
+            'status': self.status,
+            'error': self.error,
+            'elapsed': self.elapsed
+        }
+
+        return state
+
+class Stage:
+    """
+    Worker pool which takes jobs from `in_queue`, applies `process`, and puts them into `out_queue`.
+    A job whose `process` raises an exception is finished as failed and is not passed to the next stage.
+    """
+    def __init__(self, name, process, in_queue, out_queue=None, num_workers=1):
+        self.name = name
+        self.process = process
+        self.in_queue, self.out_queue = in_queue, out_queue
+        self.num_workers = num_workers
+
+        self.workers = []
+
+    def start(self):
+        for idx in range(self.num_workers):
+            worker = threading.Thread(target=self._run, name="{}-{}".format(self.name, idx), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        # One sentinel per worker
+        for _ in self.workers:
+            self.in_queue.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+        self.workers = []
+
+    def _run(self):
+        while True:
+            job = self.in_queue.get()
+
+            if job is None:
+                break
+
+            job.status = self.name
+            start = time.perf_counter()
+
+            try:
+                self.process(job)
+            except Exception as e:
+                job.finish(error=e)
+                continue
+            finally:
+                job.elapsed[self.name] = job.elapsed.get(self.name, 0) + time.perf_counter() - start
+
+            if self.out_queue is None:
+                job.finish()
+            else:
+                self.out_queue.put(job)
+
+class SpectrogramSeparator:
+    """
+    Adapter of ParallelOpenUnmix and ParallelD3Net for SeparationPipeline.
+    """
+    def __init__(self, model, n_fft=4096, hop_length=1024, window_fn='hann', patch_size=256, sources=__sources__, iteration_wfm=1, max_batch_size=4, device="cpu"):
+        self.model = model
+        self.n_fft, self.hop_length = n_fft, hop_length
+        self.window = build_window(n_fft, window_fn=window_fn)
+        self.patch_size = patch_size
+        self.sources = sources
+        self.iteration_wfm = iteration_wfm
+        self.max_batch_size = max_batch_size
+        self.device = device
+
+    def transform(self, waveform):
+        """
+        Args:
+            waveform (n_mics, T)
+        Returns:
+            mixture (n_mics, n_bins, n_frames): Complex spectrogram.
+        """
+        return torch.stft(waveform, n_fft=self.n_fft, hop_length=self.hop_length, window=self.window, return_complex=True)
+
+    def separate(self, mixture):
+        """
+        Args:
+            mixture (n_mics, n_bins, n_frames): Complex spectrogram.
+        Returns:
+            estimated_sources_amplitude (n_sources, n_mics, n_bins, n_frames)
+        """
+        patch_size = self.patch_size
+        n_mics, n_bins, n_frames = mixture.size()
+        padding = (patch_size - n_frames % patch_size) % patch_size
+
+        mixture_amplitude = torch.abs(mixture)
+        mixture_amplitude = F.pad(mixture_amplitude, (0, padding))
+        mixture_amplitude = mixture_amplitude.reshape(n_mics, n_bins, -1, patch_size)
+        mixture_amplitude = mixture_amplitude.permute(2, 0, 1, 3) # (n_patches, n_mics, n_bins, patch_size)
+        mixture_amplitude = mixture_amplitude.to(self.device)
+
+        n_patches = mixture_amplitude.size(0)
+
+        with torch.no_grad():
+            estimated_sources_amplitude = estimate_sources_amplitude_by_patch(self.model, mixture_amplitude.unsqueeze(dim=1), self.sources, batch_size=self.max_batch_size) # (n_sources, n_patches, n_mics, n_bins, patch_size)
+
+        estimated_sources_amplitude = estimated_sources_amplitude.permute(0, 2, 3, 1, 4).reshape(len(self.sources), n_mics, n_bins, n_patches * patch_size)
+        estimated_sources_amplitude = F.pad(estimated_sources_amplitude, (0, -padding))
+
+        return estimated_sources_amplitude.cpu()
+
+    def inverse_transform(self, mixture, estimated_sources_amplitude, length):
+        """
+        Args:
+            mixture (n_mics, n_bins, n_frames): Complex spectrogram.
+            estimated_sources_amplitude (n_sources, n_mics, n_bins, n_frames)
+            length <int>: Length of mixture waveform.
+        Returns:
+            estimated_sources (n_sources, n_mics, length)
+        """
+        n_sources, n_mics, n_bins, n_frames = estimated_sources_amplitude.size()
+
+        estimated_sources = multichannel_wiener_filter(mixture, estimated_sources_amplitude=estimated_sources_amplitude, iteration=self.iteration_wfm) # (n_sources, n_mics, n_bins, n_frames)
+        estimated_sources = estimated_sources.view(n_sources * n_mics, n_bins, n_frames)
+        estimated_sources = torch.istft(estimated_sources, self.n_fft, hop_length=self.hop_length, window=self.window, return_complex=False)
+        estimated_sources = estimated_sources.view(n_sources, n_mics, -1)
+        estimated_sources = F.pad(estimated_sources, (0, length - estimated_sources.size(-1)))
+
+        return estimated_sources
+
+class WaveformSeparator:
+    """
+    Adapter of ConvTasNet for SeparationPipeline. STFT and Wiener filter stages are skipped.
+    """
+    def __init__(self, model, segment_samples=SAMPLE_RATE_MUSDB18*4, sources=__sources__, max_batch_size=4, device="cpu"):
+        self.model = model
+        self.segment_samples = segment_samples
+        self.sources = sources
+        self.max_batch_size = max_batch_size
+        self.device = device
+
+    def transform(self, waveform):
+        return waveform
+
+    def separate(self, mixture):
+        """
+        Args:
+            mixture (n_mics, T)
+        Returns:
+            estimated_sources (n_sources, n_mics, T)
+        """
+        segment_samples = self.segment_samples
+        n_mics, T = mixture.size()
+        padding = (segment_samples - T % segment_samples) % segment_samples
+
+        mixture = F.pad(mixture, (0, padding))
+        mixture = mixture.reshape(n_mics, -1, segment_samples).permute(1, 0, 2) # (n_segments, n_mics, segment_samples)
+        mixture = mixture.to(self.device)
+
+        n_segments = mixture.size(0)
+        max_batch_size = self.max_batch_size or n_segments
+
+        mean, std = mixture.mean(dim=-1, keepdim=True), mixture.std(dim=-1, keepdim=True)
+        standardized_mixture = (mixture - mean) / (std + EPS)
+
+        standardized_estimated_sources = []
+
+        with torch.no_grad():
+            for _mixture in torch.split(standardized_mixture, max_batch_size, dim=0):
+                _estimated_sources = self.model(_mixture.unsqueeze(dim=1)) # (max_batch_size, n_sources, n_mics, segment_samples)
+                standardized_estimated_sources.append(_estimated_sources)
+
+        standardized_estimated_sources = torch.cat(standardized_estimated_sources, dim=0) # (n_segments, n_sources, n_mics, segment_samples)
+        estimated_sources = std.unsqueeze(dim=1) * standardized_estimated_sources + mean.unsqueeze(dim=1)
+
+        n_sources = estimated_sources.size(1)
+        estimated_sources = estimated_sources.permute(1, 2, 0, 3).reshape(n_sources, n_mics, n_segments * segment_samples)
+        estimated_sources = F.pad(estimated_sources, (0, -padding))
+
+        return estimated_sources.cpu()
+
+    def inverse_transform(self, mixture, estimated_sources, length):
+        return estimated_sources
+
+class SeparationPipeline:
+    """
+    decode -> STFT -> model -> Wiener filter -> encode pipeline.
+    Each stage owns its worker pool, and stages are connected by bounded queues, so that decoding and encoding of tracks overlap with model inference.
+    The model is loaded once and shared by all jobs.
+    """
+    def __init__(self, separator, sample_rate=SAMPLE_RATE_MUSDB18, num_workers=None, queue_size=4, max_jobs=1024, estimates_dir="./estimates"):
+        """
+        Args:
+            separator <SpectrogramSeparator> or <WaveformSeparator>: Model wrapped by adapter.
+            sample_rate <int>: Sampling rate. Mixture is resampled if its sampling rate differs.
+            num_workers <dict<int>>: Number of workers for each stage. Keys are 'decode', 'stft', 'model', 'wiener', and 'encode'. Each must be positive, and is capped at MAX_NUM_WORKERS.
+            queue_size <int>: Maximum number of jobs waiting between stages.
+            max_jobs <int>: Maximum number of jobs kept in `self.jobs`. The oldest finished jobs are discarded beyond it.
+            estimates_dir <str>: Default root directory of estimates.
+        """
+        self.separator = separator
+        self.sample_rate = sample_rate
+        self.estimates_dir = estimates_dir
+
+        _num_workers = {
+            'decode': 2,
+            'stft': 1,
+            'model': 1,
+            'wiener': 1,
+            'encode': 2
+        }
+
+        if num_workers is not None:
+            _num_workers.update(num_workers)
+
+        for name, n in _num_workers.items():
+            if n < 1:
+                raise ValueError("Number of workers of '{}' stage must be positive, but given {}.".format(name, n))
+            if n > MAX_NUM_WORKERS:
+                warnings.warn("Number of workers of '{}' stage is capped at {}.".format(name, MAX_NUM_WORKERS))
+                _num_workers[name] = MAX_NUM_WORKERS
+
+        if max_jobs < 1:
+            raise ValueError("`max_jobs` must be positive, but given {}.".format(max_jobs))
+
+        self.max_jobs = max_jobs
+
+        processes = {
+            'decode': self.decode,
+            'stft': self.transform,
+            'model': self.separate,
+            'wiener': self.inverse_transform,
+            'encode': self.encode
+        }
+
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in processes]
+        self.stages = []
+
+        for idx, name in enumerate(processes.keys()):
+            in_queue = self.queues[idx]
+            out_queue = self.queues[idx + 1] if idx + 1 < len(self.queues) else None
+            stage = Stage(name, processes[name], in_queue, out_queue, num_workers=_num_workers[name])
+            self.stages.append(stage)
+
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._n_jobs = 0
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        """
+        Finish all submitted jobs and stop workers.
+        """
+        for stage in self.stages:
+            stage.stop()
+
+    def submit(self, mixture_path, estimates_dir=None, block=True):
+        """
+        Args:
+            mixture_path <str>: Path to mixture.
+            estimates_dir <str>: Estimates are saved as <estimates_dir>/<target>.wav. If None, <self.estimates_dir>/<job_id> is used.
+            block <bool>: If False and the first queue is full, queue.Full is raised.
+        Returns:
+            job <SeparationJob>
+        """
+        with self._lock:
+            job_id = "{:06d}".format(self._n_jobs)
+            self._n_jobs += 1
+
+        if estimates_dir is None:
+            estimates_dir = os.path.join(self.estimates_dir, job_id)
+
+        job = SeparationJob(job_id, mixture_path, estimates_dir)
+
+        with self._lock:
+            self._discard_finished_jobs()
+            self.jobs[job_id] = job
+
+        try:
+            self.queues[0].put(job, block=block)
+        except queue.Full:
+            with self._lock:
+                self.jobs.pop(job_id)
+            raise
+
+        return job
+
+    def _discard_finished_jobs(self):
+        """
+        Discard the oldest finished jobs so that a new job can be added without exceeding `self.max_jobs`.
+        Unfinished jobs are kept.
+        """
+        n_excess = len(self.jobs) + 1 - self.max_jobs
+
+        if n_excess <= 0:
+            return
+
+        finished_ids = [job_id for job_id, job in self.jobs.items() if job.status in ['done', 'failed']]
+
+        for job_id in finished_ids[:n_excess]:
+            self.jobs.pop(job_id)
+
+    def decode(self, job):
+        waveform, sample_rate = torchaudio.load(job.mixture_path)
+
+        if sample_rate != self.sample_rate:
+            waveform = torchaudio.functional.resample(waveform, sample_rate, self.sample_rate)
+
+        job.data['waveform'] = waveform
+
+    def transform(self, job):
+        job.data['mixture'] = self.separator.transform(job.data['waveform'])
+
+    def separate(self, job):
+        job.data['estimates'] = self.separator.separate(job.data['mixture'])
+
+    def inverse_transform(self, job):
+        length = job.data['waveform'].size(-1)
+        job.data['estimated_sources'] = self.separator.inverse_transform(job.data['mixture'], job.data['estimates'], length)
+
+    def encode(self, job):
+        os.makedirs(job.estimates_dir, exist_ok=True)
+
+        for target, estimated_source in zip(self.separator.sources, job.data['estimated_sources']):
+            estimated_path = os.path.join(job.estimates_dir, "{}.wav".format(target))
+            torchaudio.save(estimated_path, estimated_source, sample_rate=self.sample_rate, bits_per_sample=BITS_PER_SAMPLE_MUSDB18)
+
+def build_separator(model_type, model_dir=None, model_path=None, model_choice='best', sources=__sources__, n_fft=4096, hop_length=1024, window_fn='hann', patch_size=256, segment_samples=SAMPLE_RATE_MUSDB18*4, iteration_wfm=1, max_batch_size=4, use_cuda=False):
+    """
+    Load model once for SeparationPipeline.
+    Args:
+        model_type <str>: 'umx', 'd3net', or 'conv-tasnet'.
+        model_dir <str>: Directory which includes <target>/<model_choice>.pth for 'umx' and 'd3net'. If None, pretrained models are used.
+        model_path <str>: Path to model for 'conv-tasnet'. If None, pretrained model is used.
+    Returns:
+        separator <SpectrogramSeparator> or <WaveformSeparator>
+    """
+    device = "cuda" if use_cuda else "cpu"
+
+    if model_type in ['umx', 'd3net']:
+        if model_type == 'umx':
+            cls, parallel_cls = OpenUnmix, ParallelOpenUnmix
+        else:
+            cls, parallel_cls = D3Net, ParallelD3Net
+
+        if model_dir is None:
+            model = parallel_cls.build_from_pretrained(task='musdb18', model_choice=model_choice)
+            n_fft, hop_length, window_fn = model.n_fft, model.hop_length, model.window_fn
+            sources = model.sources if model_type == 'umx' else __sources__
+        else:
+            modules = {}
+
+            for target in sources:
+                _model_path = os.path.join(model_dir, target, "{}.pth".format(model_choice))
+                modules[target] = cls.build_model(_model_path, load_state_dict=True)
+
+            model = parallel_cls(modules)
+
+        model.to(device)
+        model.eval()
+
+        separator = SpectrogramSeparator(model, n_fft=n_fft, hop_length=hop_length, window_fn=window_fn, patch_size=patch_size, sources=sources, iteration_wfm=iteration_wfm, max_batch_size=max_batch_size, device=device)
+    elif model_type == 'conv-tasnet':
+        if model_path is None:
+            model = ConvTasNet.build_from_pretrained(task='musdb18', model_choice=model_choice)
+            sources = model.sources
+        else:
+            config = load_checkpoint(model_path)
+            model = ConvTasNet.build_model(model_path, load_state_dict=True)
+            sources = config.get('sources') or sources
+
+        model.to(device)
+        model.eval()
+
+        separator = WaveformSeparator(model, segment_samples=segment_samples, sources=sources, max_batch_size=max_batch_size, device=device)
+    else:
+        raise NotImplementedError("Not support model_type={}.".format(model_type))
+
+    return separator
+
+def _test_pipeline(n_fft=256, hop_length=64, patch_size=16, duration=1):
+    import tempfile
+
+    torch.manual_seed(111)
+
+    modules = {}
+
+    for target in __sources__:
+        modules[target] = OpenUnmix(2, hidden_channels=16, num_layers=1, n_bins=n_fft//2+1)
+
+    model = ParallelOpenUnmix(modules)
+    model.eval()
+
+    separator = SpectrogramSeparator(model, n_fft=n_fft, hop_length=hop_length, patch_size=patch_size, sources=__sources__)
+
+    with tempfile.TemporaryDirectory() as root:
+        mixture_path = os.path.join(root, "mixture.wav")
+        torchaudio.save(mixture_path, 0.1 * torch.randn(2, int(duration * SAMPLE_RATE_MUSDB18)), sample_rate=SAMPLE_RATE_MUSDB18, bits_per_sample=BITS_PER_SAMPLE_MUSDB18)
+
+        pipeline = SeparationPipeline(separator, estimates_dir=os.path.join(root, "estimates"))
+        pipeline.start()
+
+        job = pipeline.submit(mixture_path)
+        job.wait()
+        pipeline.stop()
+
+        print(job.state_dict())
+        assert job.status == 'done', job.error
+
+        for target in __sources__:
+            estimated, _ = torchaudio.load(os.path.join(job.estimates_dir, "{}.wav".format(target)))
+            print(target, tuple(estimated.size()))
+
+if __name__ == '__main__':
+    print("="*10, "Separation pipeline", "="*10)
+    _test_pipeline()
@@ -35,8 +35,16 @@ epochs=1000
 
 estimate_all=1
 evaluate_all=1
+n_eval_workers=1 # Number of processes for museval evaluation
+
+max_batch_size=4 # Maximum number of patches processed at once in estimation
+memory_budget=0 # [MiB], 0 is handled as no limitation
+dtype='fp32' # 'fp32', 'bf16', or 'fp16'. Precision of model body. STFT, iSTFT, and Wiener filter are computed in fp32.
+compare_fp32=0 # If 1 and dtype is not 'fp32', SDR against fp32 estimates is reported. Estimation takes about twice as long.
 
 use_norbert=0
+wiener_memory_budget=0 # [MiB], 0 is handled as no limitation
+quantized=0 # If 1, int8 models made by quantize.sh are used. Only CPU is supported.
 use_cuda=1
 seed=111
 gpu_id="0"
@@ -57,12 +65,28 @@ else
     save_dir="${exp_dir}/${tag}"
 fi
 
-model_dir="${save_dir}/model"
-log_dir="${save_dir}/log/test/${model_choice}"
-json_dir="${save_dir}/json/${model_choice}"
+if [ ${quantized} -eq 1 ]; then
+    model_dir="${save_dir}/model_int8"
+    use_cuda=0
+else
+    model_dir="${save_dir}/model"
+fi
+
+result_dir="${model_choice}"
+
+if [ ${quantized} -eq 1 ]; then
+    result_dir="${result_dir}_int8"
+fi
+
+if [ "${dtype}" != 'fp32' ]; then
+    result_dir="${result_dir}_${dtype}"
+fi
+
+log_dir="${save_dir}/log/test/${result_dir}"
+json_dir="${save_dir}/json/${result_dir}"
 
 musdb=`basename "${musdb18_root}"` # 'MUSDB18' or 'MUSDB18HQ'
-estimates_dir="${save_dir}/${musdb}/${model_choice}/test"
+estimates_dir="${save_dir}/${musdb}/${result_dir}/test"
 
 if [ ! -e "${log_dir}" ]; then
     mkdir -p "${log_dir}"
@@ -87,6 +111,13 @@ test.py \
 --model_choice "${model_choice}" \
 --estimate_all ${estimate_all} \
 --evaluate_all ${evaluate_all} \
+--n_eval_workers ${n_eval_workers} \
+--max_batch_size ${max_batch_size} \
+--memory_budget ${memory_budget} \
+--dtype ${dtype} \
+--compare_fp32 ${compare_fp32} \
 --use_norbert ${use_norbert} \
+--wiener_memory_budget ${wiener_memory_budget} \
+--quantized ${quantized} \
 --use_cuda ${use_cuda} \
 --seed ${seed} | tee "${log_dir}/test_${time_stamp}.log"
@@ -35,7 +35,11 @@ parser.add_argument('--estimates_dir', type=str, default=None, help='Estimated s
 parser.add_argument('--json_dir', type=str, default=None, help='Json directory')
 parser.add_argument('--estimate_all', type=int, default=1, help='Estimates all songs. GPU is required if use_cuda=1.')
 parser.add_argument('--evaluate_all', type=int, default=1, help='Evaluates all estimations. GPU is NOT required.')
+parser.add_argument('--n_eval_workers', type=int, default=1, help='# of processes used to evaluate tracks by museval. Tracks whose scores in json_dir are newer than their estimations are skipped.')
+parser.add_argument('--dtype', type=str, default='fp32', choices=['fp32', 'bf16', 'fp16'], help='Precision of model body in estimation. STFT, iSTFT, and Wiener filter are computed in fp32.')
+parser.add_argument('--compare_fp32', type=int, default=0, help='If 1 and dtype is not fp32, fp32 estimates are also computed and SDR of estimates against them is reported. Estimation takes about twice as long.')
 parser.add_argument('--use_norbert', type=int, default=0, help='Use norbert.wiener for multichannel wiener filetering. 0: Not use norbert, 1: Use norbert (you have to install norbert)')
+parser.add_argument('--wiener_memory_budget', type=float, default=0, help='Memory budget [MiB] of intermediate tensors in multichannel Wiener filter, which is applied to chunks of frames. 0: No limitation.')
 parser.add_argument('--use_cuda', type=int, default=1, help='0: Not use cuda, 1: Use cuda')
 parser.add_argument('--seed', type=int, default=42, help='Random seed')
 
@@ -2,7 +2,9 @@ import torch
 import torch.nn as nn
 
 from transforms.stft import stft, istft
-from criterion.combination import CombinationLoss
+from criterion.sdr import WeightedSDR, NegWeightedSDR
+from criterion.distance import MeanSquaredError
+from criterion.combination import CombinationLoss, build_membership_matrix
 
 EPS = 1e-12
 
@@ -19,6 +21,8 @@ class MultiDomainLoss(nn.Module):
             self.criterion_time = criterion_time
             self.criterion_frequency = criterion_frequency
 
+        self.combination = combination
+
         self.weight_time, self.weight_frequency = weight_time, weight_frequency
         self.n_fft, self.hop_length = n_fft, hop_length
         self.window = nn.Parameter(window, requires_grad=False)
@@ -60,11 +64,15 @@ class MultiDomainLoss(nn.Module):
 
         if weight_time == 0:
             loss_time = 0
+        elif self.combination and self._is_shareable_time():
+            loss_time = self.combination_loss_time(input_time, target_time, batch_mean=batch_mean)
         else:
             loss_time = self.criterion_time(input_time, target_time, batch_mean=batch_mean)
 
         if weight_frequency == 0:
             loss_frequency = 0
+        elif self.combination and self._is_shareable_frequency(n_dims=input_amplitude.dim()):
+            loss_frequency = self.combination_loss_frequency(input_amplitude, target_amplitude, batch_mean=batch_mean)
         else:
             loss_frequency = self.criterion_frequency(input_amplitude, target_amplitude, batch_mean=batch_mean)
 
@@ -76,6 +84,185 @@ class MultiDomainLoss(nn.Module):
 
         return loss
 
+    def combination_loss_time(self, input, target, batch_mean=True):
+        """
+        Equivalent to CombinationLoss(NegWeightedSDR(source_dim=1)).
+        Every combination is derived from inner products between sources, so combined signals are never built.
+        Args:
+            input <torch.Tensor>: (batch_size, n_sources, n_mics, T)
+            target <torch.Tensor>: (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss <torch.Tensor>: () or (batch_size,)
+        """
+        criterion = self.criterion_time.criterion
+        membership = self._build_membership_matrix(input)
+
+        loss = combination_weighted_sdr(input, target, membership, eps=criterion.eps) # (batch_size, n_combinations, n_mics)
+
+        if isinstance(criterion, NegWeightedSDR):
+            loss = - loss
+
+        if criterion.reduction == 'mean':
+            loss = loss.mean(dim=2)
+        else:
+            loss = loss.sum(dim=2)
+
+        loss = loss.mean(dim=1)
+
+        if batch_mean:
+            loss = loss.mean(dim=0)
+
+        return loss
+
+    def combination_loss_frequency(self, input, target, batch_mean=True):
+        """
+        Equivalent to CombinationLoss(MeanSquaredError(dim=(1,2,3))).
+        Every combination is derived from inner products between sources, so combined spectrograms are never built.
+        Args:
+            input <torch.Tensor>: (batch_size, n_sources, n_mics, n_bins, n_frames)
+            target <torch.Tensor>: (batch_size, n_sources, n_mics, n_bins, n_frames)
+        Returns:
+            loss <torch.Tensor>: () or (batch_size,)
+        """
+        membership = self._build_membership_matrix(input)
+
+        loss = combination_squared_error(input, target, membership) # (batch_size, n_combinations)
+        loss = loss / input.size()[2:].numel()
+        loss = loss.mean(dim=1)
+
+        if batch_mean:
+            loss = loss.mean(dim=0)
+
+        return loss
+
+    def _build_membership_matrix(self, input):
+        n_sources = input.size(1)
+        min_pair, max_pair = self.criterion_time.min_pair, self.criterion_time.max_pair
+        membership = build_membership_matrix(n_sources, min_pair=min_pair, max_pair=max_pair)
+        membership = membership.to(input.device)
+
+        return membership
+
+    def _is_shareable_time(self):
+        criterion = self.criterion_time.criterion
+
+        if self.criterion_time.combination_dim != 1:
+            return False
+
+        if type(criterion) not in [WeightedSDR, NegWeightedSDR]:
+            return False
+
+        return criterion.source_dim == 1 and criterion.reduction_dim is None
+
+    def _is_shareable_frequency(self, n_dims):
+        criterion = self.criterion_frequency.criterion
+
+        if self.criterion_frequency.combination_dim != 1:
+            return False
+
+        if type(criterion) is not MeanSquaredError:
+            return False
+
+        dim = criterion.dim
+        if type(dim) is int:
+            dim = (dim,)
+
+        return set([_dim % (n_dims - 1) for _dim in dim]) == set(range(1, n_dims - 1))
+
+def combination_weighted_sdr(input, target, membership, eps=EPS):
+    """
+    Weighted SDR of every combination of sources, where `n_mics` is regarded as `source_dim` of weighted_sdr.
+    Args:
+        input <torch.Tensor>: (batch_size, n_sources, n_mics, T)
+        target <torch.Tensor>: (batch_size, n_sources, n_mics, T)
+        membership <torch.Tensor>: (n_combinations, n_sources)
+    Returns:
+        loss <torch.Tensor>: (batch_size, n_combinations, n_mics)
+    """
+    batch_size, n_sources, n_mics, T = input.size()
+
+    membership = membership.to(input.dtype)
+    eye = torch.eye(n_mics, dtype=input.dtype, device=input.device)
+    ones = torch.ones(n_mics, n_mics, dtype=input.dtype, device=input.device)
+    zeros = torch.zeros(n_mics, n_mics, dtype=input.dtype, device=input.device)
+
+    # Coefficients of (target, input) of each source and microphone, i.e. weights (n_combinations, n_mics, 2, n_sources, n_mics).
+    weight_target = _combination_weight(membership, eye, zeros) # target of combination
+    weight_input = _combination_weight(membership, zeros, eye) # input of combination
+    weight_residual_target = _combination_weight(membership, ones - eye, zeros) # mixture - target
+    weight_residual_input = _combination_weight(membership, ones, - eye) # mixture - input
+
+    signal = torch.stack([target, input], dim=1) # (batch_size, 2, n_sources, n_mics, T)
+    signal = signal.view(batch_size, 2 * n_sources * n_mics, T)
+    gram = torch.matmul(signal, signal.transpose(1, 2)) # (batch_size, 2 * n_sources * n_mics, 2 * n_sources * n_mics)
+
+    def _inner(weight1, weight2):
+        return torch.einsum('cki,bij,ckj->bck', weight1, gram, weight2)
+
+    target_power = _inner(weight_target, weight_target)
+    input_power = _inner(weight_input, weight_input)
+    residual_target_power = _inner(weight_residual_target, weight_residual_target)
+    residual_input_power = _inner(weight_residual_input, weight_residual_input)
+
+    loss = (_inner(weight_target, weight_input) + eps) / (_safe_sqrt(target_power) * _safe_sqrt(input_power) + eps)
+    loss_residual = (_inner(weight_residual_target, weight_residual_input) + eps) / (_safe_sqrt(residual_target_power) * _safe_sqrt(residual_input_power) + eps)
+
+    target_power, residual_target_power = torch.clamp(target_power, min=0), torch.clamp(residual_target_power, min=0)
+    rho = (target_power + eps) / (target_power + residual_target_power + eps)
+    loss = rho * loss + (1 - rho) * loss_residual
+
+    return loss
+
+def combination_squared_error(input, target, membership):
+    """
+    Args:
+        input <torch.Tensor>: (batch_size, n_sources, *, n_frames)
+        target <torch.Tensor>: (batch_size, n_sources, *, n_frames)
+        membership <torch.Tensor>: (n_combinations, n_sources)
+    Returns:
+        loss <torch.Tensor>: (batch_size, n_combinations), sum of squared error of each combination.
+    """
+    membership = membership.to(input.dtype)
+
+    residual = (input - target).flatten(2, -2) # (batch_size, n_sources, *, n_frames)
+    residual = residual.transpose(1, 2) # (batch_size, *, n_sources, n_frames)
+
+    # Partial inner products are accumulated by torch.sum rather than by a single long dot product for precision.
+    gram = torch.matmul(residual, residual.transpose(2, 3)) # (batch_size, *, n_sources, n_sources)
+    gram = gram.sum(dim=1) # (batch_size, n_sources, n_sources)
+    loss = torch.einsum('cn,bnm,cm->bc', membership, gram, membership)
+    loss = torch.clamp(loss, min=0)
+
+    return loss
+
+def _combination_weight(membership, weight_target, weight_input):
+    """
+    Args:
+        membership: (n_combinations, n_sources)
+        weight_target: (n_mics, n_mics), coefficients of target at each microphone for each output microphone.
+        weight_input: (n_mics, n_mics), coefficients of input at each microphone for each output microphone.
+    Returns:
+        weight: (n_combinations, n_mics, 2 * n_sources * n_mics)
+    """
+    n_combinations, n_sources = membership.size()
+    n_mics = weight_target.size(0)
+
+    weight = torch.stack([weight_target, weight_input], dim=1) # (n_mics, 2, n_mics)
+    weight = membership[:, None, None, :, None] * weight[None, :, :, None, :] # (n_combinations, n_mics, 2, n_sources, n_mics)
+    weight = weight.view(n_combinations, n_mics, 2 * n_sources * n_mics)
+
+    return weight
+
+def _safe_sqrt(input):
+    """
+    Square root whose gradient is zero at zero, like torch.linalg.vector_norm.
+    """
+    is_positive = input > 0
+    input = torch.where(is_positive, input, torch.ones_like(input))
+    output = torch.where(is_positive, torch.sqrt(input), torch.zeros_like(input))
+
+    return output
+
 def _test_mdl():
     from utils.utils_audio import build_window
 
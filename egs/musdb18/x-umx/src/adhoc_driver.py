@@ -1,16 +1,17 @@
 import os
 import time
 
-import musdb
-import museval
 import torch
 import torchaudio
 import torch.nn as nn
 
 from utils.utils import draw_loss_curve
+from utils.model import choose_autocast
 from transforms.stft import istft
+from criterion.sdr import sdr
 from driver import apply_multichannel_wiener_filter_norbert, apply_multichannel_wiener_filter_torch
 from driver import TrainerBase, TesterBase
+from driver import evaluate_all_tracks
 
 BITS_PER_SAMPLE_MUSDB18 = 16
 EPS = 1e-12
@@ -406,9 +407,13 @@ class AdhocTester(TesterBase):
         self.combination = args.combination
 
         self.use_estimate_all, self.use_evaluate_all = args.estimate_all, args.evaluate_all
+        self.n_eval_workers = args.n_eval_workers
+        self.dtype = args.dtype
+        self.compare_fp32 = args.compare_fp32 and self.dtype != 'fp32'
         
         self.use_cuda = args.use_cuda
         self.use_norbert = args.use_norbert
+        self.wiener_memory_budget = args.wiener_memory_budget
 
         package = torch.load(self.model_path, map_location=lambda storage, loc: storage)
         if isinstance(self.model, nn.DataParallel):
@@ -432,6 +437,7 @@ class AdhocTester(TesterBase):
         self.model.eval()
         
         n_test = len(self.loader.dataset)
+        test_sdr_fp32 = 0
         
         with torch.no_grad():
             for idx, (mixture, sources, samples, name) in enumerate(self.loader):
@@ -455,10 +461,23 @@ class AdhocTester(TesterBase):
                 for _mixture_amplitude in mixture_amplitude:
                     # _mixture_amplitude: (1, n_mics, n_bins, n_frames)
                     _mixture_amplitude = _mixture_amplitude.unsqueeze(dim=0)
-                    _estimated_sources_amplitude = self.model(_mixture_amplitude)
-                    estimated_sources_amplitude.append(_estimated_sources_amplitude)
+                    with choose_autocast(self.dtype, device_type=_mixture_amplitude.device.type):
+                        _estimated_sources_amplitude = self.model(_mixture_amplitude)
+                    estimated_sources_amplitude.append(_estimated_sources_amplitude.float())
                 
                 estimated_sources_amplitude = torch.cat(estimated_sources_amplitude, dim=0) # (batch_size, n_sources, n_mics, n_bins, n_frames)
+
+                if self.compare_fp32:
+                    reference_sources_amplitude = []
+
+                    for _mixture_amplitude in mixture_amplitude:
+                        _reference_sources_amplitude = self.model(_mixture_amplitude.unsqueeze(dim=0))
+                        reference_sources_amplitude.append(_reference_sources_amplitude)
+
+                    reference_sources_amplitude = torch.cat(reference_sources_amplitude, dim=0) # (batch_size, n_sources, n_mics, n_bins, n_frames)
+                    reference_sources_amplitude = reference_sources_amplitude.permute(1, 2, 3, 0, 4)
+                    reference_sources_amplitude = reference_sources_amplitude.reshape(n_sources, n_mics, n_bins, batch_size * n_frames).cpu() # (n_sources, n_mics, n_bins, batch_size * n_frames)
+
                 estimated_sources_amplitude = estimated_sources_amplitude.permute(1, 2, 3, 0, 4)
                 estimated_sources_amplitude = estimated_sources_amplitude.reshape(1, n_sources, n_mics, n_bins, batch_size * n_frames) # (1, n_sources, n_mics, n_bins, batch_size * n_frames)
 
@@ -469,12 +488,7 @@ class AdhocTester(TesterBase):
                 mixture = mixture.squeeze(dim=0).cpu()
                 estimated_sources_amplitude = estimated_sources_amplitude.squeeze(dim=0).cpu()
 
-                estimated_sources = self.apply_multichannel_wiener_filter(mixture, estimated_sources_amplitude=estimated_sources_amplitude)
-                estimated_sources_channels = estimated_sources.size()[:-2]
-
-                estimated_sources = estimated_sources.view(-1, *estimated_sources.size()[-2:])
-                estimated_sources = istft(estimated_sources, self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalize, return_complex=False)
-                estimated_sources = estimated_sources.view(*estimated_sources_channels, -1) # -> (n_sources, n_mics, T_pad)
+                estimated_sources = self.separate(mixture, estimated_sources_amplitude) # (n_sources, n_mics, T_pad)
 
                 track_dir = os.path.join(self.estimates_dir, name)
                 os.makedirs(track_dir, exist_ok=True)
@@ -486,41 +500,54 @@ class AdhocTester(TesterBase):
                     torchaudio.save(estimated_path, signal, sample_rate=self.sample_rate, bits_per_sample=BITS_PER_SAMPLE_MUSDB18)
 
                 print("{} / {}".format(idx + 1, n_test), name, flush=True)
-    
-    def evaluate_all(self):
-        mus = musdb.DB(root=self.musdb18_root, subsets='test', is_wav=True)
-        
-        results = museval.EvalStore(frames_agg='median', tracks_agg='median')
 
-        for track in mus.tracks:
-            name = track.name
-            
-            estimates = {}
-            estimated_accompaniment = 0
+                if self.compare_fp32:
+                    # SDR of reduced precision estimates against fp32 estimates
+                    reference_sources = self.separate(mixture, reference_sources_amplitude) # (n_sources, n_mics, T_pad)
+                    sdr_fp32 = sdr(estimated_sources[..., :samples].reshape(n_sources, -1), reference_sources[..., :samples].reshape(n_sources, -1)) # (n_sources,)
+                    test_sdr_fp32 += sdr_fp32
 
-            for target in self.sources:
-                estimated_path = os.path.join(self.estimates_dir, name, "{}.wav".format(target))
-                estimated, _ = torchaudio.load(estimated_path)
-                estimated = estimated.numpy().transpose(1, 0)
-                estimates[target] = estimated
-                if target != 'vocals':
-                    estimated_accompaniment += estimated
+                    s = "{}, SDR against fp32:".format(name)
+                    for source_idx, target in enumerate(self.sources):
+                        s += " ({}) {:.3f}".format(target, sdr_fp32[source_idx].item())
 
-            estimates['accompaniment'] = estimated_accompaniment
+                    print(s, flush=True)
 
-            # Evaluate using museval
-            scores = museval.eval_mus_track(track, estimates, output_dir=self.json_dir)
-            results.add_track(scores)
+        if self.compare_fp32:
+            test_sdr_fp32 /= n_test
 
-            print(name)
-            print(scores, flush=True)
+            s = "SDR against fp32:"
+            for idx, target in enumerate(self.sources):
+                s += " ({}) {:.3f}".format(target, test_sdr_fp32[idx].item())
+
+            print(s, flush=True)
+    
+    def evaluate_all(self):
+        results = evaluate_all_tracks(self.musdb18_root, self.estimates_dir, self.sources, json_dir=self.json_dir, n_workers=self.n_eval_workers)
 
         print(results)
 
+    def separate(self, mixture, estimated_sources_amplitude):
+        """
+        Args:
+            mixture (1, n_mics, n_bins, n_frames)
+            estimated_sources_amplitude (n_sources, n_mics, n_bins, n_frames)
+        Returns:
+            estimated_sources (n_sources, n_mics, T)
+        """
+        estimated_sources = self.apply_multichannel_wiener_filter(mixture, estimated_sources_amplitude=estimated_sources_amplitude)
+        estimated_sources_channels = estimated_sources.size()[:-2]
+
+        estimated_sources = estimated_sources.view(-1, *estimated_sources.size()[-2:])
+        estimated_sources = istft(estimated_sources, self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalize, return_complex=False)
+        estimated_sources = estimated_sources.view(*estimated_sources_channels, -1) # -> (n_sources, n_mics, T)
+
+        return estimated_sources
+
     def apply_multichannel_wiener_filter(self, mixture, estimated_sources_amplitude, channels_first=True, eps=EPS):
         if self.use_norbert:
             estimated_sources = apply_multichannel_wiener_filter_norbert(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
         else:
-            estimated_sources = apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, channels_first=channels_first, eps=eps)
+            estimated_sources = apply_multichannel_wiener_filter_torch(mixture, estimated_sources_amplitude, channels_first=channels_first, memory_budget=self.wiener_memory_budget, eps=eps)
 
         return estimated_sources
\ No newline at end of file
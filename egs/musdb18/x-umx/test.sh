@@ -42,8 +42,13 @@ epochs=1000
 
 estimate_all=1
 evaluate_all=1
+n_eval_workers=1 # Number of processes for museval evaluation
+
+dtype='fp32' # 'fp32', 'bf16', or 'fp16'. Precision of model body. STFT, iSTFT, and Wiener filter are computed in fp32.
+compare_fp32=0 # If 1 and dtype is not 'fp32', SDR against fp32 estimates is reported. Estimation takes about twice as long.
 
 use_norbert=0
+wiener_memory_budget=0 # [MiB], 0 is handled as no limitation
 use_cuda=1
 seed=111
 gpu_id="0"
@@ -71,12 +76,19 @@ else
 fi
 
 model_dir="${save_dir}/model"
-log_dir="${save_dir}/log/test/${model_choice}"
-json_dir="${save_dir}/json/${model_choice}"
+
+result_dir="${model_choice}"
+
+if [ "${dtype}" != 'fp32' ]; then
+    result_dir="${result_dir}_${dtype}"
+fi
+
+log_dir="${save_dir}/log/test/${result_dir}"
+json_dir="${save_dir}/json/${result_dir}"
 model_path="${model_dir}/${model_choice}.pth"
 
 musdb=`basename "${musdb18_root}"`
-estimates_dir="${save_dir}/${musdb}/${model_choice}/test"
+estimates_dir="${save_dir}/${musdb}/${result_dir}/test"
 
 if [ ! -e "${log_dir}" ]; then
     mkdir -p "${log_dir}"
@@ -106,6 +118,10 @@ test.py \
 --model_path "${model_path}" \
 --estimate_all ${estimate_all} \
 --evaluate_all ${evaluate_all} \
+--n_eval_workers ${n_eval_workers} \
+--dtype ${dtype} \
+--compare_fp32 ${compare_fp32} \
 --use_norbert ${use_norbert} \
+--wiener_memory_budget ${wiener_memory_budget} \
 --use_cuda ${use_cuda} \
 --seed ${seed} | tee "${log_dir}/test_${time_stamp}.log"
@@ -52,6 +52,9 @@ epochs_finetune=150
 finetune=1 # If you don't want to use fintuned model, set `finetune=0`.
 model_choice="last"
 
+misi_iteration=0 # 0 is handled as no MISI
+misi_tol=0 # 0 is handled as running all iterations
+
 use_cuda=1
 overwrite=0
 seed=111
@@ -105,6 +108,8 @@ test.py \
 --hop_length ${hop_length} \
 --n_sources ${n_sources} \
 --criterion ${criterion} \
+--misi_iteration ${misi_iteration} \
+--misi_tol ${misi_tol} \
 --out_dir "${out_dir}" \
 --model_path "${model_path}" \
 --use_cuda ${use_cuda} \
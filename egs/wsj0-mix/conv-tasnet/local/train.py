@@ -12,6 +12,7 @@ from adhoc_driver import AdhocTrainer
 from models.conv_tasnet import ConvTasNet
 from criterion.sdr import NegSISDR
 from criterion.pit import PIT1d
+from criterion.hungarian import HungarianLoss
 
 parser = argparse.ArgumentParser(description="Training of Conv-TasNet")
 
@@ -45,6 +46,7 @@ parser.add_argument('--sep_norm', type=int, default=1, help='Normalization')
 parser.add_argument('--mask_nonlinear', type=str, default='sigmoid', help='Non-linear function of mask estiamtion')
 parser.add_argument('--n_sources', type=int, default=None, help='# speakers')
 parser.add_argument('--criterion', type=str, default='sisdr', choices=['sisdr'], help='Criterion')
+parser.add_argument('--pit', type=str, default='pit', choices=['pit', 'hungarian'], help='Permutation solver. hungarian: Linear assignment, which scales to many sources.')
 parser.add_argument('--optimizer', type=str, default='adam', choices=['sgd', 'adam', 'rmsprop'], help='Optimizer, [sgd, adam, rmsprop]')
 parser.add_argument('--lr', type=float, default=1e-3, help='Learning rate. Default: 1e-3')
 parser.add_argument('--weight_decay', type=float, default=0, help='Weight decay (L2 penalty). Default: 0')
@@ -115,7 +117,12 @@ def main(args):
     else:
         raise ValueError("Not support criterion {}".format(args.criterion))
 
-    pit_criterion = PIT1d(criterion, n_sources=args.n_sources)
+    if args.pit == 'pit':
+        pit_criterion = PIT1d(criterion, n_sources=args.n_sources)
+    elif args.pit == 'hungarian':
+        pit_criterion = HungarianLoss(criterion, n_sources=args.n_sources)
+    else:
+        raise ValueError("Not support pit {}".format(args.pit))
 
     if args.max_norm is not None and args.max_norm == 0:
         args.max_norm = None
@@ -44,6 +44,7 @@ mask_nonlinear='sigmoid'
 
 # Criterion
 criterion='sisdr'
+pit='pit'
 
 # Optimizer
 optimizer='adam'
@@ -121,6 +122,7 @@ train.py \
 --mask_nonlinear ${mask_nonlinear} \
 --n_sources ${n_sources} \
 --criterion ${criterion} \
+--pit ${pit} \
 --optimizer ${optimizer} \
 --lr ${lr} \
 --weight_decay ${weight_decay} \
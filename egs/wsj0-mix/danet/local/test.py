@@ -29,6 +29,8 @@ parser.add_argument('--hop_length', type=int, default=None, help='Hop size')
 parser.add_argument('--iter_clustering', type=int, default=-1, help='# iterations when clustering')
 parser.add_argument('--n_sources', type=int, default=None, help='# speakers')
 parser.add_argument('--criterion', type=str, default='se', choices=['se'], help='Criterion')
+parser.add_argument('--misi_iteration', type=int, default=0, help='# iterations of MISI phase reconstruction. 0: Not use MISI')
+parser.add_argument('--misi_tol', type=float, default=0, help='Tolerance of mixture consistency error in MISI. 0: Run all iterations')
 parser.add_argument('--out_dir', type=str, default=None, help='Output directory')
 parser.add_argument('--model_path', type=str, default='./tmp/model/best.pth', help='Path for model')
 parser.add_argument('--use_cuda', type=int, default=1, help='0: Not use cuda, 1: Use cuda')
@@ -73,6 +75,9 @@ def main(args):
     if args.iter_clustering < 0:
         args.iter_clustering = None # Iterates until convergence
 
+    if args.misi_tol <= 0:
+        args.misi_tol = None # Runs all iterations
+
     tester = AdhocTester(model, loader, pit_criterion, metrics, args)
     tester.run()
 
@@ -13,6 +13,7 @@ from utils.utils import draw_loss_curve
 from utils.bss import bss_eval_sources
 from algorithm.clustering import KMeans
 from transforms.stft import istft
+from algorithm.misi import MISI
 from driver import TrainerBase, TesterBase
 from criterion.pit import pit
 
@@ -309,6 +310,11 @@ class AdhocTester(TesterBase):
         self.target_type = args.target_type
         self.iter_clustering = args.iter_clustering
 
+        self.misi_iteration, self.misi_tol = args.misi_iteration, args.misi_tol
+
+        if self.misi_iteration > 0:
+            self.misi = MISI(self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalize)
+
     def run(self):
         self.model.eval()
 
@@ -372,6 +378,9 @@ class AdhocTester(TesterBase):
                 phase = torch.angle(mixture)
                 estimated_sources = estimated_sources_amplitude * torch.exp(1j * phase) # (n_sources, n_bins, n_frames)
 
+                if self.misi_iteration > 0:
+                    estimated_sources = self.misi(mixture.unsqueeze(dim=0), torch.abs(estimated_sources).unsqueeze(dim=0), iteration=self.misi_iteration, tol=self.misi_tol).squeeze(dim=0) # (n_sources, n_bins, n_frames)
+
                 T = T[0]  # ()
                 segment_IDs = segment_IDs[0] # (n_sources,)
                 mixture = istft(mixture, n_fft=self.n_fft, hop_length=self.hop_length, normalized=self.normalize, window=self.window, length=T).squeeze(dim=0) # (T,)
@@ -45,6 +45,9 @@ epochs=100
 
 model_choice="last"
 
+misi_iteration=0 # 0 is handled as no MISI
+misi_tol=0 # 0 is handled as running all iterations
+
 use_cuda=1
 overwrite=0
 seed=111
@@ -98,6 +101,8 @@ test.py \
 --iter_clustering ${iter_clustering} \
 --n_sources ${n_sources} \
 --criterion ${criterion} \
+--misi_iteration ${misi_iteration} \
+--misi_tol ${misi_tol} \
 --out_dir "${out_dir}" \
 --model_path "${model_path}" \
 --use_cuda ${use_cuda} \
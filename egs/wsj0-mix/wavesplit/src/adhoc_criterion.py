@@ -63,6 +63,34 @@ class SpeakerDistance(nn.Module):
         if batch_mean:
             loss = loss.mean(dim=0)
         return loss
+
+    def compute_permutation_loss(self, spk_vector, spk_embedding, _, patterns, feature_last=True):
+        """
+        Equivalent to stacking forward(spk_vector[:, :, pattern], ..., batch_mean=False, time_mean=False) for every pattern.
+        Args:
+            spk_vector:
+                (batch_size, T, n_sources, latent_dim) if feature_last
+                (batch_size, n_sources, latent_dim, T) otherwise
+            spk_embedding: (batch_size, n_sources, latent_dim)
+            _: All speaker embedding (n_training_sources, latent_dim)
+            patterns: (P, n_sources)
+        Returns:
+            loss: (batch_size, T, P)
+        """
+        if not feature_last:
+            spk_vector = spk_vector.permute(0, 3, 1, 2).contiguous() # (batch_size, T, n_sources, latent_dims)
+
+        distance = compute_pairwise_distance(spk_vector, spk_embedding) # (batch_size, T, n_sources, n_sources)
+        loss_euclid = gather_by_patterns(distance, patterns) # (batch_size, T, P, n_sources)
+
+        # Hinge loss is summed over all pairs of speaker vectors, so it does not depend on permutation.
+        distance_table = self.compute_euclid_distance(spk_vector.unsqueeze(dim=3), spk_vector.unsqueeze(dim=2), dim=-1) # (batch_size, T, n_sources, n_sources)
+        loss_hinge = F.relu(1 - distance_table) # (batch_size, T, n_sources, n_sources)
+        loss_hinge = torch.sum(self.mask * loss_hinge, dim=2) # (batch_size, T, n_sources)
+
+        loss = loss_euclid.mean(dim=-1) + loss_hinge.mean(dim=-1, keepdim=True) # (batch_size, T, P)
+
+        return loss
     
     def compute_euclid_distance(self, input, target, dim=-1, keepdim=False, scale=None, bias=None):
         distance = torch.sum((input - target)**2, dim=dim, keepdim=keepdim)
@@ -130,6 +158,40 @@ class GlobalClassificationLoss(nn.Module):
 
         return loss
 
+    def compute_permutation_loss(self, speaker_vector, speaker_embedding, all_speaker_embedding, patterns, feature_last=True):
+        """
+        Equivalent to stacking forward(speaker_vector[:, :, pattern], ..., batch_mean=False, time_mean=False) for every pattern.
+        Args:
+            speaker_vector:
+                (batch_size, T, n_sources, latent_dims) if feature_last=True
+                (batch_size, n_sources, latent_dims, T) otherwise
+            speaker_embedding: (batch_size, n_sources, latent_dim)
+            all_speaker_embedding: (n_training_sources, latent_dim)
+            patterns: (P, n_sources)
+        Returns:
+            loss: (batch_size, T, P)
+        """
+        if not feature_last:
+            speaker_vector = speaker_vector.permute(0, 3, 1, 2).contiguous() # (batch_size, T, n_sources, latent_dims)
+
+        distance = compute_pairwise_distance(speaker_vector, speaker_embedding) # (batch_size, T, n_sources, n_sources)
+        rescaled_distance = torch.abs(self.scale) * distance + self.bias
+        rescaled_distance = gather_by_patterns(rescaled_distance, patterns) # (batch_size, T, P, n_sources)
+
+        # Normalization term depends only on each speaker vector, so it does not depend on permutation.
+        rescaled_all_distance = compute_all_distance(speaker_vector, all_speaker_embedding) # (batch_size, T, n_sources, n_training_sources)
+        rescaled_all_distance = torch.abs(self.scale) * rescaled_all_distance + self.bias
+        loss_normalization = torch.logsumexp(- rescaled_all_distance, dim=3) # (batch_size, T, n_sources)
+
+        if self.source_reduction == 'mean':
+            loss = rescaled_distance.mean(dim=-1) + loss_normalization.mean(dim=-1, keepdim=True)
+        elif self.source_reduction == 'sum':
+            loss = rescaled_distance.sum(dim=-1) + loss_normalization.sum(dim=-1, keepdim=True)
+        else:
+            raise NotImplementedError("Specify source_reduction.")
+
+        return loss
+
     def compute_euclid_distance(self, input, target, dim=-1, keepdim=False, scale=None, bias=None):
         distance = torch.sum((input - target)**2, dim=dim, keepdim=keepdim)
 
@@ -177,6 +239,43 @@ class SpeakerLoss(nn.Module):
             loss = loss.mean(dim=0)
 
         return loss
+
+    def compute_permutation_loss(self, speaker_vector, speaker_embedding, all_speaker_embedding, patterns, feature_last=True):
+        """
+        Equivalent to stacking forward(speaker_vector[:, :, pattern], ..., batch_mean=False, time_mean=False) for every pattern.
+        Args:
+            speaker_vector:
+                (batch_size, T, n_sources, latent_dims) if feature_last=True
+                (batch_size, n_sources, latent_dims, T) otherwise
+            speaker_embedding: (batch_size, n_sources, latent_dim)
+            all_speaker_embedding: (n_training_sources, latent_dim)
+            patterns: (P, n_sources)
+        Returns:
+            loss: (batch_size, T, P)
+        """
+        if not feature_last:
+            speaker_vector = speaker_vector.permute(0, 3, 1, 2).contiguous() # (batch_size, T, n_sources, latent_dims)
+
+        distance = compute_pairwise_distance(speaker_vector, speaker_embedding) # (batch_size, T, n_sources, n_sources)
+        rescaled_distance = torch.abs(self.scale) * distance + self.bias
+        distance = gather_by_patterns(distance, patterns) # (batch_size, T, P, n_sources)
+        rescaled_distance = gather_by_patterns(rescaled_distance, patterns) # (batch_size, T, P, n_sources)
+
+        # Hinge loss and normalization term of global classification do not depend on permutation.
+        distance_table = self.compute_euclid_distance(speaker_vector.unsqueeze(dim=3), speaker_vector.unsqueeze(dim=2), dim=-1) # (batch_size, T, n_sources, n_sources)
+        loss_hinge = F.relu(1 - distance_table) # (batch_size, T, n_sources, n_sources)
+        loss_hinge = torch.sum(self.mask * loss_hinge, dim=2) # (batch_size, T, n_sources)
+
+        rescaled_all_distance = compute_all_distance(speaker_vector, all_speaker_embedding) # (batch_size, T, n_sources, n_training_sources)
+        rescaled_all_distance = torch.abs(self.scale) * rescaled_all_distance + self.bias
+        loss_normalization = torch.logsumexp(- rescaled_all_distance, dim=3) # (batch_size, T, n_sources)
+
+        loss_distance = distance.mean(dim=-1) + loss_hinge.mean(dim=-1, keepdim=True) # (batch_size, T, P)
+        loss_local = rescaled_distance.mean(dim=-1) + torch.logsumexp(- rescaled_distance, dim=-1) # (batch_size, T, P)
+        loss_global = rescaled_distance.mean(dim=-1) + loss_normalization.mean(dim=-1, keepdim=True) # (batch_size, T, P)
+        loss = loss_distance + loss_local + loss_global
+
+        return loss
     
     def compute_speaker_loss(self, speaker_vector, speaker_embedding, all_speaker_embedding, scale=None, bias=None, feature_last=True, batch_mean=True):
         """
@@ -270,6 +369,45 @@ class SpeakerLoss(nn.Module):
         
         return distance
 
+def compute_pairwise_distance(speaker_vector, speaker_embedding):
+    """
+    Args:
+        speaker_vector: (batch_size, T, n_sources, latent_dim)
+        speaker_embedding: (batch_size, n_sources, latent_dim)
+    Returns:
+        distance: (batch_size, T, n_sources, n_sources), squared euclid distance.
+    """
+    speaker_embedding = speaker_embedding.unsqueeze(dim=1).unsqueeze(dim=2) # (batch_size, 1, 1, n_sources, latent_dim)
+    distance = torch.sum((speaker_vector.unsqueeze(dim=3) - speaker_embedding)**2, dim=-1) # (batch_size, T, n_sources, n_sources)
+
+    return distance
+
+def compute_all_distance(speaker_vector, all_speaker_embedding):
+    """
+    Args:
+        speaker_vector: (batch_size, T, n_sources, latent_dim)
+        all_speaker_embedding: (n_training_sources, latent_dim)
+    Returns:
+        distance: (batch_size, T, n_sources, n_training_sources), squared euclid distance.
+    """
+    # Expand squared distance not to build (batch_size, T, n_sources, n_training_sources, latent_dim) tensor.
+    distance = torch.sum(speaker_vector**2, dim=-1, keepdim=True) - 2 * torch.matmul(speaker_vector, all_speaker_embedding.t()) + torch.sum(all_speaker_embedding**2, dim=-1)
+
+    return distance
+
+def gather_by_patterns(distance, patterns):
+    """
+    Args:
+        distance: (batch_size, T, n_sources, n_sources)
+        patterns: (P, n_sources)
+    Returns:
+        distance: (batch_size, T, P, n_sources), where output[:, :, p, n] = distance[:, :, patterns[p, n], n].
+    """
+    n_sources = patterns.size(1)
+    source_idx = torch.arange(n_sources, device=patterns.device)
+
+    return distance[:, :, patterns, source_idx]
+
 class EntropyRegularizationLoss(nn.Module):
     def __init__(self, eps=EPS):
         super().__init__()
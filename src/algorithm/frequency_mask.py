@@ -2,6 +2,7 @@ import warnings
 import math
 
 import torch
+import torch.nn as nn
 
 EPS = 1e-12
 
@@ -194,7 +195,7 @@ def ideal_complex_mask(input, source_dim=None, eps=EPS):
     mask = compute_ideal_complex_mask(input, source_dim=source_dim, eps=eps)
     return mask
 
-def multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=1, channels_first=True, eps=EPS):
+def multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=1, channels_first=True, memory_budget=None, eps=EPS):
     """
     Multichannel Wiener filter.
     Implementation is based on norbert package.
@@ -203,6 +204,7 @@ def multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=1
         estimated_sources_amplitude <torch.Tensor>: Nonnegative tensor with shape of (n_sources, n_channels, n_bins, n_frames) or (batch_size, n_sources, n_channels, n_bins, n_frames)
         iteration <int>: Iteration of EM algorithm updates
         channels_first <bool>: Only supports True
+        memory_budget <float>: Memory budget [MiB] of intermediate tensors in one chunk of frames. If None or 0, all frames are processed at once.
         eps <float>: small value for numerical stability
     """
     assert channels_first, "`channels_first` is expected True, but given {}".format(channels_first)
@@ -215,19 +217,13 @@ def multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=1
         Shape of mixture is (1, n_channels, n_bins, n_frames) or (n_channels, n_bins, n_frames)
         """
         if n_dims_mixture == 4:
-            mixture = mixture.squeeze(dim=1) # (n_channels, n_bins, n_frames)
+            if mixture.size(0) != 1:
+                raise ValueError("mixture.size(0) is expected 1, but given {}.".format(mixture.size(0)))
+            mixture = mixture.squeeze(dim=0) # (n_channels, n_bins, n_frames)
         elif n_dims_mixture != 3:
             raise ValueError("mixture.dim() is expected 3 or 4, but given {}.".format(mixture.dim()))
 
-        # Use soft mask
-        ratio = estimated_sources_amplitude / (estimated_sources_amplitude.sum(dim=0) + eps)
-        estimated_sources = ratio * mixture
-
-        norm = max(1, torch.abs(mixture).max() / 10)
-        mixture, estimated_sources = mixture / norm, estimated_sources / norm
-
-        estimated_sources = update_em(mixture, estimated_sources, iteration, eps=eps)
-        estimated_sources = norm * estimated_sources
+        mixture, estimated_sources_amplitude = mixture.unsqueeze(dim=0), estimated_sources_amplitude.unsqueeze(dim=0)
     elif n_dims == 5:
         """
         Shape of mixture is (batch_size, 1, n_channels, n_bins, n_frames) or (batch_size, n_channels, n_bins, n_frames)
@@ -236,25 +232,30 @@ def multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=1
             mixture = mixture.squeeze(dim=1) # (batch_size, n_channels, n_bins, n_frames)
         elif n_dims_mixture != 4:
             raise ValueError("mixture.dim() is expected 4 or 5, but given {}.".format(mixture.dim()))
+    else:
+        raise ValueError("estimated_sources_amplitude.dim() is expected 4 or 5, but given {}.".format(estimated_sources_amplitude.dim()))
 
-        estimated_sources = []
+    batch_size, n_sources, n_channels, n_bins, n_frames = estimated_sources_amplitude.size()
+    chunk_size = compute_frames_per_chunk(batch_size, n_sources, n_channels, n_bins, n_frames, memory_budget=memory_budget, element_size=mixture.element_size())
 
-        for _mixture, _estimated_sources_amplitude in zip(mixture, estimated_sources_amplitude):
-            # Use soft mask
-            ratio = _estimated_sources_amplitude / (_estimated_sources_amplitude.sum(dim=0) + eps)
-            _estimated_sources = ratio * _mixture
+    norm = torch.amax(torch.abs(mixture), dim=(1, 2, 3), keepdim=True) / 10
+    norm = torch.clamp(norm, min=1) # (batch_size, 1, 1, 1)
+    mixture = mixture / norm
 
-            norm = max(1, torch.abs(_mixture).max() / 10)
-            _mixture, _estimated_sources = _mixture / norm, _estimated_sources / norm
+    # Use soft mask
+    estimated_sources = mixture.new_empty((batch_size, n_sources, n_channels, n_bins, n_frames))
 
-            _estimated_sources = update_em(_mixture, _estimated_sources, iteration, eps=eps)
-            _estimated_sources = norm * _estimated_sources
+    for start_idx in range(0, n_frames, chunk_size):
+        end_idx = min(start_idx + chunk_size, n_frames)
+        _estimated_sources_amplitude = estimated_sources_amplitude[..., start_idx:end_idx]
+        ratio = _estimated_sources_amplitude / (_estimated_sources_amplitude.sum(dim=1, keepdim=True) + eps)
+        estimated_sources[..., start_idx:end_idx] = ratio * mixture[..., start_idx:end_idx].unsqueeze(dim=1) # (batch_size, n_sources, n_channels, n_bins, chunk_size)
 
-            estimated_sources.append(_estimated_sources.unsqueeze(dim=0))
+    estimated_sources = _update_em_batch(mixture, estimated_sources, iteration, chunk_size=chunk_size, eps=eps)
+    estimated_sources = estimated_sources.mul_(norm.unsqueeze(dim=1))
 
-        estimated_sources = torch.cat(estimated_sources, dim=0)
-    else:
-        raise ValueError("estimated_sources_amplitude.dim() is expected 4 or 5, but given {}.".format(estimated_sources_amplitude.dim()))
+    if n_dims == 4:
+        estimated_sources = estimated_sources.squeeze(dim=0)
 
     return estimated_sources
 
@@ -271,6 +272,11 @@ def update_em(mixture, estimated_sources, iteration=1, source_parallel=False, bi
     """
     n_sources, n_channels, _, _ = estimated_sources.size()
 
+    if bin_parallel and frame_parallel:
+        estimated_sources = update_em_batch(mixture.unsqueeze(dim=0), estimated_sources.unsqueeze(dim=0), iteration, eps=eps)
+
+        return estimated_sources.squeeze(dim=0)
+
     for iteration_idx in range(iteration):
         v, R = [], []
         Cxx = 0
@@ -339,6 +345,141 @@ def update_em(mixture, estimated_sources, iteration=1, source_parallel=False, bi
 
     return estimated_sources
 
+def update_em_batch(mixture, estimated_sources, iteration=1, memory_budget=None, eps=EPS):
+    """
+    EM updates of multichannel Wiener filter vectorized over batch and sources.
+    Args:
+        mixture <torch.Tensor>: Complex tensor with shape of (batch_size, n_channels, n_bins, n_frames)
+        estimated_sources <torch.Tensor>: Complex tensor with shape of (batch_size, n_sources, n_channels, n_bins, n_frames)
+        iteration <int>: Iteration of EM algorithm updates
+        memory_budget <float>: Memory budget [MiB] of intermediate tensors in one chunk of frames. If None or 0, all frames are processed at once.
+        eps <float>: small value for numerical stability
+    Returns:
+        estimated_sources <torch.Tensor>: (batch_size, n_sources, n_channels, n_bins, n_frames)
+    """
+    batch_size, n_sources, n_channels, n_bins, n_frames = estimated_sources.size()
+    chunk_size = compute_frames_per_chunk(batch_size, n_sources, n_channels, n_bins, n_frames, memory_budget=memory_budget, element_size=estimated_sources.element_size())
+
+    estimated_sources = _update_em_batch(mixture, estimated_sources.clone(), iteration, chunk_size=chunk_size, eps=eps)
+
+    return estimated_sources
+
+def _update_em_batch(mixture, estimated_sources, iteration=1, chunk_size=None, eps=EPS):
+    """
+    Same as update_em_batch, but estimated_sources is overwritten chunk by chunk.
+    Statistics of all frames are computed before the update, so the result does not depend on chunk_size.
+    """
+    n_frames = estimated_sources.size(-1)
+
+    if chunk_size is None:
+        chunk_size = n_frames
+
+    for iteration_idx in range(iteration):
+        v, R = get_stats_batch(estimated_sources, chunk_size=chunk_size, eps=eps) # (batch_size, n_sources, n_bins, n_frames), (batch_size, n_sources, n_channels, n_channels, n_bins)
+
+        for start_idx in range(0, n_frames, chunk_size):
+            end_idx = min(start_idx + chunk_size, n_frames)
+            _v = v[..., start_idx:end_idx] # (batch_size, n_sources, n_bins, chunk_size)
+            Cxx = torch.einsum('bsfn,bsijf->bijfn', _v.to(R.dtype), R) # (batch_size, n_channels, n_channels, n_bins, chunk_size)
+            inv_Cxx = inverse_hermitian(Cxx, eps=eps) # (batch_size, n_channels, n_channels, n_bins, chunk_size)
+            estimated_sources[..., start_idx:end_idx] = apply_wiener_gain(mixture[..., start_idx:end_idx], _v, R, inv_Cxx) # (batch_size, n_sources, n_channels, n_bins, chunk_size)
+
+    return estimated_sources
+
+def compute_frames_per_chunk(batch_size, n_sources, n_channels, n_bins, n_frames, memory_budget=None, element_size=8):
+    """
+    Args:
+        memory_budget <float>: Memory budget [MiB] of intermediate tensors in one chunk of frames. If None or 0, all frames are processed at once.
+        element_size <int>: Bytes of one complex element.
+    Returns:
+        chunk_size <int>: Number of frames processed at once.
+    """
+    if not memory_budget:
+        return n_frames
+
+    # Covariance, its inverse and temporaries of closed form inverse, whitened mixture, and sources in statistics and gain computation
+    bytes_per_frame = element_size * batch_size * n_bins * (4 * n_channels**2 + n_channels + 3 * n_sources * n_channels)
+    chunk_size = max(int(memory_budget * 2**20) // bytes_per_frame, 1)
+
+    return min(chunk_size, n_frames)
+
+def get_stats_batch(spectrogram, chunk_size=None, eps=EPS):
+    """
+    Compute empirical parameters of local gaussian model for batched input.
+    Spatial covariance is accumulated over chunks of frames, so intermediate tensors are bounded by chunk_size.
+    Args:
+        spectrogram <torch.Tensor>: (batch_size, n_sources, n_mics, n_bins, n_frames)
+        chunk_size <int>: Number of frames reduced at once. If None, all frames are reduced at once.
+    Returns:
+        psd <torch.Tensor>: (batch_size, n_sources, n_bins, n_frames)
+        covariance <torch.Tensor>: (batch_size, n_sources, n_mics, n_mics, n_bins)
+    """
+    batch_size, n_sources, _, n_bins, n_frames = spectrogram.size()
+
+    if chunk_size is None:
+        chunk_size = n_frames
+
+    psd = spectrogram.real.new_empty((batch_size, n_sources, n_bins, n_frames))
+    covariance = 0
+
+    for start_idx in range(0, n_frames, chunk_size):
+        end_idx = min(start_idx + chunk_size, n_frames)
+        _spectrogram = spectrogram[..., start_idx:end_idx] # (batch_size, n_sources, n_mics, n_bins, chunk_size)
+        psd[..., start_idx:end_idx] = torch.mean(_spectrogram.real**2 + _spectrogram.imag**2, dim=2)
+        covariance = covariance + torch.einsum('bsifn,bsjfn->bsijf', _spectrogram, _spectrogram.conj()) # (batch_size, n_sources, n_mics, n_mics, n_bins)
+
+    denominator = psd.sum(dim=3) + eps # (batch_size, n_sources, n_bins)
+    covariance = covariance / denominator.unsqueeze(dim=2).unsqueeze(dim=3)
+
+    return psd, covariance
+
+def inverse_hermitian(Cxx, eps=EPS):
+    """
+    Inverse of Hermitian matrices regularized by sqrt(eps) * I.
+    Monaural and stereo inputs are inverted in closed form, otherwise torch.linalg.inv is used.
+    Args:
+        Cxx <torch.Tensor>: Complex tensor with shape of (batch_size, n_channels, n_channels, n_bins, n_frames)
+    Returns:
+        inv_Cxx <torch.Tensor>: (batch_size, n_channels, n_channels, n_bins, n_frames)
+    """
+    n_channels = Cxx.size(1)
+
+    if n_channels == 1:
+        inv_Cxx = 1 / (Cxx + math.sqrt(eps))
+    elif n_channels == 2:
+        a, d = Cxx[:, 0, 0].real + math.sqrt(eps), Cxx[:, 1, 1].real + math.sqrt(eps) # (batch_size, n_bins, n_frames)
+        b = Cxx[:, 0, 1]
+        det = a * d - (b.real**2 + b.imag**2)
+        inv_Cxx = torch.stack([
+            torch.stack([d.to(b.dtype), - b], dim=1),
+            torch.stack([- b.conj(), a.to(b.dtype)], dim=1)
+        ], dim=1) / det.unsqueeze(dim=1).unsqueeze(dim=2)
+    else:
+        eye = torch.eye(n_channels, dtype=Cxx.dtype, device=Cxx.device)
+        Cxx = Cxx.permute(0, 3, 4, 1, 2) # (batch_size, n_bins, n_frames, n_channels, n_channels)
+        inv_Cxx = torch.linalg.inv(Cxx + math.sqrt(eps) * eye)
+        inv_Cxx = inv_Cxx.permute(0, 3, 4, 1, 2) # (batch_size, n_channels, n_channels, n_bins, n_frames)
+
+    return inv_Cxx
+
+def apply_wiener_gain(mixture, psd, covariance, inv_Cxx):
+    """
+    Apply gain v * R @ inv_Cxx to mixture.
+    inv_Cxx @ mixture is computed first, so gain itself is not materialized.
+    Args:
+        mixture <torch.Tensor>: Complex tensor with shape of (batch_size, n_channels, n_bins, n_frames)
+        psd <torch.Tensor>: (batch_size, n_sources, n_bins, n_frames)
+        covariance <torch.Tensor>: (batch_size, n_sources, n_channels, n_channels, n_bins)
+        inv_Cxx <torch.Tensor>: (batch_size, n_channels, n_channels, n_bins, n_frames)
+    Returns:
+        estimated_sources <torch.Tensor>: (batch_size, n_sources, n_channels, n_bins, n_frames)
+    """
+    whitened = torch.sum(inv_Cxx * mixture.unsqueeze(dim=1), dim=2) # (batch_size, n_channels, n_bins, n_frames)
+    estimated_sources = torch.einsum('bsijf,bjfn->bsifn', covariance, whitened) # (batch_size, n_sources, n_channels, n_bins, n_frames)
+    estimated_sources = psd.unsqueeze(dim=2) * estimated_sources
+
+    return estimated_sources
+
 def get_stats(spectrogram, eps=EPS):
     """
     Compute empirical parameters of local gaussian model.
@@ -371,6 +512,166 @@ def get_stats(spectrogram, eps=EPS):
 
     return psd, covariance
 
+def multichannel_wiener_filter_real(mixture, estimated_sources_amplitude, iteration=1, eps=EPS):
+    """
+    Multichannel Wiener filter computed by real arithmetic.
+    Complex tensors and torch.linalg.inv are not used, so this function can be exported by TorchScript and ONNX.
+    Inverse of spatial covariance is computed in closed form, so only monaural and stereo inputs are supported.
+    Args:
+        mixture <torch.Tensor>: (batch_size, n_channels, n_bins, n_frames, 2), where last dimension corresponds to real and imaginary parts.
+        estimated_sources_amplitude <torch.Tensor>: Nonnegative tensor with shape of (batch_size, n_sources, n_channels, n_bins, n_frames)
+        iteration <int>: Iteration of EM algorithm updates
+        eps <float>: small value for numerical stability
+    Returns:
+        estimated_sources <torch.Tensor>: (batch_size, n_sources, n_channels, n_bins, n_frames, 2)
+    """
+    n_channels = mixture.size(1)
+
+    if n_channels not in [1, 2]:
+        raise NotImplementedError("Only supports monaural or stereo input, but given {} channels.".format(n_channels))
+
+    mixture = mixture.unsqueeze(dim=1) # (batch_size, 1, n_channels, n_bins, n_frames, 2)
+
+    # Use soft mask
+    ratio = estimated_sources_amplitude / (estimated_sources_amplitude.sum(dim=1, keepdim=True) + eps)
+    estimated_sources = ratio.unsqueeze(dim=-1) * mixture
+
+    mixture_amplitude = torch.sqrt(torch.sum(mixture**2, dim=-1)) # (batch_size, 1, n_channels, n_bins, n_frames)
+    norm = torch.amax(mixture_amplitude, dim=(1, 2, 3, 4), keepdim=True) / 10
+    norm = torch.clamp(norm, min=1).unsqueeze(dim=-1) # (batch_size, 1, 1, 1, 1, 1)
+    mixture, estimated_sources = mixture / norm, estimated_sources / norm
+
+    mixture_real, mixture_imag = mixture[..., 0].unsqueeze(dim=2), mixture[..., 1].unsqueeze(dim=2) # (batch_size, 1, 1, n_channels, n_bins, n_frames)
+
+    for iteration_idx in range(iteration):
+        real, imag = estimated_sources[..., 0], estimated_sources[..., 1] # (batch_size, n_sources, n_channels, n_bins, n_frames)
+
+        # Local gaussian model
+        v = torch.mean(real**2 + imag**2, dim=2) # (batch_size, n_sources, n_bins, n_frames)
+        real_i, imag_i = real.unsqueeze(dim=3), imag.unsqueeze(dim=3) # (batch_size, n_sources, n_channels, 1, n_bins, n_frames)
+        real_j, imag_j = real.unsqueeze(dim=2), imag.unsqueeze(dim=2) # (batch_size, n_sources, 1, n_channels, n_bins, n_frames)
+        R_real = torch.sum(real_i * real_j + imag_i * imag_j, dim=5) # (batch_size, n_sources, n_channels, n_channels, n_bins)
+        R_imag = torch.sum(imag_i * real_j - real_i * imag_j, dim=5) # (batch_size, n_sources, n_channels, n_channels, n_bins)
+        denominator = v.sum(dim=3) + eps # (batch_size, n_sources, n_bins)
+        R_real = R_real / denominator.unsqueeze(dim=2).unsqueeze(dim=3)
+        R_imag = R_imag / denominator.unsqueeze(dim=2).unsqueeze(dim=3)
+
+        v = v.unsqueeze(dim=2).unsqueeze(dim=3) # (batch_size, n_sources, 1, 1, n_bins, n_frames)
+        R_real, R_imag = R_real.unsqueeze(dim=5), R_imag.unsqueeze(dim=5) # (batch_size, n_sources, n_channels, n_channels, n_bins, 1)
+        Cxx_real = torch.sum(v * R_real, dim=1) # (batch_size, n_channels, n_channels, n_bins, n_frames)
+        Cxx_imag = torch.sum(v * R_imag, dim=1) # (batch_size, n_channels, n_channels, n_bins, n_frames)
+
+        # Inverse of Hermitian matrix in closed form
+        if n_channels == 1:
+            inv_Cxx_real = 1 / (Cxx_real + math.sqrt(eps))
+            inv_Cxx_imag = torch.zeros_like(Cxx_imag)
+        else:
+            a, d = Cxx_real[:, 0, 0] + math.sqrt(eps), Cxx_real[:, 1, 1] + math.sqrt(eps)
+            b_real, b_imag = Cxx_real[:, 0, 1], Cxx_imag[:, 0, 1]
+            det = a * d - (b_real**2 + b_imag**2)
+            zeros = torch.zeros_like(det)
+            inv_Cxx_real = torch.stack([
+                torch.stack([d, - b_real], dim=1),
+                torch.stack([- b_real, a], dim=1)
+            ], dim=1) / det.unsqueeze(dim=1).unsqueeze(dim=2)
+            inv_Cxx_imag = torch.stack([
+                torch.stack([zeros, - b_imag], dim=1),
+                torch.stack([b_imag, zeros], dim=1)
+            ], dim=1) / det.unsqueeze(dim=1).unsqueeze(dim=2) # (batch_size, n_channels, n_channels, n_bins, n_frames)
+
+        # gain = v * R @ inv_Cxx
+        R_real, R_imag = R_real.unsqueeze(dim=4), R_imag.unsqueeze(dim=4) # (batch_size, n_sources, n_channels, n_channels, 1, n_bins, 1)
+        inv_Cxx_real, inv_Cxx_imag = inv_Cxx_real.unsqueeze(dim=1).unsqueeze(dim=2), inv_Cxx_imag.unsqueeze(dim=1).unsqueeze(dim=2) # (batch_size, 1, 1, n_channels, n_channels, n_bins, n_frames)
+        gain_real = torch.sum(R_real * inv_Cxx_real - R_imag * inv_Cxx_imag, dim=3) # (batch_size, n_sources, n_channels, n_channels, n_bins, n_frames)
+        gain_imag = torch.sum(R_real * inv_Cxx_imag + R_imag * inv_Cxx_real, dim=3) # (batch_size, n_sources, n_channels, n_channels, n_bins, n_frames)
+        gain_real, gain_imag = v * gain_real, v * gain_imag
+
+        real = torch.sum(gain_real * mixture_real - gain_imag * mixture_imag, dim=3) # (batch_size, n_sources, n_channels, n_bins, n_frames)
+        imag = torch.sum(gain_real * mixture_imag + gain_imag * mixture_real, dim=3) # (batch_size, n_sources, n_channels, n_bins, n_frames)
+        estimated_sources = torch.stack([real, imag], dim=-1)
+
+    estimated_sources = norm * estimated_sources
+
+    return estimated_sources
+
+class OnlineMultichannelWienerFilter(nn.Module):
+    """
+    Online (frame-recursive) multichannel Wiener filter for streaming separation.
+    Spatial covariance matrices and PSDs of sources are exponentially weighted over frames and updated block by block,
+    so latency is bounded by block length and memory does not grow with signal length.
+    With iteration=1, accumulated statistics do not depend on how the stream is split into blocks, because they are weighted frame by frame.
+    The output does, since all frames in a block are filtered with statistics including the whole block.
+    With forgetting_factor=1 and a single block, the output is same as multichannel_wiener_filter without normalization of mixture.
+    """
+    def __init__(self, forgetting_factor=0.98, iteration=1, eps=EPS):
+        """
+        Args:
+            forgetting_factor <float>: Forgetting factor per frame in (0, 1].
+            iteration <int>: Iteration of EM algorithm updates in each block
+            eps <float>: small value for numerical stability
+        """
+        super().__init__()
+
+        if not 0 < forgetting_factor <= 1:
+            raise ValueError("forgetting_factor is expected in (0, 1], but given {}.".format(forgetting_factor))
+
+        self.forgetting_factor = forgetting_factor
+        self.iteration = iteration
+        self.eps = eps
+
+        self.reset()
+
+    def reset(self):
+        """
+        Clear statistics of previous blocks. Call this before a new stream starts.
+        """
+        self.covariance, self.psd_sum = None, None
+
+    def forward(self, mixture, estimated_sources_amplitude):
+        """
+        Args:
+            mixture <torch.Tensor>: Complex tensor with shape of (batch_size, 1, n_channels, n_bins, n_frames) or (batch_size, n_channels, n_bins, n_frames), where n_frames is block length.
+            estimated_sources_amplitude <torch.Tensor>: Nonnegative tensor with shape of (batch_size, n_sources, n_channels, n_bins, n_frames)
+        Returns:
+            estimated_sources <torch.Tensor>: Complex tensor with shape of (batch_size, n_sources, n_channels, n_bins, n_frames)
+        """
+        eps = self.eps
+
+        n_dims_mixture = mixture.dim()
+
+        if n_dims_mixture == 5:
+            mixture = mixture.squeeze(dim=1) # (batch_size, n_channels, n_bins, n_frames)
+        elif n_dims_mixture != 4:
+            raise ValueError("mixture.dim() is expected 4 or 5, but given {}.".format(mixture.dim()))
+
+        n_frames = mixture.size(-1)
+
+        # Weights of frames in this block, where the last frame has weight 1.
+        weights = self.forgetting_factor**torch.arange(n_frames - 1, -1, -1, device=mixture.device).to(estimated_sources_amplitude.dtype) # (n_frames,)
+        decay = self.forgetting_factor**n_frames
+
+        # Use soft mask
+        ratio = estimated_sources_amplitude / (estimated_sources_amplitude.sum(dim=1, keepdim=True) + eps)
+        estimated_sources = ratio * mixture.unsqueeze(dim=1) # (batch_size, n_sources, n_channels, n_bins, n_frames)
+
+        for iteration_idx in range(self.iteration):
+            psd = torch.mean(estimated_sources.real**2 + estimated_sources.imag**2, dim=2) # (batch_size, n_sources, n_bins, n_frames)
+            covariance = torch.einsum('bsifn,bsjfn->bsijf', weights * estimated_sources, estimated_sources.conj()) # (batch_size, n_sources, n_channels, n_channels, n_bins)
+            psd_sum = torch.sum(weights * psd, dim=3) # (batch_size, n_sources, n_bins)
+
+            if self.covariance is not None:
+                covariance = decay * self.covariance + covariance
+                psd_sum = decay * self.psd_sum + psd_sum
+
+            R = covariance / (psd_sum + eps).unsqueeze(dim=2).unsqueeze(dim=3) # (batch_size, n_sources, n_channels, n_channels, n_bins)
+            Cxx = torch.einsum('bsfn,bsijf->bijfn', psd.to(R.dtype), R) # (batch_size, n_channels, n_channels, n_bins, n_frames)
+            inv_Cxx = inverse_hermitian(Cxx, eps=eps)
+            estimated_sources = apply_wiener_gain(mixture, psd, R, inv_Cxx) # (batch_size, n_sources, n_channels, n_bins, n_frames)
+
+        self.covariance, self.psd_sum = covariance, psd_sum
+
+        return estimated_sources
+
 def _prepare_data():
     sample_rate = 16000
     resampler = torchaudio.transforms.Resample(44100, sample_rate)
@@ -422,6 +723,77 @@ def _test_spectrogram(spectrogram, method='PSM'):
     for signal, tag in zip(estimated_signal, ['man', 'woman']):
         torchaudio.save("data/frequency_mask/{}-estimated_{}.wav".format(tag, method), signal.unsqueeze(dim=0), sample_rate=16000, bits_per_sample=16)
 
+def _test_multichannel_wiener_filter(iteration=2):
+    torch.manual_seed(111)
+
+    n_sources, n_channels, n_bins, n_frames = 4, 2, 65, 40
+    mixture = 20 * torch.randn(1, n_channels, n_bins, n_frames, dtype=torch.cdouble)
+    estimated_sources_amplitude = torch.rand(n_sources, n_channels, n_bins, n_frames, dtype=torch.double)
+
+    # Reference: soft mask and EM updates of norbert-based implementation
+    _mixture = mixture.squeeze(dim=0)
+    ratio = estimated_sources_amplitude / (estimated_sources_amplitude.sum(dim=0) + EPS)
+    norm = max(1, torch.abs(_mixture).max() / 10)
+    reference = update_em(_mixture / norm, ratio * _mixture / norm, iteration, frame_parallel=False)
+    reference = norm * reference
+
+    for _mixture in [mixture, mixture.squeeze(dim=0)]:
+        estimated_sources = multichannel_wiener_filter(_mixture, estimated_sources_amplitude, iteration=iteration)
+        error = torch.abs(estimated_sources - reference).max() / torch.abs(reference).max()
+        print("mixture {} -> estimated sources {}, error: {:.3e}".format(tuple(_mixture.size()), tuple(estimated_sources.size()), error.item()))
+
+def _test_multichannel_wiener_filter_chunk(iteration=2, memory_budget=0.3):
+    torch.manual_seed(111)
+
+    batch_size, n_sources, n_channels, n_bins, n_frames = 2, 4, 2, 65, 40
+    mixture = 20 * torch.randn(batch_size, n_channels, n_bins, n_frames, dtype=torch.cdouble)
+    estimated_sources_amplitude = torch.rand(batch_size, n_sources, n_channels, n_bins, n_frames, dtype=torch.double)
+
+    for _mixture, _estimated_sources_amplitude in [(mixture[:1], estimated_sources_amplitude[0]), (mixture, estimated_sources_amplitude)]:
+        reference = multichannel_wiener_filter(_mixture, _estimated_sources_amplitude, iteration=iteration)
+        estimated_sources = multichannel_wiener_filter(_mixture, _estimated_sources_amplitude, iteration=iteration, memory_budget=memory_budget)
+        error = torch.abs(estimated_sources - reference).max() / torch.abs(reference).max()
+        _batch_size = 1 if _estimated_sources_amplitude.dim() == 4 else batch_size
+        chunk_size = compute_frames_per_chunk(_batch_size, n_sources, n_channels, n_bins, n_frames, memory_budget=memory_budget, element_size=_mixture.element_size())
+        print("mixture {}, {} frames per chunk, error: {:.3e}".format(tuple(_mixture.size()), chunk_size, error.item()))
+
+def _test_online_multichannel_wiener_filter(forgetting_factor=0.95, block_size=16):
+    torch.manual_seed(111)
+
+    batch_size, n_sources, n_channels, n_bins, n_frames = 2, 4, 2, 65, 40
+    mixture = torch.randn(batch_size, n_channels, n_bins, n_frames, dtype=torch.cdouble)
+    estimated_sources_amplitude = torch.rand(batch_size, n_sources, n_channels, n_bins, n_frames, dtype=torch.double)
+
+    # Single block vs. blocks of block_size frames
+    wiener_filter = OnlineMultichannelWienerFilter(forgetting_factor=forgetting_factor, iteration=1)
+    reference = wiener_filter(mixture, estimated_sources_amplitude)
+    covariance, psd_sum = wiener_filter.covariance, wiener_filter.psd_sum
+
+    wiener_filter.reset()
+    estimated_sources = []
+
+    for start_idx in range(0, n_frames, block_size):
+        end_idx = min(start_idx + block_size, n_frames)
+        _estimated_sources = wiener_filter(mixture[..., start_idx:end_idx], estimated_sources_amplitude[..., start_idx:end_idx])
+        estimated_sources.append(_estimated_sources)
+
+    estimated_sources = torch.cat(estimated_sources, dim=-1)
+
+    error_covariance = torch.abs(wiener_filter.covariance - covariance).max() / torch.abs(covariance).max()
+    error_psd = torch.abs(wiener_filter.psd_sum - psd_sum).max() / torch.abs(psd_sum).max()
+    error = torch.linalg.vector_norm(estimated_sources - reference) / torch.linalg.vector_norm(reference)
+
+    print("Statistics error: (covariance) {:.3e}, (psd) {:.3e}".format(error_covariance.item(), error_psd.item()))
+    print("Output difference of {}-frame blocks from single block (not guaranteed to be 0): {:.3f}".format(block_size, error.item()))
+
+    # forgetting_factor=1 and single block
+    wiener_filter = OnlineMultichannelWienerFilter(forgetting_factor=1, iteration=2)
+    estimated_sources = wiener_filter(mixture, estimated_sources_amplitude)
+    reference = multichannel_wiener_filter(mixture, estimated_sources_amplitude, iteration=2)
+    error = torch.abs(estimated_sources - reference).max() / torch.abs(reference).max()
+
+    print("Error against multichannel_wiener_filter: {:.3e}".format(error.item()))
+
 if __name__ == '__main__':
     import os
 
@@ -456,4 +828,9 @@ if __name__ == '__main__':
 
     _test_spectrogram(spectrogram, method='IAM')
     _test_spectrogram(spectrogram, method='PSM')
-    _test_spectrogram(spectrogram, method='ICM')
\ No newline at end of file
+    _test_spectrogram(spectrogram, method='ICM')
+
+    print('='*10, "Multichannel Wiener filter", '='*10)
+    _test_multichannel_wiener_filter()
+    _test_multichannel_wiener_filter_chunk()
+    _test_online_multichannel_wiener_filter()
\ No newline at end of file
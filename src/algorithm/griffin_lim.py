@@ -5,6 +5,8 @@ import torch.nn as nn
 
 from utils.audio import build_window
 
+EPS = 1e-12
+
 class GriffinLim(nn.Module):
     def __init__(self, n_fft, hop_length=None, window_fn='hann'):
         super().__init__()
@@ -17,17 +19,107 @@ class GriffinLim(nn.Module):
         window = build_window(n_fft, window_fn=window_fn)
         self.window = nn.Parameter(window, requires_grad=False)
 
-    def forward(self, amplitude, phase=None, iteration=10):
+    def forward(self, amplitude, phase=None, iteration=10, tol=None, return_n_iterations=False):
+        """
+        Args:
+            amplitude (*, n_bins, n_frames)
+            phase (*, n_bins, n_frames): Initial phase. Broadcastable shape (e.g. phase of mixture) is also accepted. If None, random phase is used.
+            iteration <int>: Maximum number of iterations
+            tol <float>: Tolerance of spectral convergence. Iteration stops for each item when spectral convergence <= tol. If None, all iterations are run.
+            return_n_iterations <bool>: If True, number of iterations of each item is also returned.
+        Returns:
+            phase (*, n_bins, n_frames): Reconstructed phase
+            n_iterations <torch.LongTensor>: (*,), only if return_n_iterations=True.
+        """
+        return self.reconstruct(amplitude, phase=phase, iteration=iteration, momentum=0, tol=tol, return_n_iterations=return_n_iterations)
+
+    def reconstruct(self, amplitude, phase=None, iteration=10, momentum=0, tol=None, return_n_iterations=False):
         """
+        Griffin-Lim algorithm with optional momentum, where momentum=0 corresponds to the original algorithm.
         Args:
-            amplitude (n_bins, n_frames)
+            amplitude (*, n_bins, n_frames)
+            phase (*, n_bins, n_frames): Initial phase. Broadcastable shape is also accepted. If None, random phase is used.
+            iteration <int>: Maximum number of iterations
+            momentum <float>: Momentum of fast Griffin-Lim algorithm
+            tol <float>: Tolerance of spectral convergence. If None, all iterations are run.
+            return_n_iterations <bool>: If True, number of iterations of each item is also returned.
         Returns:
-            phase (n_bins, n_frames): Reconstructed phase
+            phase (*, n_bins, n_frames): Reconstructed phase
+            n_iterations <torch.LongTensor>: (*,), only if return_n_iterations=True.
         """
+        n_fft, hop_length = self.n_fft, self.hop_length
+        window = self.window
+
+        if torch.is_complex(amplitude):
+            raise ValueError("amplitude is NOT expected complex tensor.")
+
+        if amplitude.dim() < 2:
+            raise ValueError("Invalid shape of tensor.")
+
+        channels = amplitude.size()[:-2]
+        amplitude = amplitude.reshape(-1, *amplitude.size()[-2:]) # (batch_size, n_bins, n_frames)
+        batch_size = amplitude.size(0)
+
+        if phase is None:
+            sampler = torch.distributions.uniform.Uniform(0, 2*math.pi)
+            phase = sampler.sample(amplitude.size()).to(amplitude.device)
+        else:
+            phase = phase.expand(*channels, *amplitude.size()[-2:]).reshape(amplitude.size())
+
+        estimated_phase = torch.empty_like(amplitude)
+        n_iterations = torch.full((batch_size,), iteration, dtype=torch.long)
+        indices = torch.arange(batch_size, device=amplitude.device) # indices of items not converged yet
+
+        if tol is not None:
+            amplitude_norm = torch.linalg.vector_norm(amplitude, dim=(1, 2)) # (batch_size,)
+
+        previous = None
+
         for idx in range(iteration):
-            phase = self.update(amplitude, phase)
+            spectrogram = amplitude * torch.exp(1j * phase)
+            signal = torch.istft(spectrogram, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=False)
+            rebuilt = torch.stft(signal, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=True)
 
-        return phase
+            if tol is not None:
+                # Spectral convergence of signal reconstructed from current phase
+                error = torch.linalg.vector_norm(torch.abs(rebuilt) - amplitude, dim=(1, 2)) / (amplitude_norm + EPS)
+                converged = error <= tol
+
+                if converged.any():
+                    estimated_phase[indices[converged]] = phase[converged]
+                    n_iterations[indices[converged].cpu()] = idx
+
+                    not_converged = torch.logical_not(converged)
+                    indices = indices[not_converged]
+
+                    if indices.numel() == 0:
+                        break
+
+                    amplitude, amplitude_norm = amplitude[not_converged], amplitude_norm[not_converged]
+                    rebuilt = rebuilt[not_converged]
+
+                    if previous is not None:
+                        previous = previous[not_converged]
+
+            if momentum == 0 or previous is None:
+                accelerated = rebuilt
+            else:
+                accelerated = rebuilt + momentum * (rebuilt - previous)
+
+            previous = rebuilt
+            phase = torch.angle(accelerated)
+
+        if indices.numel() > 0:
+            estimated_phase[indices] = phase
+
+        estimated_phase = estimated_phase.view(*channels, *estimated_phase.size()[-2:])
+
+        if return_n_iterations:
+            n_iterations = n_iterations.view(channels)
+
+            return estimated_phase, n_iterations
+
+        return estimated_phase
 
     def update(self, amplitude, phase=None):
         """
@@ -73,10 +165,27 @@ class GriffinLim(nn.Module):
         return phase
 
 class FastGriffinLim(GriffinLim):
-    def __init__(self, n_fft, hop_length=None, window_fn='hann'):
+    """
+    Reference "A Fast Griffin-Lim Algorithm"
+    """
+    def __init__(self, n_fft, hop_length=None, window_fn='hann', momentum=0.99):
         super().__init__(n_fft, hop_length=hop_length, window_fn=window_fn)
 
-        raise NotImplementedError("Coming soon.")
+        self.momentum = momentum
+
+    def forward(self, amplitude, phase=None, iteration=10, tol=None, return_n_iterations=False):
+        """
+        Args:
+            amplitude (*, n_bins, n_frames)
+            phase (*, n_bins, n_frames): Initial phase. Broadcastable shape (e.g. phase of mixture) is also accepted. If None, random phase is used.
+            iteration <int>: Maximum number of iterations
+            tol <float>: Tolerance of spectral convergence. Iteration stops for each item when spectral convergence <= tol. If None, all iterations are run.
+            return_n_iterations <bool>: If True, number of iterations of each item is also returned.
+        Returns:
+            phase (*, n_bins, n_frames): Reconstructed phase
+            n_iterations <torch.LongTensor>: (*,), only if return_n_iterations=True.
+        """
+        return self.reconstruct(amplitude, phase=phase, iteration=iteration, momentum=self.momentum, tol=tol, return_n_iterations=return_n_iterations)
 
 def _test():
     target_sr = 16000
@@ -111,12 +220,63 @@ def _test():
     estimated_signal = torch.istft(estimated_spectrogram, n_fft, hop_length=hop_length, window=window, length=T, onesided=True, return_complex=False)
     torchaudio.save("data/GriffinLim/man-estimated-{}_iter{}.wav".format(target_sr, iteration), estimated_signal, sample_rate=target_sr, bits_per_sample=16)
 
+def _test_fast_griffin_lim(tol=0.1):
+    target_sr = 16000
+    n_fft, hop_length = 1024, 256
+
+    signal, sr = torchaudio.load("data/man-{}.wav".format(target_sr))
+    signal = torch.cat([signal, 0.5 * signal], dim=0) # pseudo stereo
+    signal = signal.unsqueeze(dim=0) # (1, n_mics, T)
+    T = signal.size(-1)
+    window = build_window(n_fft, window_fn='hann')
+
+    spectrogram = stft(signal, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=True)
+    amplitude = torch.abs(spectrogram)
+
+    for griffin_lim in [GriffinLim(n_fft, hop_length=hop_length), FastGriffinLim(n_fft, hop_length=hop_length)]:
+        name = griffin_lim.__class__.__name__
+        torch.manual_seed(111)
+        start = time.perf_counter()
+        estimated_phase, n_iterations = griffin_lim(amplitude, iteration=500, tol=tol, return_n_iterations=True)
+        elapsed = time.perf_counter() - start
+        print("{}: {} iterations, {:.3f} [sec] to spectral convergence {}".format(name, n_iterations.tolist(), elapsed, tol))
+
+        estimated_spectrogram = amplitude * torch.exp(1j * estimated_phase)
+        estimated_signal = istft(estimated_spectrogram, n_fft, hop_length=hop_length, window=window, length=T, onesided=True, return_complex=False)
+        torchaudio.save("data/GriffinLim/man-estimated-{}_{}.wav".format(target_sr, name), estimated_signal.squeeze(dim=0), sample_rate=target_sr, bits_per_sample=16)
+
+def _test_early_stopping(tol=0.2):
+    torch.manual_seed(111)
+
+    n_fft, hop_length = 256, 64
+    window = build_window(n_fft, window_fn='hann')
+
+    signal = torch.randn(16000)
+    spectrogram = torch.stft(signal, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=True)
+    amplitude = torch.abs(spectrogram) # (n_bins, n_frames)
+
+    for griffin_lim in [GriffinLim(n_fft, hop_length=hop_length), FastGriffinLim(n_fft, hop_length=hop_length)]:
+        name = griffin_lim.__class__.__name__
+        estimated_phase, n_iterations = griffin_lim(amplitude, iteration=200, tol=tol, return_n_iterations=True)
+
+        estimated_spectrogram = amplitude * torch.exp(1j * estimated_phase)
+        estimated_signal = torch.istft(estimated_spectrogram, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=False)
+        rebuilt = torch.stft(estimated_signal, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=True)
+        error = torch.linalg.vector_norm(torch.abs(rebuilt) - amplitude) / torch.linalg.vector_norm(amplitude)
+
+        print("{}: phase {}, {} iterations, spectral convergence {:.3f} (tol={})".format(name, tuple(estimated_phase.size()), n_iterations.item(), error.item(), tol))
+
 if __name__ == '__main__':
     import os
+    import time
 
     import torchaudio
 
+    from transforms.stft import stft, istft
+
     os.makedirs("data/GriffinLim", exist_ok=True)
     torch.manual_seed(111)
 
-    _test()
\ No newline at end of file
+    _test()
+    _test_fast_griffin_lim()
+    _test_early_stopping()
\ No newline at end of file
@@ -11,13 +11,14 @@ Reference "Iterative Phase Estimation for the Synthesis of Separated Sources fro
 EPS = 1e-12
 
 class MISI(nn.Module):
-    def __init__(self, n_fft, hop_length=None, window=None, window_fn=None):
+    def __init__(self, n_fft, hop_length=None, window=None, window_fn=None, normalized=False):
         super().__init__()
 
         if hop_length is None:
             hop_length = n_fft // 2
 
         self.n_fft, self.hop_length = n_fft, hop_length
+        self.normalized = normalized
 
         if window is not None:
             if window_fn is not None:
@@ -30,73 +31,164 @@ class MISI(nn.Module):
 
         self.window = window
 
-    def forward(self, mixture, estimated_sources_amplitude, iteration=10, return_all_iterations=False, iteration_dim=0):
+    def forward(self, mixture, estimated_sources_amplitude, iteration=10, tol=None, return_all_iterations=False, return_every=1, iteration_dim=0, chunk_size=None, chunk_overlap=None):
         """
         Args:
-            mixture <torch.Tensor>: Comlex spectrogram with shape of (batch_size, 1, n_bins, n_frames).
-            estimated_sources_amplitude <torch.Tensor>: Amplitude spectrogram with shape of (batch_size, n_sources, n_bins, n_frames).
+            mixture <torch.Tensor>: Comlex spectrogram with shape of (batch_size, 1, n_bins, n_frames) or (batch_size, 1, n_mics, n_bins, n_frames).
+            estimated_sources_amplitude <torch.Tensor>: Amplitude spectrogram with shape of (batch_size, n_sources, n_bins, n_frames) or (batch_size, n_sources, n_mics, n_bins, n_frames).
+            iteration <int>: Maximum number of iterations.
+            tol <float>: Tolerance of mixture consistency error, i.e. ||mixture - sum of estimated sources|| / ||mixture|| in time domain. Each sample is no longer updated once its error is less than or equal to tol, and iteration stops when all samples have converged. If None, all iterations are run.
+            return_all_iterations <bool>: If True, estimated sources of every `return_every` iterations are returned.
+            return_every <int>: Interval of iterations returned when return_all_iterations=True.
+            iteration_dim <int>: Dimension of iterations when return_all_iterations=True.
+            chunk_size <int>: Number of frames processed at once. If None, all frames are processed at once. Not supported when return_all_iterations=True.
+            chunk_overlap <int>: Number of context frames added to both sides of each chunk. Default: n_fft // hop_length.
         Returns:
             estimated_sources <torch.Tensor>:
-                Comlex spectrogram with shape of (batch_size, n_sources, n_bins, n_frames) if return_all_iterations=False (default).
-                Comlex spectrogram with shape of (iteration, batch_size, n_sources, n_bins, n_frames) if return_all_iterations=True. You can set different dimension for iteration using iteration_dim.
+                Comlex spectrogram with shape of (batch_size, n_sources, n_bins, n_frames) or (batch_size, n_sources, n_mics, n_bins, n_frames) if return_all_iterations=False (default).
+                Comlex spectrogram with shape of (iteration // return_every, batch_size, n_sources, ...) if return_all_iterations=True. You can set different dimension for iteration using iteration_dim.
+                If iteration stops by tol, only iterations until then are included.
         """
         if not torch.is_complex(mixture):
             raise TypeError("mixture is expected complex tensor.")
 
         if torch.is_complex(estimated_sources_amplitude):
-            raise TypeError("estimated_sources_amplitude is expected complex tensor.")
+            raise TypeError("estimated_sources_amplitude is NOT expected complex tensor.")
 
-        n_fft, hop_length = self.n_fft, self.hop_length
-        window = self.window
+        n_frames = mixture.size(-1)
+
+        if chunk_size is not None and chunk_size < n_frames:
+            if return_all_iterations:
+                raise ValueError("return_all_iterations=True is not supported when chunk_size is specified.")
+
+            return self.forward_chunk(mixture, estimated_sources_amplitude, iteration=iteration, tol=tol, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
         phase = torch.angle(mixture)
         estimated_sources = estimated_sources_amplitude * torch.exp(1j * phase)
 
-        mixture_channels = mixture.size()[:-2]
-        mixture = mixture.view(-1, *mixture.size()[-2:])
-        mixture = torch.istft(mixture, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=False)
-        mixture = mixture.view(*mixture_channels, *mixture.size()[-1:])
+        mixture = self.istft(mixture)
+
+        if return_all_iterations:
+            estimated_sources_all_iterations = estimated_sources.new_empty((iteration // return_every, *estimated_sources.size()))
+            n_returned = 0
+
+        if tol is not None:
+            converged = torch.zeros(mixture.size(0), dtype=torch.bool, device=mixture.device) # (batch_size,)
 
-        estimated_sources_all_iterations = []
         for idx in range(iteration):
-            phase = self.update_phase_once(mixture=mixture, estimated_sources=estimated_sources)
-            estimated_sources = estimated_sources_amplitude * torch.exp(1j * phase)
-            if return_all_iterations:
-                estimated_sources_all_iterations.append(estimated_sources)
+            if tol is None:
+                phase = self.update_phase_once(mixture=mixture, estimated_sources=estimated_sources)
+                estimated_sources = estimated_sources_amplitude * torch.exp(1j * phase)
+            else:
+                # Only samples which have not converged yet are updated.
+                indices = torch.nonzero(torch.logical_not(converged)).squeeze(dim=1)
+                phase, error = self.update_phase_once(mixture=mixture[indices], estimated_sources=estimated_sources[indices], return_error=True)
+                is_converged = error <= tol
+                converged[indices[is_converged]] = True
+
+                if torch.all(converged):
+                    break
+
+                is_updated = torch.logical_not(is_converged)
+                indices, phase = indices[is_updated], phase[is_updated]
+                estimated_sources = estimated_sources.index_copy(0, indices, estimated_sources_amplitude[indices] * torch.exp(1j * phase))
+
+            if return_all_iterations and (idx + 1) % return_every == 0:
+                estimated_sources_all_iterations[n_returned] = estimated_sources
+                n_returned += 1
 
         if return_all_iterations:
-            estimated_sources = torch.stack(estimated_sources_all_iterations, dim=iteration_dim)
+            estimated_sources = estimated_sources_all_iterations[:n_returned].movedim(0, iteration_dim)
 
         return estimated_sources
 
-    def update_phase_once(self, mixture, estimated_sources):
+    def forward_chunk(self, mixture, estimated_sources_amplitude, iteration=10, tol=None, chunk_size=None, chunk_overlap=None):
         """
+        Apply MISI to each chunk of frames with context frames on both sides, which bounds memory for long signals.
+        Frames near boundaries of chunks are approximated, but the approximation is negligible if chunk_overlap is large enough.
         Args:
-            mixture <torch.Tensor>: Time domain signal with shape of (batch_size, 1, T).
-            estimated_sources_amplitude <torch.Tensor>: Complex spectrogram with shape of (batch_size, n_sources, n_bins, n_frames).
+            mixture <torch.Tensor>: Comlex spectrogram with shape of (batch_size, 1, *, n_bins, n_frames).
+            estimated_sources_amplitude <torch.Tensor>: Amplitude spectrogram with shape of (batch_size, n_sources, *, n_bins, n_frames).
+            chunk_size <int>: Number of frames processed at once.
+            chunk_overlap <int>: Number of context frames added to both sides of each chunk. Default: n_fft // hop_length.
+        Returns:
+            estimated_sources <torch.Tensor>: Comlex spectrogram with shape of (batch_size, n_sources, *, n_bins, n_frames).
         """
-        n_fft, hop_length = self.n_fft, self.hop_length
-        window = self.window
+        if chunk_overlap is None:
+            chunk_overlap = self.n_fft // self.hop_length
 
-        _, n_sources, _, _ = estimated_sources.size()
+        n_frames = mixture.size(-1)
+        estimated_sources = []
 
-        estimated_sources_channels = estimated_sources.size()[:-2]
-        estimated_sources = estimated_sources.view(-1, *estimated_sources.size()[-2:])
-        estimated_sources = torch.istft(estimated_sources, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=False)
-        estimated_sources = estimated_sources.view(*estimated_sources_channels, *estimated_sources.size()[-1:])
+        for start_idx in range(0, n_frames, chunk_size):
+            end_idx = min(start_idx + chunk_size, n_frames)
+            padded_start_idx, padded_end_idx = max(start_idx - chunk_overlap, 0), min(end_idx + chunk_overlap, n_frames)
 
-        delta = mixture - torch.sum(estimated_sources, dim=1, keepdim=True)
+            _mixture = mixture[..., padded_start_idx:padded_end_idx]
+            _estimated_sources_amplitude = estimated_sources_amplitude[..., padded_start_idx:padded_end_idx]
+            _estimated_sources = self.forward(_mixture, _estimated_sources_amplitude, iteration=iteration, tol=tol)
+            _estimated_sources = _estimated_sources[..., start_idx - padded_start_idx:end_idx - padded_start_idx]
+            estimated_sources.append(_estimated_sources)
 
-        estimated_sources = estimated_sources + delta / n_sources
+        estimated_sources = torch.cat(estimated_sources, dim=-1)
+
+        return estimated_sources
+
+    def update_phase_once(self, mixture, estimated_sources, return_error=False):
+        """
+        Args:
+            mixture <torch.Tensor>: Time domain signal with shape of (batch_size, 1, T) or (batch_size, 1, n_mics, T).
+            estimated_sources <torch.Tensor>: Complex spectrogram with shape of (batch_size, n_sources, n_bins, n_frames) or (batch_size, n_sources, n_mics, n_bins, n_frames).
+            return_error <bool>: If True, mixture consistency error before update is also returned.
+        Returns:
+            estimated_sources_phase <torch.Tensor>: (batch_size, n_sources, n_bins, n_frames) or (batch_size, n_sources, n_mics, n_bins, n_frames)
+            error <torch.Tensor>: (batch_size,), only if return_error=True.
+        """
+        n_sources = estimated_sources.size(1)
 
-        estimated_sources = estimated_sources.view(-1, estimated_sources.size(-1))
-        estimated_sources = torch.stft(estimated_sources, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=True)
-        estimated_sources = estimated_sources.view(*estimated_sources_channels, *estimated_sources.size()[-2:])
+        estimated_sources = self.istft(estimated_sources)
 
+        delta = mixture - torch.sum(estimated_sources, dim=1, keepdim=True)
+        estimated_sources = estimated_sources + delta / n_sources
+
+        estimated_sources = self.stft(estimated_sources)
         estimated_sources_phase = torch.angle(estimated_sources)
 
+        if return_error:
+            error = torch.linalg.vector_norm(delta.flatten(start_dim=1), dim=1) / (torch.linalg.vector_norm(mixture.flatten(start_dim=1), dim=1) + EPS)
+
+            return estimated_sources_phase, error
+
         return estimated_sources_phase
 
+    def stft(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (*, T)
+        Returns:
+            output <torch.Tensor>: Complex tensor with shape of (*, n_bins, n_frames)
+        """
+        channels = input.size()[:-1]
+        input = input.flatten(end_dim=-2)
+        output = torch.stft(input, self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalized, onesided=True, return_complex=True)
+        output = output.unflatten(0, channels)
+
+        return output
+
+    def istft(self, input):
+        """
+        Args:
+            input <torch.Tensor>: Complex tensor with shape of (*, n_bins, n_frames)
+        Returns:
+            output <torch.Tensor>: (*, T)
+        """
+        channels = input.size()[:-2]
+        input = input.flatten(end_dim=-3)
+        output = torch.istft(input, self.n_fft, hop_length=self.hop_length, window=self.window, normalized=self.normalized, onesided=True, return_complex=False)
+        output = output.unflatten(0, channels)
+
+        return output
+
 def _test_danet():
     n_sources = 2
     sr = 8000
@@ -145,6 +237,64 @@ def _test_danet():
         estimated_source = estimated_source.unsqueeze(dim=0) if estimated_source.dim() == 1 else estimated_source
         torchaudio.save("./data/MISI/estimated-{}-{}_iter{}.wav".format(sr, idx + 1, iteration), estimated_source, sample_rate=sr)
 
+def _test_misi(iteration=20, return_every=5, tol=0.1):
+    torch.manual_seed(111)
+
+    batch_size, n_sources, n_mics, T = 2, 3, 2, 8000
+    n_fft, hop_length = 256, 64
+    window = build_window(n_fft, window_fn='hann')
+
+    sources = torch.randn(batch_size, n_sources, n_mics, T)
+    mixture = sources.sum(dim=1, keepdim=True) # (batch_size, 1, n_mics, T)
+
+    misi = MISI(n_fft=n_fft, hop_length=hop_length, window=window)
+    mixture_spectrogram = misi.stft(mixture) # (batch_size, 1, n_mics, n_bins, n_frames)
+    estimated_sources_amplitude = torch.abs(misi.stft(sources)) # (batch_size, n_sources, n_mics, n_bins, n_frames)
+
+    estimated_sources = misi(mixture_spectrogram, estimated_sources_amplitude, iteration=iteration, return_all_iterations=True, return_every=return_every)
+
+    # Mixture consistency error of every `return_every` iterations
+    mixture = misi.istft(mixture_spectrogram)
+    errors = []
+
+    for _estimated_sources in estimated_sources:
+        delta = mixture - misi.istft(_estimated_sources).sum(dim=1, keepdim=True)
+        error = torch.linalg.vector_norm(delta) / torch.linalg.vector_norm(mixture)
+        errors.append(error.item())
+
+    print("Mixture consistency error:", ", ".join(["(iter {}) {:.4f}".format((idx + 1) * return_every, error) for idx, error in enumerate(errors)]))
+
+    # Reference: MISI applied to each sample and microphone
+    reference = []
+
+    for _mixture, _estimated_sources_amplitude in zip(mixture_spectrogram.movedim(2, 0).flatten(end_dim=1), estimated_sources_amplitude.movedim(2, 0).flatten(end_dim=1)):
+        # _mixture: (1, n_bins, n_frames), _estimated_sources_amplitude: (n_sources, n_bins, n_frames)
+        _estimated_sources = _estimated_sources_amplitude * torch.exp(1j * torch.angle(_mixture))
+        _mixture = torch.istft(_mixture, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=False)
+
+        for idx in range(iteration):
+            _estimated_sources = torch.istft(_estimated_sources, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=False)
+            _estimated_sources = _estimated_sources + (_mixture - _estimated_sources.sum(dim=0, keepdim=True)) / n_sources
+            _estimated_sources = torch.stft(_estimated_sources, n_fft, hop_length=hop_length, window=window, onesided=True, return_complex=True)
+            _estimated_sources = _estimated_sources_amplitude * torch.exp(1j * torch.angle(_estimated_sources))
+
+        reference.append(_estimated_sources)
+
+    reference = torch.stack(reference, dim=0).unflatten(0, (n_mics, batch_size)).movedim(0, 2) # (batch_size, n_sources, n_mics, n_bins, n_frames)
+    error = torch.abs(estimated_sources[-1] - reference).max() / torch.abs(reference).max()
+
+    print("Max error against reference loop: {:.3e}".format(error.item()))
+
+    # Early exit by tol: samples converge at different iterations, so batch result should be same as MISI applied to each sample
+    noise_level = torch.tensor([0.05, 0.3]).view(batch_size, 1, 1, 1, 1)
+    noisy_sources_amplitude = estimated_sources_amplitude * (1 + noise_level * torch.rand_like(estimated_sources_amplitude))
+
+    estimated_sources = misi(mixture_spectrogram, noisy_sources_amplitude, iteration=iteration, tol=tol)
+    reference = torch.cat([misi(_mixture, _noisy_sources_amplitude, iteration=iteration, tol=tol) for _mixture, _noisy_sources_amplitude in zip(mixture_spectrogram.split(1), noisy_sources_amplitude.split(1))], dim=0)
+    error = torch.abs(estimated_sources - reference).max() / torch.abs(reference).max()
+
+    print("Max error of tol={} against each sample: {:.3e}".format(tol, error.item()))
+
 def _downsample():
     sr, target_sr = 16000, 8000
     signal, sr = torchaudio.load("data/mixture-{}.wav".format(sr))
@@ -163,4 +313,5 @@ if __name__ == '__main__':
     torch.manual_seed(111)
 
     # _downsample()
-    _test_danet()
\ No newline at end of file
+    _test_danet()
+    _test_misi()
\ No newline at end of file
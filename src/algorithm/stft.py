@@ -4,14 +4,29 @@ import torch.nn.functional as F
 
 from utils.audio import build_Fourier_bases, build_window, build_optimal_window
 
+EPS = 1e-12
+
 class BatchSTFT(nn.Module):
-    def __init__(self, n_fft, hop_length=None, window_fn='hann', normalize=False):
+    """
+    STFT by 1D convolution with Fourier bases.
+    Complex tensors and torch.stft are not used, so this module can be exported by TorchScript and ONNX.
+    """
+    def __init__(self, n_fft, hop_length=None, window_fn='hann', normalize=False, center=False):
+        """
+        Args:
+            n_fft <int>: FFT length
+            hop_length <int>: Hop length
+            window_fn <str>: Window function
+            normalize <bool>: Normalize Fourier bases
+            center <bool>: If True, input is padded by reflection in the same manner as torch.stft(..., center=True, pad_mode='reflect').
+        """
         super().__init__()
 
         if hop_length is None:
             hop_length = n_fft//2
 
         self.n_fft, self.hop_length = n_fft, hop_length
+        self.center = center
 
         window = build_window(n_fft, window_fn=window_fn) # (n_fft,)
 
@@ -27,19 +42,24 @@ class BatchSTFT(nn.Module):
         Args:
             input (batch_size, T)
         Returns:
-            output (batch_size, n_bins, n_frames, 2): n_bins = n_fft//2+1, n_frames = (T - n_fft)//hop_length + 1. n_frames may be different because of padding.
+            output (batch_size, n_bins, n_frames, 2): n_bins = n_fft//2+1, n_frames = (T - n_fft)//hop_length + 1. n_frames may be different because of padding. If center=True, n_frames = T//hop_length + 1.
         """
         batch_size, T = input.size()
 
         n_fft, hop_length = self.n_fft, self.hop_length
         n_bins = n_fft//2 + 1
 
-        padding = (hop_length - (T - n_fft)%hop_length)%hop_length + 2 * n_fft # Assume that "n_fft%hop_length is 0"
-        padding_left = padding // 2
-        padding_right = padding - padding_left
-
-        input = F.pad(input, (padding_left, padding_right))
         input = input.unsqueeze(dim=1)
+
+        if self.center:
+            input = F.pad(input, (n_fft//2, n_fft//2), mode='reflect')
+        else:
+            padding = (hop_length - (T - n_fft)%hop_length)%hop_length + 2 * n_fft # Assume that "n_fft%hop_length is 0"
+            padding_left = padding // 2
+            padding_right = padding - padding_left
+
+            input = F.pad(input, (padding_left, padding_right))
+
         output = F.conv1d(input, self.bases, stride=self.hop_length)
         real, imag = output[:, :n_bins], output[:, n_bins:]
         output = torch.cat([real.unsqueeze(dim=3), imag.unsqueeze(dim=3)], dim=3)
@@ -47,19 +67,37 @@ class BatchSTFT(nn.Module):
         return output
 
 class BatchInvSTFT(nn.Module):
-    def __init__(self, n_fft, hop_length=None, window_fn='hann', normalize=False):
+    """
+    Inverse STFT by 1D transposed convolution with Fourier bases.
+    Complex tensors and torch.istft are not used, so this module can be exported by TorchScript and ONNX.
+    """
+    def __init__(self, n_fft, hop_length=None, window_fn='hann', normalize=False, center=False):
+        """
+        Args:
+            n_fft <int>: FFT length
+            hop_length <int>: Hop length
+            window_fn <str>: Window function
+            normalize <bool>: Normalize Fourier bases
+            center <bool>: If True, output is the same as torch.istft(..., center=True), i.e. overlap-added frames are divided by the sum of squared windows and the first n_fft//2 samples are removed.
+        """
         super().__init__()
 
         if hop_length is None:
             hop_length = n_fft//2
 
         self.n_fft, self.hop_length = n_fft, hop_length
+        self.center = center
 
         window = build_window(n_fft, window_fn=window_fn) # (n_fft,)
-        optimal_window = build_optimal_window(window, hop_length=hop_length)
+
+        if center:
+            synthesis_window = window
+            self.squared_window = nn.Parameter(window.view(1, 1, n_fft)**2, requires_grad=False)
+        else:
+            synthesis_window = build_optimal_window(window, hop_length=hop_length)
 
         cos_bases, sin_bases = build_Fourier_bases(n_fft, normalize=normalize)
-        cos_bases, sin_bases = cos_bases[:n_fft//2+1] * optimal_window, - sin_bases[:n_fft//2+1] * optimal_window
+        cos_bases, sin_bases = cos_bases[:n_fft//2+1] * synthesis_window, - sin_bases[:n_fft//2+1] * synthesis_window
 
         if not normalize:
             cos_bases = cos_bases / n_fft
@@ -78,19 +116,32 @@ class BatchInvSTFT(nn.Module):
         """
         n_fft, hop_length = self.n_fft, self.hop_length
 
-        if T is None:
-            padding = 2 * n_fft
-        else:
-            padding = (hop_length - (T - n_fft)%hop_length)%hop_length + 2 * n_fft # Assume that "n_fft%hop_length is 0"
-        padding_left = padding // 2
-        padding_right = padding - padding_left
-
         real, imag = input[...,0], input[...,1]
         input = torch.cat([real, imag, real[:,1:-1], imag[:,1:-1]], dim=1)
         bases = torch.cat([self.bases, self.bases[1:n_fft//2], self.bases[-n_fft//2:-1]], dim=0)
 
         output = F.conv_transpose1d(input, bases, stride=self.hop_length)
-        output = F.pad(output, (-padding_left, -padding_right))
+
+        if self.center:
+            n_frames = input.size(-1)
+            ones = torch.ones_like(input[:1, :1]) # (1, 1, n_frames)
+            envelope = F.conv_transpose1d(ones, self.squared_window, stride=self.hop_length)
+            output = output / torch.clamp(envelope, min=EPS)
+
+            if T is None:
+                T = hop_length * (n_frames - 1)
+
+            output = output[:, :, n_fft//2: n_fft//2 + T]
+        else:
+            if T is None:
+                padding = 2 * n_fft
+            else:
+                padding = (hop_length - (T - n_fft)%hop_length)%hop_length + 2 * n_fft # Assume that "n_fft%hop_length is 0"
+            padding_left = padding // 2
+            padding_right = padding - padding_left
+
+            output = F.pad(output, (-padding_left, -padding_right))
+
         output = output.squeeze(dim=1)
 
         return output
@@ -18,35 +18,46 @@ class CombinationLoss(nn.Module):
         self.min_pair, self.max_pair = min_pair, max_pair
 
     def forward(self, input, target, reduction='mean', batch_mean=True):
+        """
+        Args:
+            input (batch_size, *): Tensor including `n_sources` at `combination_dim`.
+            target (batch_size, *): Tensor including `n_sources` at `combination_dim`.
+            reduction <str>: Reduction along combinations. 'mean', 'sum', or None.
+        Returns:
+            loss: (n_combinations, *) or (*) if batch_mean=True, otherwise (batch_size, n_combinations, *) or (batch_size, *).
+        """
         assert target.size() == input.size(), "input.size() are expected same."
 
         combination_dim = self.combination_dim
         min_pair, max_pair = self.min_pair, self.max_pair
 
+        batch_size = input.size(0)
         n_sources = input.size(combination_dim)
 
         if max_pair is None:
             max_pair = n_sources - 1
 
-        input = torch.unbind(input, dim=combination_dim)
-        target = torch.unbind(target, dim=combination_dim)
+        membership = build_membership_matrix(n_sources, min_pair=min_pair, max_pair=max_pair) # (n_combinations, n_sources)
+        membership = membership.to(input.device)
+        n_combinations = membership.size(0)
 
-        loss = []
+        input, target = torch.movedim(input, combination_dim, 1), torch.movedim(target, combination_dim, 1) # (batch_size, n_sources, *)
+        input_size, target_size = input.size()[2:], target.size()[2:]
 
-        for _n_sources in range(min_pair, max_pair + 1):
-            for pair_indices in itertools.combinations(range(n_sources), _n_sources):
-                _input, _target = [], []
-                for idx in pair_indices:
-                    _input.append(input[idx])
-                    _target.append(target[idx])
-                _input, _target = torch.stack(_input, dim=0), torch.stack(_target, dim=0)
-                _input, _target = _input.sum(dim=0), _target.sum(dim=0)
+        input = torch.matmul(membership.to(input.dtype), input.flatten(2)) # (batch_size, n_combinations, prod(*))
+        target = torch.matmul(membership.to(target.dtype), target.flatten(2)) # (batch_size, n_combinations, prod(*))
 
-                loss_pair = self.criterion(_input, _target, batch_mean=batch_mean)
-                loss.append(loss_pair)
+        # Combinations are folded into batch dimension, so the criterion is called only once.
+        input = input.view(batch_size * n_combinations, *input_size)
+        target = target.view(batch_size * n_combinations, *target_size)
+        loss = self.criterion(input, target, batch_mean=False)
+        loss = loss.view(batch_size, n_combinations, *loss.size()[1:])
+        loss = torch.movedim(loss, 1, combination_dim)
+
+        if batch_mean:
+            loss = loss.mean(dim=0)
 
         dim = combination_dim - 1 if batch_mean else combination_dim
-        loss = torch.stack(loss, dim=dim)
 
         if reduction == 'mean':
             loss = loss.mean(dim=dim)
@@ -55,6 +66,33 @@ class CombinationLoss(nn.Module):
 
         return loss
 
+def build_membership_matrix(n_sources, min_pair=1, max_pair=None):
+    """
+    Args:
+        n_sources <int>: Number of sources.
+        min_pair <int>: Minimum number of sources in each combination.
+        max_pair <int>: Maximum number of sources in each combination.
+    Returns:
+        membership (n_combinations, n_sources): membership[k, n] is 1 if n-th source is included in k-th combination, otherwise 0.
+    """
+    if max_pair is None:
+        max_pair = n_sources - 1
+
+    membership = []
+
+    for _n_sources in range(min_pair, max_pair + 1):
+        for pair_indices in itertools.combinations(range(n_sources), _n_sources):
+            _membership = [0] * n_sources
+
+            for idx in pair_indices:
+                _membership[idx] = 1
+
+            membership.append(_membership)
+
+    membership = torch.Tensor(membership)
+
+    return membership
+
 def _test_cl():
     batch_size = 3
     n_sources = 4
@@ -1,13 +1,195 @@
 import torch
 import torch.nn as nn
 
+from criterion.pit import compute_pairwise_loss, get_source_reduction
+
 """
 "Many-Speakers Single Channel Speech Separation with Optimal Permutation Training"
+See https://arxiv.org/abs/2104.08955
 """
 
 class HungarianLoss(nn.Module):
-    def __init__(self):
+    def __init__(self, criterion, n_sources=None):
+        """
+        Args:
+            criterion <callable>: criterion is expected acceptable (input, target, batch_mean) when called and separable over sources.
+            n_sources <int>: Number of sources.
+        """
         super().__init__()
 
+        self.criterion = criterion
+        self.n_sources = n_sources
+
     def forward(self, input, target, batch_mean=True):
-        raise NotImplementedError
\ No newline at end of file
+        """
+        Args:
+            input (batch_size, n_sources, *)
+            target (batch_size, n_sources, *)
+        Returns:
+            loss (batch_size,): minimum loss for each data
+            pattern (batch_size, n_sources): permutation indices
+        """
+        criterion = self.criterion
+
+        if self.n_sources is not None:
+            assert input.size(1) == self.n_sources, "input.size(1) is expected {}, but given {}.".format(self.n_sources, input.size(1))
+
+        source_reduction = get_source_reduction(criterion, n_dims=input.dim())
+
+        if source_reduction is None:
+            raise ValueError("criterion should be separable over sources.")
+
+        pairwise_loss = compute_pairwise_loss(criterion, input, target) # (batch_size, n_sources, n_sources)
+
+        if hasattr(criterion, "maximize") and criterion.maximize:
+            cost = - pairwise_loss.detach()
+        else:
+            cost = pairwise_loss.detach()
+
+        pattern = linear_sum_assignment(cost) # (batch_size, n_sources)
+        loss = torch.gather(pairwise_loss, dim=2, index=pattern.unsqueeze(dim=2)).squeeze(dim=2) # (batch_size, n_sources)
+
+        if source_reduction == 'mean':
+            loss = loss.mean(dim=1)
+        else:
+            loss = loss.sum(dim=1)
+
+        if batch_mean:
+            loss = loss.mean(dim=0)
+
+        return loss, pattern
+
+def linear_sum_assignment(cost):
+    """
+    Solves linear assignment problem for each item in batch.
+    Args:
+        cost (batch_size, n_sources, n_sources): cost[:, i, j] is cost of assigning target j to input i.
+    Returns:
+        pattern (batch_size, n_sources): pattern[:, i] is index of target assigned to input i.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment as _linear_sum_assignment
+    except ImportError:
+        _linear_sum_assignment = None
+
+    batch_size, n_sources, _ = cost.size()
+    device = cost.device
+    cost = cost.cpu().double()
+
+    pattern = []
+
+    if _linear_sum_assignment is None:
+        for _cost in cost.tolist():
+            _pattern = _hungarian(_cost)
+            pattern.append(_pattern)
+    else:
+        for _cost in cost.numpy():
+            _, _pattern = _linear_sum_assignment(_cost)
+            pattern.append(_pattern.tolist())
+
+    pattern = torch.tensor(pattern, dtype=torch.long, device=device)
+
+    return pattern
+
+def _hungarian(cost):
+    """
+    Hungarian algorithm by shortest augmenting paths, O(n_sources**3).
+    Args:
+        cost <list<list<float>>>: (n_sources, n_sources)
+    Returns:
+        pattern <list<int>>: (n_sources,)
+    """
+    n_sources = len(cost)
+    inf = float('inf')
+
+    # Potentials of inputs (u) and targets (v), 1-indexed with dummy index 0.
+    u, v = [0.0] * (n_sources + 1), [0.0] * (n_sources + 1)
+    matched = [0] * (n_sources + 1) # matched[j]: input assigned to target j
+    way = [0] * (n_sources + 1)
+
+    for i in range(1, n_sources + 1):
+        matched[0] = i
+        j0 = 0
+        min_value = [inf] * (n_sources + 1)
+        used = [False] * (n_sources + 1)
+
+        while True:
+            used[j0] = True
+            i0, delta, j1 = matched[j0], inf, 0
+
+            for j in range(1, n_sources + 1):
+                if not used[j]:
+                    value = cost[i0 - 1][j - 1] - u[i0] - v[j]
+
+                    if value < min_value[j]:
+                        min_value[j], way[j] = value, j0
+
+                    if min_value[j] < delta:
+                        delta, j1 = min_value[j], j
+
+            for j in range(n_sources + 1):
+                if used[j]:
+                    u[matched[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_value[j] -= delta
+
+            j0 = j1
+
+            if matched[j0] == 0:
+                break
+
+        while True:
+            j1 = way[j0]
+            matched[j0] = matched[j1]
+            j0 = j1
+
+            if j0 == 0:
+                break
+
+    pattern = [0] * n_sources
+
+    for j in range(1, n_sources + 1):
+        pattern[matched[j] - 1] = j - 1
+
+    return pattern
+
+def _test_hungarian():
+    torch.manual_seed(111)
+
+    batch_size, C, T = 4, 3, 1024
+    input = torch.randn(batch_size, C, T)
+    target = torch.randn(batch_size, C, T)
+
+    print('-'*10, "Negative SI-SDR (PIT)", '-'*10)
+    criterion = NegSISDR()
+    pit_criterion = PIT1d(criterion, n_sources=C)
+    loss, pattern = pit_criterion(input, target, batch_mean=False)
+
+    print(loss)
+    print(pattern)
+    print()
+
+    print('-'*10, "Negative SI-SDR (Hungarian)", '-'*10)
+    criterion = NegSISDR()
+    pit_criterion = HungarianLoss(criterion, n_sources=C)
+    loss, pattern = pit_criterion(input, target, batch_mean=False)
+
+    print(loss)
+    print(pattern)
+    print()
+
+    print('-'*10, "SI-SDR (Hungarian)", '-'*10)
+    criterion = SISDR()
+    pit_criterion = HungarianLoss(criterion, n_sources=C)
+    loss, pattern = pit_criterion(input, target, batch_mean=False)
+
+    print(loss)
+    print(pattern)
+
+if __name__ == '__main__':
+    from criterion.sdr import SISDR, NegSISDR
+    from criterion.pit import PIT1d
+
+    print('='*10, "Hungarian loss", '='*10)
+    _test_hungarian()
@@ -1,9 +1,151 @@
+import itertools
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
 """
 "Unsupervised Sound Separation Using Mixture Invariant Training"
+See https://arxiv.org/abs/2006.12701
 """
-def mixit(input, target):
-    raise NotImplementedError
+def mixit(criterion, input, target, n_mixtures=None, patterns=None, chunk_size=None, batch_mean=True):
+    """
+    Args:
+        criterion <callable>
+        input (batch_size, n_sources, *): Estimated sources.
+        target (batch_size, n_mixtures, *): Mixtures.
+        patterns (P, n_sources): Index of mixture assigned to each source.
+        chunk_size <int>: Number of assignments evaluated at once. If None, all assignments are evaluated at once.
+    Returns:
+        loss (batch_size,): minimum loss for each data
+        pattern (batch_size, n_sources): index of mixture assigned to each source
+    """
+    if patterns is None:
+        if n_mixtures is None:
+            n_mixtures = target.size(1)
+        n_sources = input.size(1)
+        patterns = list(itertools.product(range(n_mixtures), repeat=n_sources))
+        patterns = torch.Tensor(patterns).long()
+
+    n_mixtures = target.size(1)
+    P = len(patterns)
+
+    if chunk_size is None:
+        chunk_size = P
+
+    patterns = patterns.to(input.device)
+    assignments = build_assignment_matrix(patterns, n_mixtures=n_mixtures).to(input.dtype) # (P, n_mixtures, n_sources)
+
+    # Search for best assignment without building computational graph.
+    with torch.no_grad():
+        possible_loss = []
+
+        for _assignments in torch.split(assignments, chunk_size, dim=0):
+            _possible_loss = compute_remix_loss(criterion, input, target, _assignments) # (batch_size, chunk_size)
+            possible_loss.append(_possible_loss)
+
+        possible_loss = torch.cat(possible_loss, dim=1) # (batch_size, P)
+
+        if hasattr(criterion, "maximize") and criterion.maximize:
+            indices = torch.argmax(possible_loss, dim=1) # (batch_size,)
+        else:
+            indices = torch.argmin(possible_loss, dim=1) # (batch_size,)
+
+    # Only best assignment is evaluated with gradient.
+    estimated_mixture = torch.einsum('bnm,bm...->bn...', assignments[indices], input) # (batch_size, n_mixtures, *)
+    loss = criterion(estimated_mixture, target, batch_mean=False)
+
+    if batch_mean:
+        loss = loss.mean(dim=0)
+
+    return loss, patterns[indices]
+
+def compute_remix_loss(criterion, input, target, assignments):
+    """
+    Args:
+        criterion <callable>
+        input (batch_size, n_sources, *)
+        target (batch_size, n_mixtures, *)
+        assignments (P, n_mixtures, n_sources): Binary assignment matrix.
+    Returns:
+        possible_loss (batch_size, P)
+    """
+    batch_size, n_mixtures = target.size()[:2]
+    target_size = target.size()[2:]
+    P = assignments.size(0)
+
+    estimated_mixture = torch.einsum('pnm,bm...->bpn...', assignments, input) # (batch_size, P, n_mixtures, *)
+    estimated_mixture = estimated_mixture.reshape(batch_size * P, n_mixtures, *target_size)
+    target = target.unsqueeze(dim=1).expand(-1, P, n_mixtures, *target_size)
+    target = target.reshape(batch_size * P, n_mixtures, *target_size)
+
+    possible_loss = criterion(estimated_mixture, target, batch_mean=False)
+    possible_loss = possible_loss.view(batch_size, P)
+
+    return possible_loss
+
+def build_assignment_matrix(patterns, n_mixtures):
+    """
+    Args:
+        patterns (P, n_sources): Index of mixture assigned to each source.
+    Returns:
+        assignments (P, n_mixtures, n_sources): Binary assignment matrix.
+    """
+    assignments = F.one_hot(patterns, num_classes=n_mixtures) # (P, n_sources, n_mixtures)
+    assignments = assignments.permute(0, 2, 1)
+
+    return assignments
+
+class MixIT(nn.Module):
+    def __init__(self, criterion, n_sources, n_mixtures=2, chunk_size=None):
+        """
+        Args:
+            criterion <callable>: criterion is expected acceptable (input, target, batch_mean) when called.
+            n_sources <int>: Number of estimated sources.
+            n_mixtures <int>: Number of mixtures in mixture of mixtures.
+            chunk_size <int>: Number of assignments evaluated at once. Use small value to save memory when n_sources is large.
+        """
+        super().__init__()
+
+        self.criterion = criterion
+        self.n_mixtures = n_mixtures
+        self.chunk_size = chunk_size
+
+        patterns = list(itertools.product(range(n_mixtures), repeat=n_sources))
+        self.patterns = torch.Tensor(patterns).long()
+
+    def forward(self, input, target, batch_mean=True):
+        """
+        Args:
+            input (batch_size, n_sources, *): Estimated sources.
+            target (batch_size, n_mixtures, *): Mixtures.
+        Returns:
+            loss (batch_size,): minimum loss for each data
+            pattern (batch_size, n_sources): index of mixture assigned to each source
+        """
+        loss, pattern = mixit(self.criterion, input, target, patterns=self.patterns, chunk_size=self.chunk_size, batch_mean=batch_mean)
+
+        return loss, pattern
+
+def _test_mixit():
+    torch.manual_seed(111)
+
+    batch_size, n_sources, n_mixtures, T = 4, 4, 2, 1024
+    input = torch.randn(batch_size, n_sources, T)
+    pattern = torch.randint(n_mixtures, (batch_size, n_sources))
+    target = torch.einsum('bnm,bmt->bnt', build_assignment_matrix(pattern, n_mixtures=n_mixtures).float(), input)
+
+    print('-'*10, "Negative SDR", '-'*10)
+    criterion = NegSDR()
+    mixit_criterion = MixIT(criterion, n_sources=n_sources, n_mixtures=n_mixtures, chunk_size=4)
+    loss, estimated_pattern = mixit_criterion(input, target, batch_mean=False)
+
+    print(loss)
+    print(pattern)
+    print(estimated_pattern)
+
+if __name__ == '__main__':
+    from criterion.sdr import NegSDR
 
-class MixIT:
-    def __init__(self):
-        pass
\ No newline at end of file
+    print('='*10, "Mixture invariant training", '='*10)
+    _test_mixit()
@@ -3,15 +3,19 @@ import itertools
 import torch
 import torch.nn as nn
 
+from criterion.sdr import SDR, NegSDR, SISDR, NegSISDR, ClippedSISDR, ClippedNegSISDR
+from criterion.distance import L1Loss, L2Loss, SquaredError, MeanAbsoluteError, MeanSquaredError
+
 """
     Permutation invariant training
 """
-def pit(criterion, input, target, n_sources=None, patterns=None, batch_mean=True):
+def pit(criterion, input, target, n_sources=None, patterns=None, pairwise=False, batch_mean=True):
     """
     Args:
         criterion <callable>
         input (batch_size, n_sources, *)
         output (batch_size, n_sources, *)
+        pairwise <bool>: If True and criterion is separable over sources, criterion is evaluated only n_sources**2 times.
     Returns:
         loss (batch_size,): minimum loss for each data
         pattern (batch_size,): permutation indices
@@ -22,6 +26,12 @@ def pit(criterion, input, target, n_sources=None, patterns=None, batch_mean=True
         patterns = list(itertools.permutations(range(n_sources)))
         patterns = torch.Tensor(patterns).long()
 
+    if pairwise:
+        source_reduction = get_source_reduction(criterion, n_dims=input.dim())
+
+        if source_reduction is not None:
+            return pairwise_pit(criterion, input, target, patterns=patterns, source_reduction=source_reduction, batch_mean=batch_mean)
+
     P = len(patterns)
     possible_loss = []
 
@@ -43,15 +53,130 @@ def pit(criterion, input, target, n_sources=None, patterns=None, batch_mean=True
 
     return loss, patterns[indices]
 
+def pairwise_pit(criterion, input, target, n_sources=None, patterns=None, source_reduction='mean', batch_mean=True):
+    """
+    Args:
+        criterion <callable>: Separable criterion over sources.
+        input (batch_size, n_sources, *)
+        output (batch_size, n_sources, *)
+        source_reduction <str>: How criterion reduces per-source losses. 'mean' or 'sum'.
+    Returns:
+        loss (batch_size,): minimum loss for each data
+        pattern (batch_size,): permutation indices
+    """
+    if patterns is None:
+        if n_sources is None:
+            n_sources = input.size(1)
+        patterns = list(itertools.permutations(range(n_sources)))
+        patterns = torch.Tensor(patterns).long()
+
+    n_sources = patterns.size(1)
+    patterns = patterns.to(input.device)
+
+    pairwise_loss = compute_pairwise_loss(criterion, input, target) # (batch_size, n_sources, n_sources)
+    possible_loss = pairwise_loss[:, torch.arange(n_sources), patterns] # (batch_size, P, n_sources)
+
+    if source_reduction == 'mean':
+        possible_loss = possible_loss.mean(dim=2)
+    elif source_reduction == 'sum':
+        possible_loss = possible_loss.sum(dim=2)
+    else:
+        raise ValueError("Invalid source_reduction {}.".format(source_reduction))
+
+    # possible_loss (batch_size, P)
+    if hasattr(criterion, "maximize") and criterion.maximize:
+        loss, indices = torch.max(possible_loss, dim=1) # loss (batch_size,), indices (batch_size,)
+    else:
+        loss, indices = torch.min(possible_loss, dim=1) # loss (batch_size,), indices (batch_size,)
+
+    if batch_mean:
+        loss = loss.mean(dim=0)
+
+    return loss, patterns[indices]
+
+def compute_pairwise_loss(criterion, input, target):
+    """
+    Args:
+        criterion <callable>
+        input (batch_size, n_sources, *)
+        target (batch_size, n_sources, *)
+    Returns:
+        pairwise_loss (batch_size, n_sources, n_sources): pairwise_loss[:, i, j] is loss between input[:, i] and target[:, j].
+    If criterion has `pairwise` method, the matrix is computed by it directly.
+    """
+    if hasattr(criterion, "pairwise"):
+        return criterion.pairwise(input, target)
+
+    batch_size, n_sources = input.size()[:2]
+    input_size, target_size = input.size()[2:], target.size()[2:]
+
+    input, target = input.unsqueeze(dim=2).expand(-1, -1, n_sources, *input_size), target.unsqueeze(dim=1).expand(-1, n_sources, -1, *target_size)
+    input, target = input.reshape(batch_size * n_sources * n_sources, 1, *input_size), target.reshape(batch_size * n_sources * n_sources, 1, *target_size)
+    pairwise_loss = criterion(input, target, batch_mean=False)
+    pairwise_loss = pairwise_loss.view(batch_size, n_sources, n_sources)
+
+    return pairwise_loss
+
+def get_source_reduction(criterion, n_dims):
+    """
+    Args:
+        criterion <callable>
+        n_dims <int>: Number of dimensions of input, i.e. len((batch_size, n_sources, *)).
+    Returns:
+        source_reduction <str>: 'mean' or 'sum' if criterion is separable over sources, otherwise None.
+    """
+    def _to_dims(dim):
+        if dim is None:
+            return set(range(1, n_dims))
+
+        if type(dim) is int:
+            dim = (dim,)
+
+        return set([_dim % n_dims for _dim in dim])
+
+    if isinstance(criterion, (SDR, NegSDR, SISDR, NegSISDR, ClippedSISDR, ClippedNegSISDR)):
+        if n_dims in [3, 4]:
+            return criterion.reduction
+        return None
+
+    if isinstance(criterion, L1Loss):
+        if 1 in _to_dims(criterion.dim):
+            return 'sum'
+        return criterion.reduction
+
+    if isinstance(criterion, L2Loss):
+        if 1 in _to_dims(criterion.dim):
+            return None
+        return criterion.reduction
+
+    if isinstance(criterion, (MeanAbsoluteError, MeanSquaredError)):
+        dims = _to_dims(criterion.dim)
+
+        if 1 in dims:
+            if criterion.reduction or dims == set(range(1, n_dims)):
+                return 'mean'
+            return None
+        return criterion.reduction
+
+    if isinstance(criterion, SquaredError):
+        if criterion.reduction and _to_dims(criterion.reduction_dim) == set(range(1, n_dims)):
+            return criterion.reduction
+        return None
+
+    return None
+
 class PIT(nn.Module):
-    def __init__(self, criterion, n_sources):
+    def __init__(self, criterion, n_sources, pairwise=False):
         """
         Args:
             criterion <callable>: criterion is expected acceptable (input, target, batch_mean) when called.
+            pairwise <bool>: If True, pairwise loss matrix is used for criterion separable over sources.
         """
         super().__init__()
 
         self.criterion = criterion
+        self.pairwise = pairwise
+
         patterns = list(itertools.permutations(range(n_sources)))
         self.patterns = torch.Tensor(patterns).long()
 
@@ -64,31 +189,38 @@ class PIT(nn.Module):
             loss (batch_size,): minimum loss for each data
             pattern (batch_size,): permutation indices
         """
-        loss, pattern = pit(self.criterion, input, target, patterns=self.patterns, batch_mean=batch_mean)
+        loss, pattern = pit(self.criterion, input, target, patterns=self.patterns, pairwise=self.pairwise, batch_mean=batch_mean)
 
         return loss, pattern
 
 class PIT1d(PIT):
-    def __init__(self, criterion, n_sources):
+    def __init__(self, criterion, n_sources, pairwise=True):
         """
         Args:
             criterion <callable>: criterion is expected acceptable (input, target, batch_mean) when called.
+            pairwise <bool>: If True, pairwise loss matrix is used for criterion separable over sources.
         """
-        super().__init__(criterion, n_sources)
+        super().__init__(criterion, n_sources, pairwise=pairwise)
 
 class PIT2d(PIT):
-    def __init__(self, criterion, n_sources):
+    def __init__(self, criterion, n_sources, pairwise=True):
         """
         Args:
             criterion <callable>: criterion is expected acceptable (input, target, batch_mean) when called.
+            pairwise <bool>: If True, pairwise loss matrix is used for criterion separable over sources.
         """
-        super().__init__(criterion, n_sources)
+        super().__init__(criterion, n_sources, pairwise=pairwise)
 
 class ORPIT(nn.Module):
     """
     One-and-Rest permutation invariant training
     """
-    def __init__(self, criterion):
+    def __init__(self, criterion, n_sources=None):
+        """
+        Args:
+            criterion <callable>: criterion is expected acceptable (input, target, batch_mean) when called.
+            n_sources <int>: Maximum number of sources. Not used because `n_sources` is inferred from target.
+        """
         super().__init__()
 
         self.criterion = criterion
@@ -111,49 +243,35 @@ class ORPIT(nn.Module):
 
         if type(target) is torch.Tensor:
             batch_size = target.size(0)
-            lens_unpacked = [target.size(1)] * batch_size
+            lens_unpacked = torch.full((batch_size,), target.size(1), dtype=torch.long)
         else:
             target, lens_unpacked = nn.utils.rnn.pad_packed_sequence(target, batch_first=True)
 
-        # TODO: batch process
-
-        batch_size = input.size(0)
-        batch_loss, batch_indices = None, None
-
-        for batch_idx in range(batch_size):
-            n_sources = lens_unpacked[batch_idx] # <int>
-            _input, _target = input[batch_idx: batch_idx + 1], target[batch_idx: batch_idx + 1, : n_sources] # (1, 2, *), (1, n_sources, *)
-            input_one, input_rest = torch.unbind(_input, dim=1) # (1, *), (1, *)
-
-            possible_loss = None
-
-            for idx in range(n_sources):
-                mask_one = torch.zeros_like(_target)
-                mask_one[:, idx] = 1.0
-                mask_rest = torch.ones_like(_target) - mask_one
-                target_one = torch.sum(mask_one * _target, dim=1) # (1, *)
-                target_rest = torch.sum(mask_rest * _target, dim=1) # (1, *)
-
-                loss_one = criterion(input_one, target_one, batch_mean=False)
-                loss_rest = criterion(input_rest, target_rest, batch_mean=False)
-                loss = loss_one + loss_rest / (n_sources - 1)
-
-                if possible_loss is None:
-                    possible_loss = loss
-                else:
-                    possible_loss = torch.cat([possible_loss, loss], dim=0)
-
-            if hasattr(criterion, "maximize") and criterion.maximize:
-                loss, indices = torch.max(possible_loss, dim=0, keepdim=True) # loss (1,), indices (1,)
-            else:
-                loss, indices = torch.min(possible_loss, dim=0, keepdim=True) # loss (1,), indices (1,)
-
-            if batch_loss is None:
-                batch_loss = loss
-                batch_indices = indices
-            else:
-                batch_loss = torch.cat([batch_loss, loss], dim=0)
-                batch_indices = torch.cat([batch_indices, indices], dim=0)
+        batch_size, max_n_sources = target.size()[:2]
+        n_sources = lens_unpacked.to(target.device) # (batch_size,)
+
+        source_indices = torch.arange(max_n_sources, device=target.device)
+        mask = source_indices < n_sources.unsqueeze(dim=1) # (batch_size, max_n_sources)
+        batch_indices, _ = torch.nonzero(mask, as_tuple=True) # (n_candidates,), where n_candidates = sum(n_sources)
+
+        # Candidates of 'one' are gathered over the batch, so padded sources are never evaluated.
+        input_one, input_rest = torch.unbind(input, dim=1) # (batch_size, *), (batch_size, *)
+        input_one, input_rest = input_one[batch_indices], input_rest[batch_indices] # (n_candidates, *), (n_candidates, *)
+        target_one = target[mask] # (n_candidates, *)
+        target_rest = target.sum(dim=1)[batch_indices] - target_one # (n_candidates, *), padded sources are zeros.
+
+        loss_one = criterion(input_one, target_one, batch_mean=False)
+        loss_rest = criterion(input_rest, target_rest, batch_mean=False)
+        loss = loss_one + loss_rest / (n_sources[batch_indices] - 1) # (n_candidates,)
+
+        if hasattr(criterion, "maximize") and criterion.maximize:
+            possible_loss = torch.full((batch_size, max_n_sources), - float('inf'), dtype=loss.dtype, device=loss.device)
+            possible_loss = possible_loss.masked_scatter(mask, loss)
+            batch_loss, batch_indices = torch.max(possible_loss, dim=1) # (batch_size,), (batch_size,)
+        else:
+            possible_loss = torch.full((batch_size, max_n_sources), float('inf'), dtype=loss.dtype, device=loss.device)
+            possible_loss = possible_loss.masked_scatter(mask, loss)
+            batch_loss, batch_indices = torch.min(possible_loss, dim=1) # (batch_size,), (batch_size,)
 
         if batch_mean:
             batch_loss = batch_loss.mean(dim=0)
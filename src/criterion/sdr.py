@@ -3,12 +3,13 @@ import torch.nn as nn
 
 EPS = 1e-12
 
-def sdr(input, target, eps=EPS):
+def sdr(input, target, eps=EPS, accumulate_dtype=None):
     """
     Source-to-distortion ratio (SDR)
     Args:
         input (batch_size, T) or (batch_size, n_sources, T), or (batch_size, n_sources, n_mics, T)
         target (batch_size, T) or (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        accumulate_dtype <torch.dtype>: Dtype to accumulate statistics in, e.g. torch.float64. If None, float16 and bfloat16 are accumulated in float32.
     Returns:
         loss (batch_size,) or (batch_size, n_sources) or (batch_size, n_sources, n_mics)
     """
@@ -16,13 +17,18 @@ def sdr(input, target, eps=EPS):
 
     assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-    loss = (torch.sum(target**2, dim=n_dims-1) + eps) / (torch.sum((target - input)**2, dim=n_dims-1) + eps)
-    loss = 10 * torch.log10(loss)
+    dtype = input.dtype
+    input, target = _promote(input, accumulate_dtype=accumulate_dtype), _promote(target, accumulate_dtype=accumulate_dtype)
+
+    dot = torch.sum(input * target, dim=n_dims-1)
+    input_power, target_power = torch.sum(input**2, dim=n_dims-1), torch.sum(target**2, dim=n_dims-1)
+    loss = _sdr_from_statistics(dot, input_power, target_power, eps=eps)
+    loss = loss.to(dtype)
 
     return loss
 
 class SDR(nn.Module):
-    def __init__(self, reduction='mean', eps=EPS):
+    def __init__(self, reduction='mean', eps=EPS, accumulate_dtype=None):
         super().__init__()
 
         self.reduction = reduction
@@ -31,6 +37,7 @@ class SDR(nn.Module):
             raise ValueError("Invalid reduction type")
 
         self.eps = eps
+        self.accumulate_dtype = accumulate_dtype
 
     def forward(self, input, target, batch_mean=True):
         """
@@ -44,7 +51,7 @@ class SDR(nn.Module):
 
         assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-        loss = sdr(input, target, eps=self.eps)
+        loss = sdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
 
         if self.reduction:
             if n_dims == 3:
@@ -63,12 +70,30 @@ class SDR(nn.Module):
 
         return loss
 
+    def pairwise(self, input, target):
+        """
+        Args:
+            input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+            target (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss (batch_size, n_sources, n_sources): loss[:, i, j] is loss between input[:, i] and target[:, j].
+        """
+        loss = pairwise_sdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
+
+        if loss.dim() == 4:
+            if self.reduction == 'sum':
+                loss = loss.sum(dim=3)
+            else:
+                loss = loss.mean(dim=3)
+
+        return loss
+
     @property
     def maximize(self):
         return True
 
 class NegSDR(nn.Module):
-    def __init__(self, reduction='mean', eps=EPS):
+    def __init__(self, reduction='mean', eps=EPS, accumulate_dtype=None):
         super().__init__()
 
         self.reduction = reduction
@@ -77,6 +102,7 @@ class NegSDR(nn.Module):
             raise ValueError("Invalid reduction type")
 
         self.eps = eps
+        self.accumulate_dtype = accumulate_dtype
 
     def forward(self, input, target, batch_mean=True):
         """
@@ -90,7 +116,7 @@ class NegSDR(nn.Module):
 
         assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-        loss = - sdr(input, target, eps=self.eps)
+        loss = - sdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
 
         if self.reduction:
             if n_dims == 3:
@@ -109,6 +135,24 @@ class NegSDR(nn.Module):
 
         return loss
 
+    def pairwise(self, input, target):
+        """
+        Args:
+            input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+            target (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss (batch_size, n_sources, n_sources): loss[:, i, j] is loss between input[:, i] and target[:, j].
+        """
+        loss = - pairwise_sdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
+
+        if loss.dim() == 4:
+            if self.reduction == 'sum':
+                loss = loss.sum(dim=3)
+            else:
+                loss = loss.mean(dim=3)
+
+        return loss
+
     @property
     def maximize(self):
         return False
@@ -119,12 +163,13 @@ class NegSDR(nn.Module):
     https://arxiv.org/abs/1811.02508
 """
 
-def sisdr(input, target, eps=EPS):
+def sisdr(input, target, eps=EPS, accumulate_dtype=None):
     """
     Scale-invariant-SDR (source-to-distortion ratio)
     Args:
         input (batch_size, T) or (batch_size, n_sources, T), or (batch_size, n_sources, n_mics, T)
         target (batch_size, T) or (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        accumulate_dtype <torch.dtype>: Dtype to accumulate statistics in, e.g. torch.float64. If None, float16 and bfloat16 are accumulated in float32.
     Returns:
         loss (batch_size,) or (batch_size, n_sources) or (batch_size, n_sources, n_mics)
     """
@@ -132,14 +177,114 @@ def sisdr(input, target, eps=EPS):
 
     assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-    alpha = torch.sum(input * target, dim=n_dims-1, keepdim=True) / (torch.sum(target**2, dim=n_dims-1, keepdim=True) + eps)
-    loss = (torch.sum((alpha * target)**2, dim=n_dims-1) + eps) / (torch.sum((alpha * target - input)**2, dim=n_dims-1) + eps)
+    dtype = input.dtype
+    input, target = _promote(input, accumulate_dtype=accumulate_dtype), _promote(target, accumulate_dtype=accumulate_dtype)
+
+    dot = torch.sum(input * target, dim=n_dims-1)
+    input_power, target_power = torch.sum(input**2, dim=n_dims-1), torch.sum(target**2, dim=n_dims-1)
+    loss = _sisdr_from_statistics(dot, input_power, target_power, eps=eps)
+    loss = loss.to(dtype)
+
+    return loss
+
+def pairwise_sdr(input, target, zero_mean=False, eps=EPS, accumulate_dtype=None):
+    """
+    SDR between every estimated source and every reference.
+    Args:
+        input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        target (batch_size, n_targets, T) or (batch_size, n_targets, n_mics, T)
+        zero_mean <bool>: If True, mean along time is subtracted beforehand.
+        accumulate_dtype <torch.dtype>: Dtype to accumulate statistics in, e.g. torch.float64. If None, float16 and bfloat16 are accumulated in float32.
+    Returns:
+        loss (batch_size, n_sources, n_targets) or (batch_size, n_sources, n_targets, n_mics)
+    """
+    dtype = input.dtype
+    dot, input_power, target_power = _pairwise_statistics(input, target, zero_mean=zero_mean, accumulate_dtype=accumulate_dtype)
+    loss = _sdr_from_statistics(dot, input_power, target_power, eps=eps)
+    loss = loss.to(dtype)
+
+    return loss
+
+def pairwise_sisdr(input, target, zero_mean=False, eps=EPS, accumulate_dtype=None):
+    """
+    SI-SDR between every estimated source and every reference.
+    Args:
+        input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        target (batch_size, n_targets, T) or (batch_size, n_targets, n_mics, T)
+        zero_mean <bool>: If True, mean along time is subtracted beforehand.
+        accumulate_dtype <torch.dtype>: Dtype to accumulate statistics in, e.g. torch.float64. If None, float16 and bfloat16 are accumulated in float32.
+    Returns:
+        loss (batch_size, n_sources, n_targets) or (batch_size, n_sources, n_targets, n_mics)
+    """
+    dtype = input.dtype
+    dot, input_power, target_power = _pairwise_statistics(input, target, zero_mean=zero_mean, accumulate_dtype=accumulate_dtype)
+    loss = _sisdr_from_statistics(dot, input_power, target_power, eps=eps)
+    loss = loss.to(dtype)
+
+    return loss
+
+def _pairwise_statistics(input, target, zero_mean=False, accumulate_dtype=None):
+    """
+    Args:
+        input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        target (batch_size, n_targets, T) or (batch_size, n_targets, n_mics, T)
+    Returns:
+        dot (batch_size, n_sources, n_targets) or (batch_size, n_sources, n_targets, n_mics)
+        input_power (batch_size, n_sources, 1) or (batch_size, n_sources, 1, n_mics)
+        target_power (batch_size, 1, n_targets) or (batch_size, 1, n_targets, n_mics)
+    """
+    n_dims = input.dim()
+
+    assert n_dims in [3, 4], "Only 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
+
+    if zero_mean:
+        input = input - input.mean(dim=-1, keepdim=True)
+        target = target - target.mean(dim=-1, keepdim=True)
+
+    input, target = _promote(input, accumulate_dtype=accumulate_dtype), _promote(target, accumulate_dtype=accumulate_dtype)
+
+    if n_dims == 3:
+        dot = torch.matmul(input, target.transpose(1, 2)) # (batch_size, n_sources, n_targets)
+    else:
+        dot = torch.matmul(input.transpose(1, 2), target.permute(0, 2, 3, 1)) # (batch_size, n_mics, n_sources, n_targets)
+        dot = dot.permute(0, 2, 3, 1) # (batch_size, n_sources, n_targets, n_mics)
+
+    input_power = torch.sum(input**2, dim=-1).unsqueeze(dim=2)
+    target_power = torch.sum(target**2, dim=-1).unsqueeze(dim=1)
+
+    return dot, input_power, target_power
+
+def _sdr_from_statistics(dot, input_power, target_power, eps=EPS):
+    distortion_power = torch.clamp(target_power - 2 * dot + input_power, min=0)
+    loss = (target_power + eps) / (distortion_power + eps)
+    loss = 10 * torch.log10(loss)
+
+    return loss
+
+def _sisdr_from_statistics(dot, input_power, target_power, eps=EPS):
+    alpha = dot / (target_power + eps)
+    scaled_target_power = alpha**2 * target_power
+    distortion_power = torch.clamp(scaled_target_power - 2 * alpha * dot + input_power, min=0)
+    loss = (scaled_target_power + eps) / (distortion_power + eps)
     loss = 10 * torch.log10(loss)
 
     return loss
 
+def _promote(input, accumulate_dtype=None):
+    """
+    Half-precision inputs are accumulated in float32, because distortion power is computed by subtraction.
+    float32 is kept as it is unless accumulate_dtype is given.
+    """
+    if accumulate_dtype is not None:
+        return input.to(accumulate_dtype)
+
+    if input.dtype in [torch.float16, torch.bfloat16]:
+        return input.float()
+
+    return input
+
 class SISDR(nn.Module):
-    def __init__(self, reduction='mean', eps=EPS):
+    def __init__(self, reduction='mean', eps=EPS, accumulate_dtype=None):
         super().__init__()
 
         self.reduction = reduction
@@ -148,6 +293,7 @@ class SISDR(nn.Module):
             raise ValueError("Invalid reduction type")
 
         self.eps = eps
+        self.accumulate_dtype = accumulate_dtype
 
     def forward(self, input, target, batch_mean=True):
         """
@@ -161,7 +307,7 @@ class SISDR(nn.Module):
 
         assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-        loss = sisdr(input, target, eps=self.eps)
+        loss = sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
 
         if self.reduction:
             if n_dims == 3:
@@ -180,12 +326,30 @@ class SISDR(nn.Module):
 
         return loss
 
+    def pairwise(self, input, target):
+        """
+        Args:
+            input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+            target (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss (batch_size, n_sources, n_sources): loss[:, i, j] is loss between input[:, i] and target[:, j].
+        """
+        loss = pairwise_sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
+
+        if loss.dim() == 4:
+            if self.reduction == 'sum':
+                loss = loss.sum(dim=3)
+            else:
+                loss = loss.mean(dim=3)
+
+        return loss
+
     @property
     def maximize(self):
         return True
 
 class NegSISDR(nn.Module):
-    def __init__(self, reduction='mean', eps=EPS):
+    def __init__(self, reduction='mean', eps=EPS, accumulate_dtype=None):
         super().__init__()
 
         self.reduction = reduction
@@ -194,6 +358,7 @@ class NegSISDR(nn.Module):
             raise ValueError("Invalid reduction type")
 
         self.eps = eps
+        self.accumulate_dtype = accumulate_dtype
 
     def forward(self, input, target, batch_mean=True):
         """
@@ -207,7 +372,7 @@ class NegSISDR(nn.Module):
 
         assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-        loss = - sisdr(input, target, eps=self.eps)
+        loss = - sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
 
         if self.reduction:
             if n_dims == 3:
@@ -226,12 +391,30 @@ class NegSISDR(nn.Module):
 
         return loss
 
+    def pairwise(self, input, target):
+        """
+        Args:
+            input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+            target (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss (batch_size, n_sources, n_sources): loss[:, i, j] is loss between input[:, i] and target[:, j].
+        """
+        loss = - pairwise_sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
+
+        if loss.dim() == 4:
+            if self.reduction == 'sum':
+                loss = loss.sum(dim=3)
+            else:
+                loss = loss.mean(dim=3)
+
+        return loss
+
     @property
     def maximize(self):
         return False
 
 class ClippedSISDR(nn.Module):
-    def __init__(self, max=None, reduction='mean', eps=EPS):
+    def __init__(self, max=None, reduction='mean', eps=EPS, accumulate_dtype=None):
         super().__init__()
 
         self.max = max
@@ -241,6 +424,7 @@ class ClippedSISDR(nn.Module):
             raise ValueError("Invalid reduction type")
 
         self.eps = eps
+        self.accumulate_dtype = accumulate_dtype
 
     def forward(self, input, target, batch_mean=True):
         """
@@ -254,7 +438,7 @@ class ClippedSISDR(nn.Module):
 
         assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-        loss = sisdr(input, target, eps=self.eps)
+        loss = sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
         loss = torch.clamp(loss, max=self.max)
 
         if self.reduction:
@@ -274,12 +458,31 @@ class ClippedSISDR(nn.Module):
 
         return loss
 
+    def pairwise(self, input, target):
+        """
+        Args:
+            input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+            target (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss (batch_size, n_sources, n_sources): loss[:, i, j] is loss between input[:, i] and target[:, j].
+        """
+        loss = pairwise_sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
+        loss = torch.clamp(loss, max=self.max)
+
+        if loss.dim() == 4:
+            if self.reduction == 'sum':
+                loss = loss.sum(dim=3)
+            else:
+                loss = loss.mean(dim=3)
+
+        return loss
+
     @property
     def maximize(self):
         return True
 
 class ClippedNegSISDR(nn.Module):
-    def __init__(self, min=None, reduction='mean', eps=EPS):
+    def __init__(self, min=None, reduction='mean', eps=EPS, accumulate_dtype=None):
         super().__init__()
 
         self.min = min
@@ -289,6 +492,7 @@ class ClippedNegSISDR(nn.Module):
             raise ValueError("Invalid reduction type")
 
         self.eps = eps
+        self.accumulate_dtype = accumulate_dtype
 
     def forward(self, input, target, batch_mean=True):
         """
@@ -302,7 +506,7 @@ class ClippedNegSISDR(nn.Module):
 
         assert n_dims in [2, 3, 4], "Only 2D or 3D or 4D tensor is acceptable, but given {}D tensor.".format(n_dims)
 
-        loss = - sisdr(input, target, eps=self.eps)
+        loss = - sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
         loss = torch.clamp(loss, min=self.min)
 
         if self.reduction:
@@ -322,6 +526,25 @@ class ClippedNegSISDR(nn.Module):
 
         return loss
 
+    def pairwise(self, input, target):
+        """
+        Args:
+            input (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+            target (batch_size, n_sources, T) or (batch_size, n_sources, n_mics, T)
+        Returns:
+            loss (batch_size, n_sources, n_sources): loss[:, i, j] is loss between input[:, i] and target[:, j].
+        """
+        loss = - pairwise_sisdr(input, target, eps=self.eps, accumulate_dtype=self.accumulate_dtype)
+        loss = torch.clamp(loss, min=self.min)
+
+        if loss.dim() == 4:
+            if self.reduction == 'sum':
+                loss = loss.sum(dim=3)
+            else:
+                loss = loss.mean(dim=3)
+
+        return loss
+
     @property
     def maximize(self):
         return False
@@ -441,7 +664,22 @@ class NegWeightedSDR(nn.Module):
         return False
 
 def _test_sisdr():
-    pass
+    torch.manual_seed(111)
+
+    batch_size, n_sources, T = 4, 3, 1024
+    input = torch.randn(batch_size, n_sources, T)
+    target = torch.randn(batch_size, n_sources, T)
+
+    print("-"*10, "SI-SDR", "-"*10)
+    loss = sisdr(input, target)
+    print(loss)
+    print()
+
+    print("-"*10, "Pairwise SI-SDR", "-"*10)
+    loss = pairwise_sisdr(input, target)
+    print(loss)
+    print(torch.diagonal(loss, dim1=1, dim2=2))
+    print()
 
 def _test_weighted_sdr():
     batch_size = 3
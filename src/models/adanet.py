@@ -3,6 +3,7 @@ import itertools
 import torch
 import torch.nn as nn
 
+from utils.model import load_checkpoint, cached_pretrained
 from transforms.stft import stft, istft
 from models.danet import DANet, DANetTimeDomainWrapper
 
@@ -144,7 +145,7 @@ class ADANet(DANet):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         n_bins = config['n_bins']
         embed_dim = config['embed_dim']
@@ -176,6 +177,7 @@ class ADANet(DANet):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
         import os
 
@@ -212,7 +214,7 @@ class ADANet(DANet):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
         model = cls.build_model(model_path, load_state_dict=load_state_dict)
 
         if task in ['wsj0-mix', 'wsj0']:
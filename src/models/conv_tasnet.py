@@ -5,8 +5,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.filterbank import choose_filterbank
-from utils.model import choose_nonlinear
+from utils.model import choose_nonlinear, load_checkpoint, cached_pretrained
 from utils.tasnet import choose_layer_norm
+from models.filterbank import GatedEncoder
 from models.tdcn import TimeDilatedConvNet
 
 SAMPLE_RATE_MUSDB18 = 44100
@@ -170,6 +171,124 @@ class ConvTasNet(nn.Module):
 
         return output, latent
 
+    def init_state(self, batch_size=1):
+        """
+        Initialize state for streaming inference. See `forward_step`.
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Streaming state.
+        """
+        n_sources = self.n_sources
+        kernel_size, stride = self.kernel_size, self.stride
+
+        if not self.causal:
+            raise ValueError("Streaming inference is supported only when causal=True.")
+
+        if isinstance(self.encoder, GatedEncoder):
+            raise ValueError("Streaming inference is not supported for {}.".format(type(self.encoder).__name__))
+
+        in_channels = self.in_channels
+        parameter = next(self.separator.parameters())
+        factory_kwargs = {
+            'device': parameter.device,
+            'dtype': parameter.dtype
+        }
+
+        state = {
+            'encoder': torch.zeros((batch_size, in_channels, 0), **factory_kwargs),
+            'separator': self.separator.init_state(batch_size),
+            'decoder': torch.zeros((batch_size * n_sources, in_channels, kernel_size - stride), **factory_kwargs),
+            'n_samples_in': 0, 'n_samples_out': 0
+        }
+
+        return state
+
+    def forward_step(self, input, state, flush=False):
+        """
+        Streaming inference for causal Conv-TasNet.
+        Samples which cannot fill a frame of encoder are kept in `state`, and overlapped samples of decoder are carried to next call.
+        The concatenated outputs are identical to `forward` on the concatenated inputs when (T - kernel_size) is divisible by stride,
+        where T is the total length. Otherwise, the last frame is padded on the right side.
+        Args:
+            input (batch_size, 1, T_block) or (batch_size, 1, n_mics, T_block): Block of input. T_block is arbitrary.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+            flush <bool>: If True, remaining samples are output. Set True at the last call.
+        Returns:
+            output (batch_size, n_sources, T_out) or (batch_size, n_sources, n_mics, T_out): Samples completed by this call.
+            state <dict>: Updated state.
+        """
+        n_sources = self.n_sources
+        n_basis = self.n_basis
+        kernel_size, stride = self.kernel_size, self.stride
+
+        n_dims = input.dim()
+
+        if n_dims == 3:
+            batch_size, C_in, T = input.size()
+            assert C_in == 1, "input.size() is expected (?, 1, ?), but given {}".format(input.size())
+        elif n_dims == 4:
+            batch_size, C_in, n_mics, T = input.size()
+            assert C_in == 1, "input.size() is expected (?, 1, ?, ?), but given {}".format(input.size())
+            input = input.view(batch_size, n_mics, T)
+        else:
+            raise ValueError("Not support {} dimension input".format(n_dims))
+
+        buffer = torch.cat([state['encoder'], input], dim=-1)
+        n_samples_in, n_samples_out = state['n_samples_in'] + T, state['n_samples_out']
+        overlap = state['decoder']
+        separator_state = state['separator']
+
+        if flush and buffer.size(-1) > kernel_size - stride:
+            # Pad right side to complete last frame.
+            padding = (stride - (buffer.size(-1) - kernel_size) % stride) % stride
+            buffer = F.pad(buffer, (0, padding))
+
+        if buffer.size(-1) >= kernel_size:
+            n_frames = (buffer.size(-1) - kernel_size) // stride + 1
+            w = self.encoder(buffer[..., :(n_frames - 1) * stride + kernel_size])
+            buffer = buffer[..., n_frames * stride:]
+
+            if torch.is_complex(w):
+                amplitude, phase = torch.abs(w), torch.angle(w)
+                mask, separator_state = self.separator.forward_step(amplitude, separator_state)
+                amplitude, phase = amplitude.unsqueeze(dim=1), phase.unsqueeze(dim=1)
+                w_hat = amplitude * mask * torch.exp(1j * phase)
+            else:
+                mask, separator_state = self.separator.forward_step(w, separator_state)
+                w = w.unsqueeze(dim=1)
+                w_hat = w * mask
+
+            w_hat = w_hat.view(batch_size * n_sources, n_basis, n_frames)
+            x_hat = self.decoder(w_hat)
+            x_hat_overlap, x_hat_rest = torch.split(x_hat, [kernel_size - stride, n_frames * stride], dim=-1)
+            x_hat = torch.cat([overlap + x_hat_overlap, x_hat_rest], dim=-1)
+            x_hat, overlap = torch.split(x_hat, [n_frames * stride, kernel_size - stride], dim=-1)
+        else:
+            x_hat = overlap[..., :0]
+
+        if flush:
+            # Trim padded samples.
+            x_hat = torch.cat([x_hat, overlap], dim=-1)
+            x_hat = x_hat[..., :max(n_samples_in - n_samples_out, 0)]
+            overlap = torch.zeros_like(overlap)
+
+        n_samples_out = n_samples_out + x_hat.size(-1)
+
+        if n_dims == 3:
+            output = x_hat.view(batch_size, n_sources, -1)
+        else: # n_dims == 4
+            output = x_hat.view(batch_size, n_sources, n_mics, -1)
+
+        state = {
+            'encoder': buffer,
+            'separator': separator_state,
+            'decoder': overlap,
+            'n_samples_in': n_samples_in, 'n_samples_out': n_samples_out
+        }
+
+        return output, state
+
     def get_config(self):
         config = {
             'in_channels': self.in_channels,
@@ -198,7 +317,7 @@ class ConvTasNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels = config.get('in_channels') or 1
         n_basis = config.get('n_bases') or config['n_basis']
@@ -236,6 +355,7 @@ class ConvTasNet(nn.Module):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
@@ -295,7 +415,7 @@ class ConvTasNet(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
         model = cls.build_model(model_path, load_state_dict=load_state_dict)
 
         if task == 'musdb18':
@@ -377,6 +497,48 @@ class Separator(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: States of normalization and time dilated convolutional network.
+        """
+        state = {
+            'norm': self.norm1d.init_state(batch_size),
+            'tdcn': self.tdcn.init_state(batch_size)
+        }
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Args:
+            input (batch_size, num_features, n_frames): Block of input.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, n_sources, n_basis, n_frames)
+            state <dict>: Updated state.
+        """
+        num_features, n_sources = self.num_features, self.n_sources
+
+        batch_size, _, n_frames = input.size()
+
+        x, norm_state = self.norm1d.forward_step(input, state['norm'])
+        x = self.bottleneck_conv1d(x)
+        x, tdcn_state = self.tdcn.forward_step(x, state['tdcn'])
+        x = self.prelu(x)
+        x = self.mask_conv1d(x)
+        x = self.mask_nonlinear(x)
+        output = x.view(batch_size, n_sources, num_features, n_frames)
+
+        state = {
+            'norm': norm_state,
+            'tdcn': tdcn_state
+        }
+
+        return output, state
+
 def _test_conv_tasnet():
     batch_size = 4
     C = 1
@@ -546,6 +708,53 @@ def _test_conv_tasnet_paper():
     plt.savefig('data/conv-tasnet/basis_enc-trainable.png', bbox_inches='tight')
     plt.close()
 
+def _test_conv_tasnet_streaming():
+    batch_size = 4
+    C = 1
+
+    L, stride = 16, 8
+    N = 64
+    H, B, Sc = 128, 64, 64
+    P = 3
+    R, X = 3, 8
+    sep_norm = True
+
+    T = L + 100 * stride
+    block_size = 40
+
+    input = torch.randn((batch_size, C, T), dtype=torch.float)
+
+    enc_basis, dec_basis = 'trainable', 'trainable'
+    enc_nonlinear = 'relu'
+    causal = True
+    mask_nonlinear = 'sigmoid'
+    n_sources = 2
+
+    model = ConvTasNet(
+        N, kernel_size=L, stride=stride, enc_basis=enc_basis, dec_basis=dec_basis, enc_nonlinear=enc_nonlinear,
+        sep_hidden_channels=H, sep_bottleneck_channels=B, sep_skip_channels=Sc, sep_kernel_size=P, sep_num_blocks=R, sep_num_layers=X,
+        causal=causal, sep_norm=sep_norm, mask_nonlinear=mask_nonlinear,
+        n_sources=n_sources
+    )
+    model.eval()
+
+    with torch.no_grad():
+        output = model(input)
+
+        state = model.init_state(batch_size)
+        output_streaming = []
+
+        for start_idx in range(0, T, block_size):
+            end_idx = min(start_idx + block_size, T)
+            flush = end_idx == T
+            _output, state = model.forward_step(input[..., start_idx:end_idx], state, flush=flush)
+            output_streaming.append(_output)
+
+        output_streaming = torch.cat(output_streaming, dim=-1)
+
+    print(input.size(), output.size(), output_streaming.size())
+    print("Max error: {}".format(torch.abs(output - output_streaming).max().item()))
+
 if __name__ == '__main__':
     import matplotlib.pyplot as plt
     from matplotlib.colors import Normalize
@@ -562,4 +771,8 @@ if __name__ == '__main__':
 
     print("="*10, "Conv-TasNet (same configuration in the paper)", "="*10)
     _test_conv_tasnet_paper()
+    print()
+
+    print("="*10, "Conv-TasNet (streaming)", "="*10)
+    _test_conv_tasnet_streaming()
     print()
\ No newline at end of file
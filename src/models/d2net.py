@@ -297,6 +297,7 @@ class QuantizableD2Block(nn.Module):
                 _in_channels = growth_rate[idx - 1]
                 sections = [_in_channels, sum(growth_rate[idx:])]
                 x, x_residual = torch.split(x_residual, sections, dim=1)
+                x_residual = x_residual.contiguous(memory_format=torch.channels_last) # quantized add is much slower for non-contiguous input
 
             x = self.net[idx](x)
 
@@ -9,9 +9,11 @@ from torch.nn.modules.utils import _pair
 
 from utils.audio import build_window
 from utils.d3net import choose_layer_norm
-from algorithm.frequency_mask import multichannel_wiener_filter
+from utils.model import quantize_static, build_quantizable_state_dict, load_checkpoint, cached_pretrained
+from algorithm.frequency_mask import multichannel_wiener_filter, multichannel_wiener_filter_real
+from algorithm.stft import BatchSTFT, BatchInvSTFT
 from transforms.stft import stft, istft
-from conv import QuantizableConvTranspose2d
+from modules.conv import QuantizableConvTranspose2d
 from models.transform import BandSplit
 from models.glu import GLU2d, QuantizableGLU2d
 from models.d2net import D2Block, D2BlockFixedDilation, QuantizableD2Block
@@ -43,8 +45,8 @@ class ParallelD3Net(nn.Module):
 
         for key in sources:
             module = modules[key]
-            if not isinstance(module, D3Net):
-                raise ValueError("All modules must be D3Net.")
+            if not isinstance(module, (D3Net, QuantizableD3Net)):
+                raise ValueError("All modules must be D3Net or QuantizableD3Net.")
 
             if in_channels is None:
                 in_channels = module.in_channels
@@ -90,6 +92,7 @@ class ParallelD3Net(nn.Module):
         return ParallelD3NetTimeDomainWrapper(base_model, n_fft, hop_length=hop_length, window_fn=window_fn)
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
         import os
 
@@ -128,7 +131,7 @@ class ParallelD3Net(nn.Module):
             if not os.path.exists(model_path):
                 download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-            config = torch.load(model_path, map_location=lambda storage, loc: storage)
+            config = load_checkpoint(model_path)
             modules[target] = D3Net.build_model(model_path, load_state_dict=load_state_dict)
 
             if task in ['musdb18', 'musdb18hq']:
@@ -216,6 +219,50 @@ class ParallelD3NetTimeDomainWrapper(nn.Module):
     def sources(self):
         return list(self.base_model.sources)
 
+class ExportableParallelD3NetTimeDomainWrapper(ParallelD3NetTimeDomainWrapper):
+    """
+    Exportable version of ParallelD3NetTimeDomainWrapper.
+    STFT and iSTFT are computed by convolution, and multichannel Wiener filter is computed by real arithmetic.
+    The whole waveform-in, waveform-out graph can be exported by torch.jit.trace or torch.onnx.export.
+    """
+    def __init__(self, base_model: ParallelD3Net, n_fft, hop_length=None, window_fn='hann', iteration=1, eps=EPS):
+        super().__init__(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
+
+        self.iteration = iteration
+
+        self.stft = BatchSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+        self.istft = BatchInvSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (batch_size, 1, in_channels, T)
+        Returns:
+            output <torch.Tensor>: (batch_size, n_sources, in_channels, T)
+        """
+        batch_size, _, in_channels, T = input.size()
+
+        mixture_spectrogram = self.stft(input.reshape(batch_size * in_channels, T)) # (batch_size * in_channels, n_bins, n_frames, 2)
+        _, n_bins, n_frames, _ = mixture_spectrogram.size()
+        mixture_spectrogram = mixture_spectrogram.view(batch_size, in_channels, n_bins, n_frames, 2)
+        mixture_amplitude = torch.sqrt(torch.sum(mixture_spectrogram**2, dim=-1)) # (batch_size, in_channels, n_bins, n_frames)
+
+        estimated_amplitude = []
+
+        for target in self.sources:
+            _estimated_amplitude = self.base_model(mixture_amplitude, target=target)
+            estimated_amplitude.append(_estimated_amplitude)
+
+        estimated_amplitude = torch.stack(estimated_amplitude, dim=1) # (batch_size, n_sources, in_channels, n_bins, n_frames)
+        estimated_spectrogram = multichannel_wiener_filter_real(mixture_spectrogram, estimated_sources_amplitude=estimated_amplitude, iteration=self.iteration, eps=self.eps)
+
+        n_sources = estimated_spectrogram.size(1)
+        estimated_spectrogram = estimated_spectrogram.view(batch_size * n_sources * in_channels, n_bins, n_frames, 2)
+        output = self.istft(estimated_spectrogram, T=T)
+        output = output.view(batch_size, n_sources, in_channels, T)
+
+        return output
+
 class D3Net(nn.Module):
     pretrained_model_ids = {
         "musdb18": {
@@ -455,7 +502,7 @@ class D3Net(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, num_features = config['in_channels'], config['num_features']
         growth_rate = config['growth_rate']
@@ -497,6 +544,7 @@ class D3Net(nn.Module):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", target='vocals', quiet=False, load_state_dict=True, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
@@ -531,7 +579,7 @@ class D3Net(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
         model = cls.build_model(model_path, load_state_dict=load_state_dict)
 
         if task in ['musdb18', 'musdb18hq']:
@@ -593,6 +641,43 @@ class D3NetTimeDomainWrapper(nn.Module):
 
         return output
 
+class ExportableD3NetTimeDomainWrapper(D3NetTimeDomainWrapper):
+    """
+    Exportable version of D3NetTimeDomainWrapper.
+    STFT and iSTFT are computed by convolution without complex tensors.
+    The whole waveform-in, waveform-out graph can be exported by torch.jit.trace or torch.onnx.export.
+    """
+    def __init__(self, base_model: nn.Module, n_fft, hop_length=None, window_fn='hann', eps=EPS):
+        super().__init__(base_model, n_fft, hop_length=hop_length, window_fn=window_fn)
+
+        self.eps = eps
+
+        self.stft = BatchSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+        self.istft = BatchInvSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (batch_size, in_channels, T)
+        Returns:
+            output <torch.Tensor>: (batch_size, in_channels, T)
+        """
+        batch_size, in_channels, T = input.size()
+
+        mixture_spectrogram = self.stft(input.reshape(batch_size * in_channels, T)) # (batch_size * in_channels, n_bins, n_frames, 2)
+        _, n_bins, n_frames, _ = mixture_spectrogram.size()
+        mixture_spectrogram = mixture_spectrogram.view(batch_size, in_channels, n_bins, n_frames, 2)
+        mixture_amplitude = torch.sqrt(torch.sum(mixture_spectrogram**2, dim=-1)) # (batch_size, in_channels, n_bins, n_frames)
+
+        estimated_amplitude = self.base_model(mixture_amplitude)
+        estimated_spectrogram = estimated_amplitude.unsqueeze(dim=-1) * mixture_spectrogram / (mixture_amplitude.unsqueeze(dim=-1) + self.eps) # Use phase of mixture
+
+        estimated_spectrogram = estimated_spectrogram.view(batch_size * in_channels, n_bins, n_frames, 2)
+        output = self.istft(estimated_spectrogram, T=T)
+        output = output.view(batch_size, in_channels, T)
+
+        return output
+
 class D3NetBackbone(nn.Module):
     def __init__(self, in_channels, num_features, growth_rate, kernel_size, scale=(2,2), num_d2blocks=None, dilated=True, norm=True, nonlinear='relu', depth=None, out_channels=None, eps=EPS):
         """
@@ -1074,6 +1159,7 @@ class QuantizableD3Net(nn.Module):
 
         self.bands, self.sections = bands, sections
 
+        self.quant = torch.quantization.QuantStub()
         self.band_split = BandSplit(sections=sections, dim=2)
         self.affine_in = nn.Conv1d(sum(sections), sum(sections), kernel_size=1, groups=sum(sections))
 
@@ -1102,6 +1188,10 @@ class QuantizableD3Net(nn.Module):
         self.glu2d = QuantizableGLU2d(growth_rate_final, in_channels, kernel_size=(1, 1), stride=(1, 1))
         self.affine_out = nn.Conv1d(sum(sections), sum(sections), kernel_size=1, groups=sum(sections))
         self.relu2d = nn.ReLU()
+        self.dequant = torch.quantization.DeQuantStub()
+
+        self.band_ops = nnq.FloatFunctional()
+        self.float_ops = nnq.FloatFunctional()
 
         self.in_channels, self.num_features = in_channels, num_features
         self.growth_rate = growth_rate
@@ -1137,6 +1227,7 @@ class QuantizableD3Net(nn.Module):
             sections = [sum(sections), n_bins - sum(sections)]
             x_valid, x_invalid = torch.split(input, sections, dim=2)
 
+        x_valid = self.quant(x_valid)
         x_valid = self.transform_affine_in(x_valid)
         x = self.band_split(x_valid)
         x_bands = []
@@ -1145,17 +1236,18 @@ class QuantizableD3Net(nn.Module):
             x_band = self.net[band](x_band)
             x_bands.append(x_band)
 
-        x_bands = torch.cat(x_bands, dim=2)
+        x_bands = self.band_ops.cat(x_bands, dim=2)
 
         x_full = self.net[FULL](x_valid)
 
-        x = torch.cat([x_bands, x_full], dim=1)
+        x = self.float_ops.cat([x_bands, x_full], dim=1)
 
         x = self.d2block(x)
         x = self.norm2d(x)
         x = self.glu2d(x)
         x = self.transform_affine_out(x)
         x = self.relu2d(x)
+        x = self.dequant(x)
 
         _, _, _, n_frames = x.size()
         _, _, _, n_frames_in = input.size()
@@ -1175,18 +1267,18 @@ class QuantizableD3Net(nn.Module):
     def transform_affine_in(self, input):
         batch_size, in_channels, n_bins, n_frames = input.size()
 
-        x = input.view(batch_size * in_channels, n_bins, n_frames)
+        x = input.reshape(batch_size * in_channels, n_bins, n_frames)
         x = self.affine_in(x)
-        output = x.view(batch_size, in_channels, n_bins, n_frames)
+        output = x.reshape(batch_size, in_channels, n_bins, n_frames)
 
         return output
 
     def transform_affine_out(self, input):
         batch_size, in_channels, n_bins, n_frames = input.size()
 
-        x = input.view(batch_size * in_channels, n_bins, n_frames)
+        x = input.reshape(batch_size * in_channels, n_bins, n_frames)
         x = self.affine_out(x)
-        output = x.view(batch_size, in_channels, n_bins, n_frames)
+        output = x.reshape(batch_size, in_channels, n_bins, n_frames)
 
         return output
 
@@ -1283,7 +1375,7 @@ class QuantizableD3Net(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, num_features = config['in_channels'], config['num_features']
         growth_rate = config['growth_rate']
@@ -1319,11 +1411,46 @@ class QuantizableD3Net(nn.Module):
             eps=eps
         )
 
+        if config.get('quantized', False):
+            # int8 checkpoint. Structure of converted model is required to load `state_dict`.
+            model = model.quantize(backend=config['backend'])
+
         if load_state_dict:
             model.load_state_dict(config['state_dict'])
 
         return model
 
+    @classmethod
+    def build_from_float(cls, model):
+        """
+        Args:
+            model <D3Net>: Trained D3Net.
+        Returns:
+            quantizable_model <QuantizableD3Net>: QuantizableD3Net whose output is equivalent to `model`.
+        """
+        config = model.get_config()
+        eps = config['eps']
+
+        quantizable_model = cls(**config)
+        state_dict = build_quantizable_state_dict(model, eps=eps)
+
+        quantizable_model.load_state_dict(state_dict)
+
+        return quantizable_model
+
+    def quantize(self, calibration_data=None, backend='fbgemm'):
+        """
+        Static post training quantization. This model is not modified, and quantized copy is returned.
+        Args:
+            calibration_data <iterable<torch.Tensor>>: Inputs with shape of (batch_size, in_channels, n_bins, n_frames) for calibration. If None, observers are not calibrated, which is used to build structure of int8 model.
+            backend <str>: 'fbgemm' (x86) or 'qnnpack' (ARM).
+        Returns:
+            model <QuantizableD3Net>: Quantized model. Only CPU is supported.
+        """
+        model = quantize_static(self, calibration_data=calibration_data, backend=backend)
+
+        return model
+
     @property
     def num_parameters(self):
         _num_parameters = 0
@@ -1653,6 +1780,7 @@ class QuantizableUpSampleD3Block(nn.Module):
         self.norm2d = choose_layer_norm('BN', in_channels, n_dims=2, eps=eps) # nn.BatchNorm2d
         self.upsample2d = QuantizableConvTranspose2d(in_channels, in_channels, kernel_size=up_scale, stride=up_scale)
         self.d3block = QuantizableD3Block(in_channels + skip_channels, growth_rate, kernel_size, num_blocks=num_blocks, dilated=dilated, norm=norm, nonlinear=nonlinear, depth=depth, eps=eps)
+        self.float_ops = nnq.FloatFunctional()
 
         self.out_channels = self.d3block.out_channels
 
@@ -1670,7 +1798,7 @@ class QuantizableUpSampleD3Block(nn.Module):
         padding_right = padding_width - padding_left
 
         x = F.pad(x, (-padding_left, -padding_right, -padding_top, -padding_bottom))
-        x = torch.cat([x, skip], dim=1)
+        x = self.float_ops.cat([x, skip], dim=1)
 
         output = self.d3block(x)
 
@@ -1782,6 +1910,7 @@ class QuantizableD3Block(nn.Module):
                 _in_channels = growth_rate[idx - 1]
                 sections = [_in_channels, sum(growth_rate[idx:])]
                 x, x_residual = torch.split(x_residual, sections, dim=1)
+                x_residual = x_residual.contiguous(memory_format=torch.channels_last) # quantized add is much slower for non-contiguous input
 
             x = self.net[idx](x)
 
@@ -4,7 +4,7 @@ import torch
 import torch.nn as nn
 
 from utils.audio import build_window
-from utils.model import choose_nonlinear
+from utils.model import choose_nonlinear, quantize_dynamic, load_checkpoint, cached_pretrained
 from algorithm.clustering import KMeans
 from transforms.stft import stft, istft
 
@@ -97,7 +97,8 @@ class DANet(nn.Module):
 
         batch_size, _, n_bins, n_frames = input.size()
 
-        self.rnn.flatten_parameters()
+        if isinstance(self.rnn, nn.RNNBase):
+            self.rnn.flatten_parameters()
 
         if self.take_log:
             x = torch.log(input + eps)
@@ -159,7 +160,8 @@ class DANet(nn.Module):
         batch_size, _, n_bins, n_frames = input.size()
         n_sources, embed_dim = attractor.size()
 
-        self.rnn.flatten_parameters()
+        if isinstance(self.rnn, nn.RNNBase):
+            self.rnn.flatten_parameters()
 
         if self.take_log:
             x = torch.log(input + eps)
@@ -202,8 +204,8 @@ class DANet(nn.Module):
         return config
 
     @classmethod
-    def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+    def build_model(cls, model_path, load_state_dict=False, quantized=False, weights_only=True):
+        config = load_checkpoint(model_path, weights_only=weights_only)
 
         n_bins = config['n_bins']
         embed_dim = config['embed_dim']
@@ -224,13 +226,23 @@ class DANet(nn.Module):
             eps=eps
         )
 
+        if config.get('quantized'):
+            # int8 weights are saved in checkpoint.
+            model = quantize_dynamic(model, backend=config.get('backend'))
+
         if load_state_dict:
             model.load_state_dict(config['state_dict'])
 
+        if quantized and not config.get('quantized'):
+            if not load_state_dict:
+                raise ValueError("Set load_state_dict=True to quantize float model.")
+            model = quantize_dynamic(model)
+
         return model
 
     @classmethod
-    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
+    @cached_pretrained
+    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, quantized=False, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
         task = kwargs.get('task')
@@ -275,8 +287,8 @@ class DANet(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
-        model = cls.build_model(model_path, load_state_dict=load_state_dict)
+        config = load_checkpoint(model_path)
+        model = cls.build_model(model_path, load_state_dict=load_state_dict, quantized=quantized)
 
         if task in ['wsj0-mix', 'wsj0', 'librispeech']:
             additional_attributes.update({
@@ -401,7 +413,7 @@ class FixedAttractorDANet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
         base_model = DANet.build_model(model_path, load_state_dict=False)
         dummy_attractor = torch.empty(*config["attractor_size"])
 
@@ -415,6 +427,7 @@ class FixedAttractorDANet(nn.Module):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
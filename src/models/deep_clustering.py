@@ -5,8 +5,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.audio import build_window
-from utils.model import choose_rnn
+from utils.model import choose_rnn, quantize_dynamic, load_checkpoint, cached_pretrained
 from algorithm.clustering import KMeans
+from algorithm.stft import BatchSTFT, BatchInvSTFT
 from transforms.stft import stft, istft
 
 EPS = 1e-12
@@ -89,8 +90,8 @@ class DeepEmbedding(nn.Module):
         return config
 
     @classmethod
-    def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+    def build_model(cls, model_path, load_state_dict=False, quantized=False, weights_only=True):
+        config = load_checkpoint(model_path, weights_only=weights_only)
 
         n_bins = config['n_bins']
         embed_dim = config['embed_dim']
@@ -111,13 +112,23 @@ class DeepEmbedding(nn.Module):
             eps=eps
         )
 
+        if config.get('quantized'):
+            # int8 weights are saved in checkpoint.
+            model = quantize_dynamic(model, backend=config.get('backend'))
+
         if load_state_dict:
             model.load_state_dict(config['state_dict'])
 
+        if quantized and not config.get('quantized'):
+            if not load_state_dict:
+                raise ValueError("Set load_state_dict=True to quantize float model.")
+            model = quantize_dynamic(model)
+
         return model
 
     @classmethod
-    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
+    @cached_pretrained
+    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, quantized=False, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
         task = kwargs.get('task')
@@ -151,8 +162,8 @@ class DeepEmbedding(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
-        model = cls.build_model(model_path, load_state_dict=load_state_dict)
+        config = load_checkpoint(model_path)
+        model = cls.build_model(model_path, load_state_dict=load_state_dict, quantized=quantized)
 
         if task in ['wsj0-mix', 'wsj0']:
             additional_attributes.update({
@@ -252,6 +263,94 @@ class DeepEmbeddingTimeDomainWrapper(nn.Module):
 
         return output
 
+class ExportableDeepEmbeddingTimeDomainWrapper(DeepEmbeddingTimeDomainWrapper):
+    """
+    Exportable version of DeepEmbeddingTimeDomainWrapper.
+    STFT and iSTFT are computed by convolution without complex tensors.
+    KMeans is replaced with deterministic k-means, which uses farthest point initialization and fixed number of iterations.
+    The whole waveform-in, waveform-out graph can be exported by torch.jit.trace or torch.onnx.export.
+    """
+    def __init__(self, base_model: DeepEmbedding, n_fft, hop_length=None, window_fn='hann', n_sources=2, iter_clustering=10, eps=EPS):
+        super().__init__(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
+
+        self.n_sources = n_sources
+        self.iter_clustering = iter_clustering
+
+        self.stft = BatchSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+        self.istft = BatchInvSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (batch_size, 1, T)
+        Returns:
+            output <torch.Tensor>: (batch_size, n_sources, T)
+        """
+        n_sources = self.n_sources
+
+        batch_size, _, T = input.size()
+
+        mixture_spectrogram = self.stft(input.reshape(batch_size, T)) # (batch_size, n_bins, n_frames, 2)
+        _, n_bins, n_frames, _ = mixture_spectrogram.size()
+        mixture_amplitude = torch.sqrt(torch.sum(mixture_spectrogram**2, dim=-1)) # (batch_size, n_bins, n_frames)
+
+        latent = self.base_model(mixture_amplitude.unsqueeze(dim=1)) # (batch_size, n_bins, n_frames, embed_dim)
+        latent = latent.view(batch_size, n_bins * n_frames, latent.size(-1))
+
+        cluster_ids = self.cluster(latent) # (batch_size, n_bins * n_frames)
+        cluster_ids = cluster_ids.view(batch_size, 1, n_bins, n_frames)
+        source_ids = torch.arange(n_sources, device=cluster_ids.device).view(1, n_sources, 1, 1)
+        mask = (cluster_ids == source_ids).to(mixture_amplitude.dtype) # (batch_size, n_sources, n_bins, n_frames)
+
+        estimated_spectrogram = mask.unsqueeze(dim=-1) * mixture_spectrogram.unsqueeze(dim=1) # (batch_size, n_sources, n_bins, n_frames, 2)
+        estimated_spectrogram = estimated_spectrogram.view(batch_size * n_sources, n_bins, n_frames, 2)
+        output = self.istft(estimated_spectrogram, T=T)
+        output = output.view(batch_size, n_sources, T)
+
+        return output
+
+    def cluster(self, latent):
+        """
+        Args:
+            latent <torch.Tensor>: (batch_size, num_samples, embed_dim)
+        Returns:
+            cluster_ids <torch.LongTensor>: (batch_size, num_samples)
+        """
+        n_sources = self.n_sources
+        eps = self.eps
+
+        embed_dim = latent.size(-1)
+
+        # Farthest point initialization, i.e. deterministic version of kmeans++
+        distance = torch.sum((latent - latent.mean(dim=1, keepdim=True))**2, dim=2) # (batch_size, num_samples)
+        centroids = []
+
+        for source_idx in range(n_sources):
+            centroid_ids = torch.argmax(distance, dim=1, keepdim=True) # (batch_size, 1)
+            centroid = torch.gather(latent, 1, centroid_ids.unsqueeze(dim=2).expand(-1, -1, embed_dim)) # (batch_size, 1, embed_dim)
+            centroids.append(centroid)
+
+            _distance = torch.sum((latent - centroid)**2, dim=2) # (batch_size, num_samples)
+
+            if source_idx == 0:
+                distance = _distance
+            else:
+                distance = torch.minimum(distance, _distance)
+
+        centroids = torch.cat(centroids, dim=1) # (batch_size, n_sources, embed_dim)
+        source_ids = torch.arange(n_sources, device=latent.device)
+
+        for idx in range(self.iter_clustering):
+            distance = torch.sum((latent.unsqueeze(dim=2) - centroids.unsqueeze(dim=1))**2, dim=3) # (batch_size, num_samples, n_sources)
+            cluster_ids = torch.argmin(distance, dim=2) # (batch_size, num_samples)
+            mask = (cluster_ids.unsqueeze(dim=2) == source_ids).to(latent.dtype) # (batch_size, num_samples, n_sources)
+            centroids = torch.bmm(mask.permute(0, 2, 1), latent) / (mask.sum(dim=1).unsqueeze(dim=2) + eps) # (batch_size, n_sources, embed_dim)
+
+        distance = torch.sum((latent.unsqueeze(dim=2) - centroids.unsqueeze(dim=1))**2, dim=3) # (batch_size, num_samples, n_sources)
+        cluster_ids = torch.argmin(distance, dim=2) # (batch_size, num_samples)
+
+        return cluster_ids
+
 class DeepEmbeddingPlus(nn.Module):
     def __init__(self, embedding_net, enhancement_net):
         super().__init__()
@@ -29,6 +29,39 @@ class DPRNN(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <list>: States of DPRNN blocks.
+        """
+        state = [
+            block.init_state(batch_size) for block in self.net
+        ]
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Args:
+            input (batch_size, num_features, S, chunk_size): Newly completed chunks.
+            state <list>: States returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, num_features, S, chunk_size)
+            state <list>: Updated states.
+        """
+        x = input
+        next_state = []
+
+        for block, _state in zip(self.net, state):
+            x, _state = block.forward_step(x, _state)
+            next_state.append(_state)
+
+        output = x
+
+        return output, next_state
+
 class DPRNNBlock(nn.Module):
     def __init__(self, num_features, hidden_channels, causal, norm=True, rnn_type='lstm', eps=EPS):
         super().__init__()
@@ -48,6 +81,31 @@ class DPRNNBlock(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: State of inter-chunk RNN. Intra-chunk RNN is stateless.
+        """
+        state = self.inter_chunk_block.init_state(batch_size)
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Args:
+            input (batch_size, num_features, S, chunk_size): Newly completed chunks.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, num_features, S, chunk_size)
+            state <dict>: Updated state.
+        """
+        x = self.intra_chunk_block.forward_step(input)
+        output, state = self.inter_chunk_block.forward_step(x, state)
+
+        return output, state
+
 class IntraChunkRNN(nn.Module):
     def __init__(self, num_features, hidden_channels, norm=True, rnn_type='lstm', eps=EPS):
         super().__init__()
@@ -77,7 +135,8 @@ class IntraChunkRNN(nn.Module):
         num_features = self.num_features
         batch_size, _, S, chunk_size = input.size()
 
-        self.rnn.flatten_parameters()
+        if isinstance(self.rnn, nn.RNNBase):
+            self.rnn.flatten_parameters()
 
         residual = input # (batch_size, num_features, S, chunk_size)
         x = input.permute(0, 2, 3, 1).contiguous() # -> (batch_size, S, chunk_size, num_features)
@@ -93,12 +152,41 @@ class IntraChunkRNN(nn.Module):
 
         return output
 
+    def forward_step(self, input):
+        """
+        Streaming version of `forward`. Normalization statistics are computed within each chunk, because they cannot depend on future chunks.
+        Args:
+            input (batch_size, num_features, S, chunk_size): Newly completed chunks.
+        Returns:
+            output (batch_size, num_features, S, chunk_size)
+        """
+        num_features = self.num_features
+        batch_size, _, S, chunk_size = input.size()
+
+        if isinstance(self.rnn, nn.RNNBase):
+            self.rnn.flatten_parameters()
+
+        residual = input # (batch_size, num_features, S, chunk_size)
+        x = input.permute(0, 2, 3, 1).contiguous() # -> (batch_size, S, chunk_size, num_features)
+        x = x.view(batch_size*S, chunk_size, num_features)
+        x, _ = self.rnn(x) # (batch_size*S, chunk_size, num_features) -> (batch_size*S, chunk_size, num_directions*hidden_channels)
+        x = self.fc(x) # -> (batch_size*S, chunk_size, num_features)
+        x = x.permute(0, 2, 1).contiguous() # -> (batch_size*S, num_features, chunk_size)
+        if self.norm:
+            x = self.norm1d(x) # (batch_size*S, num_features, chunk_size)
+        x = x.view(batch_size, S, num_features, chunk_size)
+        x = x.permute(0, 2, 1, 3) # -> (batch_size, num_features, S, chunk_size)
+        output = x + residual
+
+        return output
+
 class InterChunkRNN(nn.Module):
     def __init__(self, num_features, hidden_channels, causal, norm=True, rnn_type='lstm', eps=EPS):
         super().__init__()
 
         self.num_features, self.hidden_channels = num_features, hidden_channels
         self.norm = norm
+        self.causal = causal
 
         if rnn_type == 'lstm':
             self.rnn = choose_rnn(rnn_type, input_size=num_features, hidden_size=hidden_channels, batch_first=True, bidirectional=True)
@@ -129,7 +217,8 @@ class InterChunkRNN(nn.Module):
         num_features = self.num_features
         batch_size, _, S, chunk_size = input.size()
 
-        self.rnn.flatten_parameters()
+        if isinstance(self.rnn, nn.RNNBase):
+            self.rnn.flatten_parameters()
 
         residual = input # (batch_size, num_features, S, chunk_size)
         x = input.permute(0, 3, 2, 1).contiguous() # (batch_size, num_features, S, chunk_size) -> (batch_size, chunk_size, S, num_features)
@@ -147,6 +236,60 @@ class InterChunkRNN(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Hidden state of RNN and running statistics of normalization.
+        """
+        if not self.causal:
+            raise ValueError("Streaming inference is supported only when causal=True.")
+
+        state = {
+            'rnn': None # Initialized by RNN at first call.
+        }
+
+        if self.norm:
+            state['norm'] = self.norm1d.init_state(batch_size)
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Streaming version of `forward`. Hidden state of RNN is carried across chunks,
+        and cumulative normalization accumulates statistics in chunk order.
+        Args:
+            input (batch_size, num_features, S, chunk_size): Newly completed chunks.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, num_features, S, chunk_size)
+            state <dict>: Updated state.
+        """
+        num_features = self.num_features
+        batch_size, _, S, chunk_size = input.size()
+
+        if isinstance(self.rnn, nn.RNNBase):
+            self.rnn.flatten_parameters()
+
+        next_state = {}
+
+        residual = input # (batch_size, num_features, S, chunk_size)
+        x = input.permute(0, 3, 2, 1).contiguous() # (batch_size, num_features, S, chunk_size) -> (batch_size, chunk_size, S, num_features)
+        x = x.view(batch_size*chunk_size, S, num_features) # -> (batch_size*chunk_size, S, num_features)
+        x, next_state['rnn'] = self.rnn(x, state['rnn']) # -> (batch_size*chunk_size, S, hidden_channels)
+        x = self.fc(x) # -> (batch_size*chunk_size, S, num_features)
+        x = x.view(batch_size, chunk_size, S, num_features) # -> (batch_size, chunk_size, S, num_features)
+        x = x.permute(0, 3, 2, 1).contiguous() # -> (batch_size, num_features, S, chunk_size)
+        if self.norm:
+            x = x.view(batch_size, num_features, S*chunk_size)
+            x, next_state['norm'] = self.norm1d.forward_step(x, state['norm']) # -> (batch_size, num_features, S*chunk_size)
+            x = x.view(batch_size, num_features, S, chunk_size)
+
+        output = x + residual
+
+        return output, next_state
+
 if __name__ == '__main__':
     batch_size = 4
     num_features, chunk_size, S = 64, 10, 4
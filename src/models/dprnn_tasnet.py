@@ -4,8 +4,10 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from utils.model import quantize_dynamic, load_checkpoint, cached_pretrained
 from utils.filterbank import choose_filterbank
 from utils.tasnet import choose_layer_norm
+from models.filterbank import GatedEncoder
 from models.transform import Segment1d, OverlapAdd1d
 from models.dprnn import DPRNN
 
@@ -152,6 +154,142 @@ class DPRNNTasNet(nn.Module):
 
         return output, latent
 
+    def init_state(self, batch_size=1):
+        """
+        Initialize state for block-online inference. See `forward_step`.
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Streaming state.
+        """
+        n_sources = self.n_sources
+        n_basis = self.n_basis
+        kernel_size, stride = self.kernel_size, self.stride
+
+        if not self.causal:
+            raise ValueError("Streaming inference is supported only when causal=True.")
+
+        if isinstance(self.encoder, GatedEncoder):
+            raise ValueError("Streaming inference is not supported for {}.".format(type(self.encoder).__name__))
+
+        in_channels = self.in_channels
+        parameter = next(self.separator.parameters())
+        factory_kwargs = {
+            'device': parameter.device,
+            'dtype': parameter.dtype
+        }
+
+        state = {
+            'encoder': torch.zeros((batch_size, in_channels, 0), **factory_kwargs),
+            'latent': None, # Encoded frames waiting for masks.
+            'separator': self.separator.init_state(batch_size),
+            'decoder': torch.zeros((batch_size * n_sources, in_channels, kernel_size - stride), **factory_kwargs),
+            'n_samples_in': 0, 'n_samples_out': 0
+        }
+
+        return state
+
+    def forward_step(self, input, state, flush=False):
+        """
+        Block-online inference for causal DPRNN-TasNet.
+        Frames are emitted as soon as the chunks covering them are completed, so algorithmic latency is kernel_size + (sep_chunk_size - 1) * stride samples.
+        Hidden states of inter-chunk RNNs, overlap-add tails and unconsumed samples are carried by `state`, so memory does not grow with the length of stream.
+        When sep_norm=False, concatenated outputs are identical to `forward` if both (T - kernel_size) / stride and (n_frames - sep_chunk_size) / sep_hop_size are integers.
+        Otherwise, normalization in DPRNN blocks uses only past (or in-chunk) statistics, so outputs approximate `forward`.
+        Args:
+            input (batch_size, 1, T_block) or (batch_size, 1, n_mics, T_block): Block of input. T_block is arbitrary.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+            flush <bool>: If True, remaining samples are output. Set True at the last call.
+        Returns:
+            output (batch_size, n_sources, T_out) or (batch_size, n_sources, n_mics, T_out): Samples completed by this call.
+            state <dict>: Updated state.
+        """
+        n_sources = self.n_sources
+        n_basis = self.n_basis
+        kernel_size, stride = self.kernel_size, self.stride
+
+        n_dim = input.dim()
+
+        if n_dim == 3:
+            batch_size, C_in, T = input.size()
+            assert C_in == 1, "input.size() is expected (?, 1, ?), but given {}".format(input.size())
+        elif n_dim == 4:
+            batch_size, C_in, n_mics, T = input.size()
+            assert C_in == 1, "input.size() is expected (?, 1, ?, ?), but given {}".format(input.size())
+            input = input.view(batch_size, n_mics, T)
+        else:
+            raise ValueError("Not support {} dimension input".format(n_dim))
+
+        buffer = torch.cat([state['encoder'], input], dim=-1)
+        n_samples_in, n_samples_out = state['n_samples_in'] + T, state['n_samples_out']
+        latent = state['latent']
+        overlap = state['decoder']
+
+        if flush and buffer.size(-1) > kernel_size - stride:
+            # Pad right side to complete last frame.
+            padding = (stride - (buffer.size(-1) - kernel_size) % stride) % stride
+            buffer = F.pad(buffer, (0, padding))
+
+        if buffer.size(-1) >= kernel_size:
+            n_frames = (buffer.size(-1) - kernel_size) // stride + 1
+            w = self.encoder(buffer[..., :(n_frames - 1) * stride + kernel_size])
+            buffer = buffer[..., n_frames * stride:]
+            latent = w if latent is None else torch.cat([latent, w], dim=-1)
+
+            if torch.is_complex(w):
+                mask, separator_state = self.separator.forward_step(torch.abs(w), state['separator'], flush=flush)
+            else:
+                mask, separator_state = self.separator.forward_step(w, state['separator'], flush=flush)
+        elif flush:
+            w = buffer.new_zeros((batch_size, self.separator.num_features, 0))
+            mask, separator_state = self.separator.forward_step(w, state['separator'], flush=flush)
+        else:
+            mask, separator_state = None, state['separator']
+
+        n_frames = 0 if mask is None else mask.size(-1)
+
+        if n_frames > 0:
+            w, latent = latent[..., :n_frames], latent[..., n_frames:]
+
+            if torch.is_complex(w):
+                amplitude, phase = torch.abs(w), torch.angle(w)
+                amplitude, phase = amplitude.unsqueeze(dim=1), phase.unsqueeze(dim=1)
+                w_hat = amplitude * mask * torch.exp(1j * phase)
+            else:
+                w = w.unsqueeze(dim=1)
+                w_hat = w * mask
+
+            w_hat = w_hat.view(batch_size * n_sources, n_basis, n_frames)
+            x_hat = self.decoder(w_hat)
+            x_hat_overlap, x_hat_rest = torch.split(x_hat, [kernel_size - stride, n_frames * stride], dim=-1)
+            x_hat = torch.cat([overlap + x_hat_overlap, x_hat_rest], dim=-1)
+            x_hat, overlap = torch.split(x_hat, [n_frames * stride, kernel_size - stride], dim=-1)
+        else:
+            x_hat = overlap[..., :0]
+
+        if flush:
+            # Trim padded samples.
+            x_hat = torch.cat([x_hat, overlap], dim=-1)
+            x_hat = x_hat[..., :max(n_samples_in - n_samples_out, 0)]
+            overlap = torch.zeros_like(overlap)
+
+        n_samples_out = n_samples_out + x_hat.size(-1)
+
+        if n_dim == 3:
+            output = x_hat.view(batch_size, n_sources, -1)
+        else: # n_dim == 4
+            output = x_hat.view(batch_size, n_sources, n_mics, -1)
+
+        state = {
+            'encoder': buffer,
+            'latent': latent,
+            'separator': separator_state,
+            'decoder': overlap,
+            'n_samples_in': n_samples_in, 'n_samples_out': n_samples_out
+        }
+
+        return output, state
+
     def get_config(self):
         config = {
             'in_channels': self.in_channels,
@@ -180,8 +318,8 @@ class DPRNNTasNet(nn.Module):
         return config
 
     @classmethod
-    def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+    def build_model(cls, model_path, load_state_dict=False, quantized=False, weights_only=True):
+        config = load_checkpoint(model_path, weights_only=weights_only)
 
         in_channels = config.get('in_channels') or 1
         n_basis = config.get('n_bases') or config['n_basis']
@@ -217,13 +355,23 @@ class DPRNNTasNet(nn.Module):
             eps=eps
         )
 
+        if config.get('quantized'):
+            # int8 weights are saved in checkpoint.
+            model = quantize_dynamic(model, backend=config.get('backend'))
+
         if load_state_dict:
             model.load_state_dict(config['state_dict'])
 
+        if quantized and not config.get('quantized'):
+            if not load_state_dict:
+                raise ValueError("Set load_state_dict=True to quantize float model.")
+            model = quantize_dynamic(model)
+
         return model
 
     @classmethod
-    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
+    @cached_pretrained
+    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, quantized=False, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
         task = kwargs.get('task')
@@ -268,7 +416,7 @@ class DPRNNTasNet(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        model = cls.build_model(model_path, load_state_dict=load_state_dict)
+        model = cls.build_model(model_path, load_state_dict=load_state_dict, quantized=quantized)
 
         for key, value in additional_attributes.items():
             setattr(model, key, value)
@@ -350,6 +498,106 @@ class Separator(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Streaming state of separator.
+        """
+        chunk_size, hop_size = self.chunk_size, self.hop_size
+
+        assert hop_size <= chunk_size, "hop_size is expected to be equal to or smaller than chunk_size."
+
+        weight = self.bottleneck_conv1d.weight
+        bottleneck_channels = weight.size(0)
+        factory_kwargs = {
+            'device': weight.device,
+            'dtype': weight.dtype
+        }
+
+        state = {
+            'norm': self.norm1d.init_state(batch_size),
+            'segment': torch.zeros((batch_size, bottleneck_channels, 0), **factory_kwargs),
+            'dprnn': self.dprnn.init_state(batch_size),
+            'overlap_add': torch.zeros((batch_size, bottleneck_channels, chunk_size - hop_size), **factory_kwargs),
+            'n_frames_in': 0, 'n_frames_out': 0
+        }
+
+        return state
+
+    def forward_step(self, input, state, flush=False):
+        """
+        Block-online version of `forward`. Chunks are processed as soon as they are completed,
+        and the overlap-add tail of chunks is carried to next call.
+        Args:
+            input (batch_size, num_features, n_frames): Block of input. n_frames is arbitrary.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+            flush <bool>: If True, remaining frames are output.
+        Returns:
+            output (batch_size, n_sources, num_features, n_frames_out): Masks of completed frames.
+            state <dict>: Updated state.
+        """
+        num_features, n_sources = self.num_features, self.n_sources
+        chunk_size, hop_size = self.chunk_size, self.hop_size
+        batch_size, num_features, n_frames = input.size()
+
+        n_frames_in, n_frames_out = state['n_frames_in'] + n_frames, state['n_frames_out']
+        overlap = state['overlap_add']
+        dprnn_state = state['dprnn']
+        norm_state = state['norm']
+
+        if n_frames > 0:
+            x, norm_state = self.norm1d.forward_step(input, norm_state)
+            x = self.bottleneck_conv1d(x)
+            x = torch.cat([state['segment'], x], dim=-1)
+        else:
+            x = state['segment']
+
+        if flush and x.size(-1) > chunk_size - hop_size:
+            # Pad right side to complete last chunk.
+            padding = (hop_size - (x.size(-1) - chunk_size) % hop_size) % hop_size
+            x = F.pad(x, (0, padding))
+
+        if x.size(-1) >= chunk_size:
+            S = (x.size(-1) - chunk_size) // hop_size + 1
+            x, segment = x[..., :(S - 1) * hop_size + chunk_size], x[..., S * hop_size:]
+            x = self.segment1d(x)
+            x, dprnn_state = self.dprnn.forward_step(x, dprnn_state)
+            x = self.overlap_add1d(x)
+            x_overlap, x_rest = torch.split(x, [chunk_size - hop_size, S * hop_size], dim=-1)
+            x = torch.cat([overlap + x_overlap, x_rest], dim=-1)
+            x, overlap = torch.split(x, [S * hop_size, chunk_size - hop_size], dim=-1)
+        else:
+            segment = x
+            x = overlap[..., :0]
+
+        if flush:
+            # Trim padded frames.
+            x = torch.cat([x, overlap], dim=-1)
+            x = x[..., :max(n_frames_in - n_frames_out, 0)]
+            overlap = torch.zeros_like(overlap)
+
+        n_frames_out = n_frames_out + x.size(-1)
+
+        if x.size(-1) > 0:
+            x = self.prelu(x)
+            x = self.mask_conv1d(x)
+            x = self.mask_nonlinear(x)
+            output = x.view(batch_size, n_sources, num_features, -1)
+        else:
+            output = x.new_zeros((batch_size, n_sources, num_features, 0))
+
+        state = {
+            'norm': norm_state,
+            'segment': segment,
+            'dprnn': dprnn_state,
+            'overlap_add': overlap,
+            'n_frames_in': n_frames_in, 'n_frames_out': n_frames_out
+        }
+
+        return output, state
+
 def _test_separator():
     batch_size, T_bin = 2, 5
     N, F, H = 16, 16, 32 # H is the number of channels for each direction
@@ -517,6 +765,61 @@ def _test_dprnn_tasnet_paper():
     output = model(input)
     print(input.size(), output.size())
 
+def _test_dprnn_tasnet_streaming():
+    batch_size = 2
+    K, P = 6, 3
+
+    # Encoder & decoder
+    C = 1
+    L, stride, N = 8, 4, 16
+
+    # Separator
+    F = N
+    H = 32
+    B = 4
+    sep_norm = False # Streaming output is identical to offline output when sep_norm=False.
+
+    n_frames = K + 20 * P
+    T = L + (n_frames - 1) * stride
+    block_size = 32
+
+    input = torch.randn((batch_size, C, T), dtype=torch.float)
+
+    enc_basis, dec_basis = 'trainable', 'trainable'
+    enc_nonlinear = 'relu'
+
+    causal = True
+    mask_nonlinear = 'sigmoid'
+    n_sources = 2
+
+    model = DPRNNTasNet(
+        N, kernel_size=L, stride=stride, enc_basis=enc_basis, dec_basis=dec_basis, enc_nonlinear=enc_nonlinear,
+        sep_hidden_channels=H, sep_bottleneck_channels=F,
+        sep_chunk_size=K, sep_hop_size=P,
+        sep_num_blocks=B,
+        sep_norm=sep_norm, mask_nonlinear=mask_nonlinear,
+        causal=causal,
+        n_sources=n_sources
+    )
+    model.eval()
+
+    with torch.no_grad():
+        output = model(input)
+
+        state = model.init_state(batch_size)
+        output_streaming = []
+
+        for start_idx in range(0, T, block_size):
+            end_idx = min(start_idx + block_size, T)
+            flush = end_idx == T
+            _output, state = model.forward_step(input[..., start_idx:end_idx], state, flush=flush)
+            output_streaming.append(_output)
+
+        output_streaming = torch.cat(output_streaming, dim=-1)
+
+    print(input.size(), output.size(), output_streaming.size())
+    print("Max error: {}".format(torch.abs(output - output_streaming).max().item()))
+
 if __name__ == '__main__':
     print("="*10, "Separator", "="*10)
     _test_separator()
@@ -532,4 +835,8 @@ if __name__ == '__main__':
 
     print("="*10, "DPRNN-TasNet (same configuration in paper)", "="*10)
     _test_dprnn_tasnet_paper()
+    print()
+
+    print("="*10, "DPRNN-TasNet (streaming)", "="*10)
+    _test_dprnn_tasnet_streaming()
     print()
\ No newline at end of file
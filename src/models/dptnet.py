@@ -5,7 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.filterbank import choose_filterbank
-from utils.model import choose_rnn, choose_nonlinear
+from utils.model import choose_rnn, choose_nonlinear, load_checkpoint, cached_pretrained
 from utils.tasnet import choose_layer_norm
 from models.gtu import GTU1d
 from models.dprnn_tasnet import Segment1d, OverlapAdd1d
@@ -174,7 +174,7 @@ class DPTNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         n_basis = config.get('n_bases') or config['n_basis']
         kernel_size, stride = config['kernel_size'], config['stride']
@@ -217,6 +217,7 @@ class DPTNet(nn.Module):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
@@ -3,7 +3,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from utils.model import choose_nonlinear
+from utils.model import choose_nonlinear, load_checkpoint
 from models.resnet import ResidualBlock2d
 
 EPS = 1e-12
@@ -74,7 +74,7 @@ class HRNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels = config['in_channels']
         hidden_channels, bottleneck_channels = config['hidden_channels'], config['bottleneck_channels']
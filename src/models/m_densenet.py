@@ -7,8 +7,10 @@ from torch.nn.modules.utils import _pair
 
 from utils.audio import build_window
 from utils.m_densenet import choose_layer_norm, choose_nonlinear
+from utils.model import quantize_static, build_quantizable_state_dict, load_checkpoint
 from transforms.stft import stft, istft
-from models.glu import GLU2d
+from modules.conv import QuantizableConvTranspose2d
+from models.glu import GLU2d, QuantizableGLU2d
 
 """
 Reference: Multi-scale Multi-band DenseNets for Audio Source Separation
@@ -33,8 +35,8 @@ class ParallelMDenseNet(nn.Module):
 
         for key in sources:
             module = modules[key]
-            if not isinstance(module, MDenseNet):
-                raise ValueError("All modules must be MDenseNet.")
+            if not isinstance(module, (MDenseNet, QuantizableMDenseNet)):
+                raise ValueError("All modules must be MDenseNet or QuantizableMDenseNet.")
 
             if in_channels is None:
                 in_channels = module.in_channels
@@ -251,7 +253,7 @@ class MDenseNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, num_features = config['in_channels'], config['num_features']
         growth_rate = config['growth_rate']
@@ -820,6 +822,608 @@ class ConvBlock2d(nn.Module):
 """
     Quantization
 """
+class QuantizableMDenseNet(nn.Module):
+    """
+    Quantizable Multi-scale DenseNet
+    """
+    def __init__(
+        self,
+        in_channels, num_features,
+        growth_rate,
+        kernel_size,
+        max_bin=1367,
+        scale=(2,2),
+        dilated=False, norm=True, nonlinear='relu',
+        depth=None,
+        growth_rate_final=None,
+        kernel_size_final=None,
+        dilated_final=False,
+        norm_final=True, nonlinear_final='relu',
+        depth_final=None,
+        eps=EPS,
+        **kwargs
+    ):
+        super().__init__()
+
+        self.quant = torch.quantization.QuantStub()
+        self.affine_in = nn.Conv1d(max_bin, max_bin, kernel_size=1, groups=max_bin)
+        self.net = QuantizableMDenseNetBackbone(in_channels, num_features, growth_rate, kernel_size, scale=scale, dilated=dilated, norm=norm, nonlinear=nonlinear, depth=depth, eps=eps)
+
+        _in_channels = growth_rate[-1] # output channels of self.net
+        self.dense_block = QuantizableDenseBlock(_in_channels, growth_rate_final, kernel_size_final, dilated=dilated_final, depth=depth_final, norm=norm_final, nonlinear=nonlinear_final, eps=eps)
+        self.norm2d = choose_layer_norm('BN', growth_rate_final, n_dims=2, eps=eps) # nn.BatchNorm2d
+        self.glu2d = QuantizableGLU2d(growth_rate_final, in_channels, kernel_size=(1,1), stride=(1,1))
+        self.affine_out = nn.Conv1d(max_bin, max_bin, kernel_size=1, groups=max_bin)
+        self.relu2d = nn.ReLU()
+        self.dequant = torch.quantization.DeQuantStub()
+
+        self.max_bin = max_bin
+        self.in_channels, self.num_features = in_channels, num_features
+        self.growth_rate = growth_rate
+        self.kernel_size = kernel_size
+        self.scale = scale
+        self.dilated, self.norm, self.nonlinear = dilated, norm, nonlinear
+        self.depth = depth
+
+        self.growth_rate_final = growth_rate_final
+        self.kernel_size_final = kernel_size_final
+        self.dilated_final = dilated_final
+        self.depth_final = depth_final
+        self.norm_final, self.nonlinear_final = norm_final, nonlinear_final
+
+        self.eps = eps
+
+        self._reset_parameters()
+
+    def forward(self, input):
+        """
+        Args:
+            input (batch_size, in_channels, n_bins, n_frames)
+        Returns:
+            output (batch_size, in_channels, n_bins, n_frames)
+        """
+        max_bin = self.max_bin
+        n_bins = input.size(2)
+
+        if max_bin == n_bins:
+            x_valid, x_invalid = input, None
+        else:
+            sections = [max_bin, n_bins - max_bin]
+            x_valid, x_invalid = torch.split(input, sections, dim=2)
+
+        x = self.quant(x_valid)
+        x = self.transform_affine_in(x)
+        x = self.net(x)
+        x = self.dense_block(x)
+        x = self.norm2d(x)
+        x = self.glu2d(x)
+        x = self.transform_affine_out(x)
+        x = self.relu2d(x)
+        x = self.dequant(x)
+
+        _, _, _, n_frames = x.size()
+        _, _, _, n_frames_in = input.size()
+        padding_width = n_frames - n_frames_in
+        padding_left = padding_width // 2
+        padding_right = padding_width - padding_left
+
+        x = F.pad(x, (-padding_left, -padding_right))
+
+        if x_invalid is None:
+            output = x
+        else:
+            output = torch.cat([x, x_invalid], dim=2)
+
+        return output
+
+    def transform_affine_in(self, input):
+        """
+        Args:
+            input: (batch_size, n_channels, max_bin, n_frames)
+        Returns:
+            output: (batch_size, n_channels, max_bin, n_frames)
+        """
+        batch_size, n_channels, max_bin, n_frames = input.size()
+
+        x = input.reshape(batch_size * n_channels, max_bin, n_frames)
+        x = self.affine_in(x)
+        output = x.reshape(batch_size, n_channels, max_bin, n_frames)
+
+        return output
+
+    def transform_affine_out(self, input):
+        """
+        Args:
+            input: (batch_size, n_channels, max_bin, n_frames)
+        Returns:
+            output: (batch_size, n_channels, max_bin, n_frames)
+        """
+        batch_size, n_channels, max_bin, n_frames = input.size()
+
+        x = input.reshape(batch_size * n_channels, max_bin, n_frames)
+        x = self.affine_out(x)
+        output = x.reshape(batch_size, n_channels, max_bin, n_frames)
+
+        return output
+
+    def _reset_parameters(self):
+        self.affine_in.weight.data.fill_(1)
+        self.affine_in.bias.data.fill_(0)
+        self.affine_out.weight.data.fill_(1)
+        self.affine_out.bias.data.fill_(0)
+
+    def get_config(self):
+        config = {
+            'in_channels': self.in_channels, 'num_features': self.num_features,
+            'growth_rate': self.growth_rate,
+            'kernel_size': self.kernel_size,
+            'max_bin': self.max_bin,
+            'scale': self.scale,
+            'dilated': self.dilated, 'norm': self.norm, 'nonlinear': self.nonlinear,
+            'depth': self.depth,
+            'growth_rate_final': self.growth_rate_final,
+            'kernel_size_final': self.kernel_size_final,
+            'dilated_final': self.dilated_final,
+            'depth_final': self.depth_final,
+            'norm_final': self.norm_final, 'nonlinear_final': self.nonlinear_final,
+            'eps': self.eps
+        }
+
+        return config
+
+    @classmethod
+    def build_from_config(cls, config_path):
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
+
+        in_channels = config['in_channels']
+
+        max_bin = config['max_bin']
+        num_features = config['num_features']
+        growth_rate = config['growth_rate']
+        kernel_size = config['kernel_size']
+        scale = config['scale']
+        dilated = config['dilated']
+        norm = config['norm']
+        nonlinear = config['nonlinear']
+        depth = config['depth']
+
+        growth_rate_final = config['final']['growth_rate']
+        kernel_size_final = config['final']['kernel_size']
+        dilated_final = config['final']['dilated']
+        depth_final = config['final']['depth']
+        norm_final, nonlinear_final = config['final']['norm'], config['final']['nonlinear']
+
+        eps = config.get('eps') or EPS
+
+        model = cls(
+            in_channels, num_features,
+            growth_rate,
+            kernel_size,
+            max_bin=max_bin,
+            scale=scale,
+            dilated=dilated, norm=norm, nonlinear=nonlinear,
+            depth=depth,
+            growth_rate_final=growth_rate_final,
+            kernel_size_final=kernel_size_final,
+            dilated_final=dilated_final,
+            depth_final=depth_final,
+            norm_final=norm_final, nonlinear_final=nonlinear_final,
+            eps=eps
+        )
+
+        return model
+
+    @classmethod
+    def build_model(cls, model_path, load_state_dict=False):
+        config = load_checkpoint(model_path)
+
+        in_channels, num_features = config['in_channels'], config['num_features']
+        growth_rate = config['growth_rate']
+
+        kernel_size = config['kernel_size']
+        max_bin = config['max_bin']
+        scale = config['scale']
+
+        dilated, norm, nonlinear = config['dilated'], config['norm'], config['nonlinear']
+        depth = config['depth']
+
+        growth_rate_final = config['growth_rate_final']
+        kernel_size_final = config['kernel_size_final']
+        dilated_final = config['dilated_final']
+        depth_final = config['depth_final']
+        norm_final, nonlinear_final = config['norm_final'] or True, config['nonlinear_final']
+
+        eps = config.get('eps') or EPS
+
+        model = cls(
+            in_channels, num_features,
+            growth_rate,
+            kernel_size,
+            max_bin=max_bin,
+            scale=scale,
+            dilated=dilated, norm=norm, nonlinear=nonlinear,
+            depth=depth,
+            growth_rate_final=growth_rate_final,
+            kernel_size_final=kernel_size_final,
+            dilated_final=dilated_final,
+            depth_final=depth_final,
+            norm_final=norm_final, nonlinear_final=nonlinear_final,
+            eps=eps
+        )
+
+        if config.get('quantized', False):
+            # int8 checkpoint. Structure of converted model is required to load `state_dict`.
+            model = model.quantize(backend=config['backend'])
+
+        if load_state_dict:
+            model.load_state_dict(config['state_dict'])
+
+        return model
+
+    @classmethod
+    def build_from_float(cls, model):
+        """
+        Args:
+            model <MDenseNet>: Trained MDenseNet.
+        Returns:
+            quantizable_model <QuantizableMDenseNet>: QuantizableMDenseNet whose output is equivalent to `model`.
+        """
+        config = model.get_config()
+        eps = config['eps']
+
+        quantizable_model = cls(**config)
+        state_dict = build_quantizable_state_dict(model, eps=eps)
+
+        quantizable_model.load_state_dict(state_dict)
+
+        return quantizable_model
+
+    def quantize(self, calibration_data=None, backend='fbgemm'):
+        """
+        Static post training quantization. This model is not modified, and quantized copy is returned.
+        Args:
+            calibration_data <iterable<torch.Tensor>>: Inputs with shape of (batch_size, in_channels, n_bins, n_frames) for calibration. If None, observers are not calibrated, which is used to build structure of int8 model.
+            backend <str>: 'fbgemm' (x86) or 'qnnpack' (ARM).
+        Returns:
+            model <QuantizableMDenseNet>: Quantized model. Only CPU is supported.
+        """
+        model = quantize_static(self, calibration_data=calibration_data, backend=backend)
+
+        return model
+    
+    @property
+    def num_parameters(self):
+        _num_parameters = 0
+        
+        for p in self.parameters():
+            if p.requires_grad:
+                _num_parameters += p.numel()
+                
+        return _num_parameters
+
+class QuantizableMDenseNetBackbone(nn.Module):
+    def __init__(self, in_channels, num_features, growth_rate, kernel_size, scale=(2,2), dilated=False, norm=True, nonlinear='relu', depth=None, out_channels=None, eps=EPS):
+        """
+        Args:
+            in_channels <int>
+            num_features <int>
+            growth_rate <list<int>>: `len(growth_rate)` must be an odd number.
+            kernel_size <int> or <tuple<int>>
+            scale <int> or <list<int>>: Upsampling and Downsampling scale
+            dilated <list<bool>>
+            norm <list<bool>>
+            nonlinear <list<str>>
+        """
+        super().__init__()
+
+        assert len(growth_rate) % 2 == 1, "`len(growth_rate)` must be an odd number."
+
+        kernel_size = _pair(kernel_size)
+        num_encoder_blocks = len(growth_rate) // 2
+
+        # Network
+        self.conv2d = nn.Conv2d(in_channels, num_features, kernel_size, stride=(1, 1))
+
+        encoder, decoder = [], []
+        encoder = QuantizableEncoder(
+            num_features, growth_rate[:num_encoder_blocks], kernel_size=kernel_size, down_scale=scale,
+            dilated=dilated[:num_encoder_blocks], norm=norm[:num_encoder_blocks], nonlinear=nonlinear[:num_encoder_blocks], depth=depth[:num_encoder_blocks],
+            eps=eps
+        )
+
+        _in_channels, _growth_rate = growth_rate[num_encoder_blocks - 1], growth_rate[num_encoder_blocks]
+
+        bottleneck_dense_block = QuantizableDenseBlock(
+            _in_channels, _growth_rate,
+            kernel_size=kernel_size,
+            dilated=dilated[num_encoder_blocks], norm=norm[num_encoder_blocks], nonlinear=nonlinear[num_encoder_blocks], depth=depth[num_encoder_blocks]
+        )
+
+        _in_channels = _growth_rate
+        skip_channels = growth_rate[num_encoder_blocks - 1::-1]
+
+        decoder = QuantizableDecoder(
+            _in_channels, skip_channels, growth_rate[num_encoder_blocks+1:], kernel_size=kernel_size, up_scale=scale,
+            dilated=dilated[num_encoder_blocks+1:], depth=depth[num_encoder_blocks+1:], norm=norm[num_encoder_blocks+1:], nonlinear=nonlinear[num_encoder_blocks+1:],
+            eps=eps
+        )
+
+        self.encoder = encoder
+        self.bottleneck_conv2d = bottleneck_dense_block
+        self.decoder = decoder
+
+        if out_channels is not None:
+            _in_channels = growth_rate[-1]
+
+            net = []
+            norm2d = choose_layer_norm('BN', _in_channels, n_dims=2, eps=eps) # nn.BatchNorm2d
+            net.append(norm2d)
+            net.append(nn.Conv2d(_in_channels, out_channels, kernel_size=(1,1), stride=(1,1)))
+
+            self.pointwise_conv2d = nn.Sequential(*net)
+        else:
+            self.pointwise_conv2d = None
+
+        self.kernel_size = kernel_size
+        self.out_channels = out_channels
+
+    def forward(self, input):
+        Kh, Kw = self.kernel_size
+        Ph, Pw = Kh - 1, Kw - 1
+        padding_top = Ph // 2
+        padding_bottom = Ph - padding_top
+        padding_left = Pw // 2
+        padding_right = Pw - padding_left
+
+        input = F.pad(input, (padding_left, padding_right, padding_top, padding_bottom))
+
+        x = self.conv2d(input)
+        x, skip = self.encoder(x)
+        x = self.bottleneck_conv2d(x)
+        x = self.decoder(x, skip[::-1])
+
+        if self.pointwise_conv2d:
+            output = self.pointwise_conv2d(x)
+        else:
+            output = x
+
+        return output
+
+class QuantizableEncoder(nn.Module):
+    def __init__(self, in_channels, growth_rate, kernel_size, down_scale=(2,2), dilated=False, norm=True, nonlinear='relu', depth=None, eps=EPS):
+        """
+        Args:
+            in_channels <int>: 
+            growth_rate <list<int>>:
+            kernel_size <tuple<int>> or <int>:
+            dilated <list<bool>> or <bool>:
+            norm <list<bool>> or <bool>:
+            nonlinear <list<str>> or <str>:
+            depth <list<int>> or <int>:
+        """
+        super().__init__()
+
+        if type(growth_rate) is list:
+            num_dense_blocks = len(growth_rate)
+        else:
+            # TODO: implement
+            raise ValueError("`growth_rate` must be list.")
+
+        if type(dilated) is bool:
+            dilated = [dilated] * num_dense_blocks
+        elif type(dilated) is list:
+            assert num_dense_blocks == len(dilated), "Invalid length of `dilated`"
+        else:
+            raise ValueError("Invalid type of `dilated`.")
+
+        if type(norm) is bool:
+            norm = [norm] * num_dense_blocks
+        elif type(norm) is list:
+            assert num_dense_blocks == len(norm), "Invalid length of `norm`"
+        else:
+            raise ValueError("Invalid type of `norm`.")
+
+        if type(nonlinear) is str:
+            nonlinear = [nonlinear] * num_dense_blocks
+        elif type(nonlinear) is list:
+            assert num_dense_blocks == len(nonlinear), "Invalid length of `nonlinear`"
+        else:
+            raise ValueError("Invalid type of `nonlinear`.")
+
+        if depth is None:
+            depth = [None] * num_dense_blocks
+        elif type(depth) is int:
+            depth = [depth] * num_dense_blocks
+        elif type(depth) is list:
+            assert num_dense_blocks == len(depth), "Invalid length of `depth`"
+        else:
+            raise ValueError("Invalid type of `depth`.")
+
+        num_dense_blocks = len(growth_rate)
+        net = []
+
+        _in_channels = in_channels
+
+        for idx in range(num_dense_blocks):
+            downsample_block = QuantizableDownSampleDenseBlock(_in_channels, growth_rate[idx], kernel_size=kernel_size, down_scale=down_scale, dilated=dilated[idx], norm=norm[idx], nonlinear=nonlinear[idx], depth=depth[idx], eps=eps)
+            net.append(downsample_block)
+            _in_channels = growth_rate[idx]
+
+        self.net = nn.Sequential(*net)
+
+        self.num_dense_blocks = num_dense_blocks
+
+    def forward(self, input):
+        num_dense_blocks = self.num_dense_blocks
+
+        x = input
+        skip = []
+
+        for idx in range(num_dense_blocks):
+            x, x_skip = self.net[idx](x)
+            skip.append(x_skip)
+
+        output = x
+
+        return output, skip
+
+class QuantizableDecoder(nn.Module):
+    def __init__(self, in_channels, skip_channels, growth_rate, kernel_size, up_scale=(2,2), dilated=False, norm=True, nonlinear='relu', depth=None, eps=EPS):
+        """
+        Args:
+            in_channels <int>: 
+            skip_channels <list<int>>:
+            growth_rate <list<int>>:
+            kernel_size <tuple<int>> or <int>:
+            dilated <list<bool>> or <bool>:
+            norm <list<bool>> or <bool>:
+            nonlinear <list<str>> or <str>:
+            depth <list<int>> or <int>:
+        """
+        super().__init__()
+
+        if type(growth_rate) is list:
+            num_dense_blocks = len(growth_rate)
+        else:
+            # TODO: implement
+            raise ValueError("`growth_rate` must be list.")
+
+        if type(dilated) is bool:
+            dilated = [dilated] * num_dense_blocks
+        elif type(dilated) is list:
+            assert num_dense_blocks == len(dilated), "Invalid length of `dilated`"
+        else:
+            raise ValueError("Invalid type of `dilated`.")
+
+        if type(norm) is bool:
+            norm = [norm] * num_dense_blocks
+        elif type(norm) is list:
+            assert num_dense_blocks == len(norm), "Invalid length of `norm`"
+        else:
+            raise ValueError("Invalid type of `norm`.")
+
+        if type(nonlinear) is str:
+            nonlinear = [nonlinear] * num_dense_blocks
+        elif type(nonlinear) is list:
+            assert num_dense_blocks == len(nonlinear), "Invalid length of `nonlinear`"
+        else:
+            raise ValueError("Invalid type of `nonlinear`.")
+
+        if depth is None:
+            depth = [None] * num_dense_blocks
+        elif type(depth) is int:
+            depth = [depth] * num_dense_blocks
+        elif type(depth) is list:
+            assert num_dense_blocks == len(depth), "Invalid length of `depth`"
+        else:
+            raise ValueError("Invalid type of `depth`.")
+
+        num_dense_blocks = len(growth_rate)
+        net = []
+
+        _in_channels = in_channels
+
+        for idx in range(num_dense_blocks):
+            upsample_block = QuantizableUpSampleDenseBlock(_in_channels, skip_channels[idx], growth_rate[idx], kernel_size=kernel_size, up_scale=up_scale, dilated=dilated[idx], norm=norm[idx], nonlinear=nonlinear[idx], depth=depth[idx], eps=eps)
+            net.append(upsample_block)
+            _in_channels = growth_rate[idx]
+
+        self.net = nn.Sequential(*net)
+
+        self.num_dense_blocks = num_dense_blocks
+
+    def forward(self, input, skip):
+        num_dense_blocks = self.num_dense_blocks
+
+        x = input
+
+        for idx in range(num_dense_blocks):
+            x_skip = skip[idx]
+            x = self.net[idx](x, x_skip)
+
+        output = x
+
+        return output
+
+class QuantizableDownSampleDenseBlock(nn.Module):
+    """
+    DenseBlock + down sample
+    """
+    def __init__(self, in_channels, growth_rate, kernel_size=(3,3), down_scale=(2,2), dilated=False, norm=True, nonlinear='relu', depth=None, eps=EPS):
+        super().__init__()
+
+        self.down_scale = _pair(down_scale)
+
+        self.dense_block = QuantizableDenseBlock(in_channels, growth_rate, kernel_size, dilated=dilated, norm=norm, nonlinear=nonlinear, depth=depth, eps=eps)
+        self.downsample2d = nn.AvgPool2d(kernel_size=self.down_scale, stride=self.down_scale)
+        self.out_channels = self.dense_block.out_channels
+
+    def forward(self, input):
+        """
+        Args:
+            input (batch_size, in_channels, H, W)
+        Returns:
+            output:
+                (batch_size, growth_rate[-1], H_down, W_down) if type(growth_rate) is list<int>
+                or (batch_size, growth_rate, H_down, W_down) if type(growth_rate) is int
+                where H_down = H // down_scale[0] and W_down = W // down_scale[1]
+            skip:
+                (batch_size, growth_rate[-1], H, W) if type(growth_rate) is list<int>
+                or (batch_size, growth_rate, H, W) if type(growth_rate) is int
+        """
+        _, _, n_bins, n_frames = input.size()
+
+        Kh, Kw = self.down_scale
+        Ph, Pw = (Kh - n_bins % Kh) % Kh, (Kw - n_frames % Kw) % Kw
+        padding_top = Ph // 2
+        padding_bottom = Ph - padding_top
+        padding_left = Pw // 2
+        padding_right = Pw - padding_left
+
+        input = F.pad(input, (padding_left, padding_right, padding_top, padding_bottom))
+
+        x = self.dense_block(input)
+        skip = x
+        skip = F.pad(skip, (-padding_left, -padding_right, -padding_top, -padding_bottom))
+
+        output = self.downsample2d(x)
+
+        return output, skip
+
+class QuantizableUpSampleDenseBlock(nn.Module):
+    """
+    DenseBlock + up sample
+    """
+    def __init__(self, in_channels, skip_channels, growth_rate, kernel_size=(2,2), up_scale=(2,2), dilated=False, norm=True, nonlinear='relu', depth=None, eps=EPS):
+        super().__init__()
+
+        self.norm2d = choose_layer_norm('BN', in_channels, n_dims=2, eps=eps) # nn.BatchNorm2d
+        self.upsample2d = QuantizableConvTranspose2d(in_channels, in_channels, kernel_size=up_scale, stride=up_scale)
+        self.dense_block = QuantizableDenseBlock(in_channels + skip_channels, growth_rate, kernel_size, dilated=dilated, norm=norm, nonlinear=nonlinear, depth=depth, eps=eps)
+        self.float_ops = nnq.FloatFunctional()
+        self.out_channels = self.dense_block.out_channels
+
+    def forward(self, input, skip):
+        x = self.norm2d(input)
+        x = self.upsample2d(x)
+
+        _, _, H, W = x.size()
+        _, _, H_skip, W_skip = skip.size()
+        padding_height = H - H_skip
+        padding_width = W - W_skip
+        padding_top = padding_height // 2
+        padding_bottom = padding_height - padding_top
+        padding_left = padding_width // 2
+        padding_right = padding_width - padding_left
+
+        x = F.pad(x, (-padding_left, -padding_right, -padding_top, -padding_bottom))
+        x = self.float_ops.cat([x, skip], dim=1)
+
+        output = self.dense_block(x)
+
+        return output
+
 class QuantizableDenseBlock(nn.Module):
     def __init__(self, in_channels, growth_rate, kernel_size, depth=None, dilated=False, norm=True, nonlinear='relu', eps=EPS):
         """
@@ -916,13 +1520,14 @@ class QuantizableDenseBlock(nn.Module):
                 _in_channels = growth_rate[idx - 1]
                 sections = [_in_channels, sum(growth_rate[idx:])]
                 x, x_residual = torch.split(x_residual, sections, dim=1)
+                x_residual = x_residual.contiguous(memory_format=torch.channels_last) # quantized add is much slower for non-contiguous input
 
             x = self.net[idx](x)
 
             if x_residual is None:
                 x_residual = x
             else:
-                x_residual = self.float_ops.f_add(x_residual, x)
+                x_residual = self.float_ops.add(x_residual, x)
 
         output = x_residual
 
@@ -951,7 +1556,21 @@ class QuantizableConvBlock2d(nn.Module):
         if self.nonlinear is not None:
             self.nonlinear2d = choose_nonlinear(self.nonlinear)
 
-        self.conv2d = nn.Conv2d(in_channels, out_channels, kernel_size=kernel_size, stride=stride, dilation=dilation)
+        Kh, Kw = self.kernel_size
+        Dh, Dw = self.dilation
+
+        padding_height = (Kh - 1) * Dh
+        padding_width = (Kw - 1) * Dw
+
+        # If padding is symmetric, it is fused into convolution, because padding of quantized tensor is slow.
+        self.fused_padding = padding_height % 2 == 0 and padding_width % 2 == 0
+
+        if self.fused_padding:
+            padding = (padding_height // 2, padding_width // 2)
+        else:
+            padding = 0
+
+        self.conv2d = nn.Conv2d(in_channels, out_channels, kernel_size=kernel_size, stride=stride, padding=padding, dilation=dilation)
 
     def forward(self, input):
         """
@@ -978,7 +1597,9 @@ class QuantizableConvBlock2d(nn.Module):
         if self.nonlinear:
             x = self.nonlinear2d(x)
 
-        x = F.pad(x, (padding_left, padding_right, padding_up, padding_bottom))
+        if not self.fused_padding:
+            x = F.pad(x, (padding_left, padding_right, padding_up, padding_bottom))
+
         output = self.conv2d(x)
 
         return output
@@ -1,9 +1,12 @@
+import time
 import warnings
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from utils.model import load_checkpoint
+
 EPS = 1e-12
 
 class MetaTasNet(nn.Module):
@@ -114,6 +117,45 @@ class MetaTasNet(nn.Module):
             latents.append(latent)
 
         return outputs, latents
+
+    def forward_stages(self, input, state=None, masking=True, max_stage=None):
+        """
+        Incremental version of `forward`. Outputs and latent of computed stages are kept in `state`,
+        so calling with larger `max_stage` later runs only the remaining stages.
+        Args:
+            input <list<torch.Tensor>>: input[idx] is (batch_size, 1, T_idx), where T_idx is length at sample rate of idx-th stage.
+            state <dict>: State returned by previous call. If None, computation starts from the first stage.
+            masking <bool>: Apply mask or not
+            max_stage <int>: Number of stages to be computed. If None, all stages given by `input` are computed.
+        Returns:
+            outputs <list<torch.Tensor>>: outputs[idx] is (batch_size, n_sources, T_idx) for idx < max_stage.
+            state <dict>: Updated state.
+        """
+        if max_stage is None:
+            max_stage = len(input)
+
+        if state is None:
+            state = {
+                'outputs': [],
+                'latent': None,
+                'masking': masking
+            }
+        else:
+            assert state['masking'] == masking, "`masking` is different from the one used in previous call."
+
+        outputs, latent = list(state['outputs']), state['latent']
+
+        for idx in range(len(outputs), max_stage):
+            output, latent = self.net[idx].extract_latent(input[idx], latent=latent, masking=masking)
+            outputs.append(output)
+
+        state = {
+            'outputs': outputs,
+            'latent': latent,
+            'masking': masking
+        }
+
+        return outputs[:max_stage], state
     
     def forward_separators(self, input, max_stage=None):
         """
@@ -195,7 +237,7 @@ class MetaTasNet(nn.Module):
     
     @classmethod
     def build_model(cls, model_path):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         n_bases = config['n_bases']
         kernel_size, stride = config['kernel_size'], config['stride']
@@ -245,6 +287,134 @@ class MetaTasNet(nn.Module):
                 
         return _num_parameters
 
+class MetaTasNetEarlyExitWrapper(nn.Module):
+    """
+    Latency-tiered inference of MetaTasNet.
+    Number of stages is chosen per request from latency budget or deadline, based on latency recorded by `profile`.
+    Preview by early stages can be refined later by passing returned state, where computation of early stages is reused.
+    """
+    def __init__(self, base_model, min_stage=1):
+        super().__init__()
+
+        self.base_model = base_model
+        self.num_stages = base_model.num_stages
+        self.min_stage = min_stage
+
+        # Recorded time [sec] of each stage per sample of input of the first stage.
+        self.latency = [None] * self.num_stages
+        # Recorded SDR [dB] of each stage if reference is given to `profile`.
+        self.quality = [None] * self.num_stages
+
+    def forward(self, input, latency_budget=None, deadline=None, state=None, max_stage=None):
+        """
+        Args:
+            input <list<torch.Tensor>>: input[idx] is (batch_size, 1, T_idx)
+            latency_budget <float>: Time [sec] allowed for this call.
+            deadline <float>: Time given by time.perf_counter(), by which this call should finish. Used if `latency_budget` is None.
+            state <dict>: State returned by previous call. Stages computed in previous call are reused.
+            max_stage <int>: If given, `latency_budget` and `deadline` are ignored.
+        Returns:
+            outputs <list<torch.Tensor>>: outputs[idx] is (batch_size, n_sources, T_idx).
+            state <dict>: State to refine outputs later.
+        """
+        if max_stage is None:
+            if latency_budget is None and deadline is not None:
+                latency_budget = deadline - time.perf_counter()
+
+            done_stage = 0 if state is None else len(state['outputs'])
+            max_stage = self.choose_max_stage(input, latency_budget=latency_budget, done_stage=done_stage)
+
+        outputs, state = self.base_model.forward_stages(input, state=state, max_stage=max_stage)
+
+        return outputs, state
+
+    def choose_max_stage(self, input, latency_budget=None, done_stage=0):
+        """
+        Args:
+            input <list<torch.Tensor>>: input[idx] is (batch_size, 1, T_idx)
+            latency_budget <float>: Time [sec] allowed. If None, all stages are used.
+            done_stage <int>: Number of stages which have already been computed.
+        Returns:
+            max_stage <int>: Largest number of stages expected to finish within `latency_budget`. At least `min_stage`.
+        """
+        num_stages = min(self.num_stages, len(input))
+
+        if latency_budget is None:
+            return num_stages
+
+        if None in self.latency[:num_stages]:
+            raise RuntimeError("Latency is not recorded. Call `profile` in advance.")
+
+        batch_size, _, T = input[0].size()
+        elapsed = 0
+        max_stage = done_stage
+
+        for idx in range(done_stage, num_stages):
+            elapsed += self.latency[idx] * batch_size * T
+
+            if elapsed > latency_budget:
+                break
+
+            max_stage = idx + 1
+
+        max_stage = max(max_stage, self.min_stage)
+
+        return max_stage
+
+    def profile(self, input, target=None, n_runs=1):
+        """
+        Record latency (and quality if `target` is given) of each stage.
+        Args:
+            input <list<torch.Tensor>>: input[idx] is (batch_size, 1, T_idx)
+            target <list<torch.Tensor>>: target[idx] is (batch_size, n_sources, T_idx)
+            n_runs <int>: Number of runs to average latency.
+        Returns:
+            latency <list<float>>: Time [sec] of each stage for `input`.
+            quality <list<float>>: SDR [dB] of each stage. None if `target` is not given.
+        """
+        from criterion.sdr import sdr
+
+        num_stages = min(self.num_stages, len(input))
+        batch_size, _, T = input[0].size()
+        latency = [0] * num_stages
+
+        with torch.no_grad():
+            for _ in range(n_runs):
+                state = None
+
+                for idx in range(num_stages):
+                    start = time.perf_counter()
+                    outputs, state = self.base_model.forward_stages(input, state=state, max_stage=idx + 1)
+                    latency[idx] += (time.perf_counter() - start) / n_runs
+
+        quality = [None] * num_stages
+
+        for idx in range(num_stages):
+            self.latency[idx] = latency[idx] / (batch_size * T)
+
+            if target is not None:
+                T_idx = min(outputs[idx].size(-1), target[idx].size(-1))
+                quality[idx] = sdr(outputs[idx][..., :T_idx], target[idx][..., :T_idx]).mean().item()
+                self.quality[idx] = quality[idx]
+
+        return latency, quality
+
+    def tradeoff(self):
+        """
+        Returns:
+            tradeoff <list<dict>>: Recorded latency [sec per sample] and quality [dB] of each stage.
+        """
+        tradeoff = []
+
+        for idx in range(self.num_stages):
+            tradeoff.append({
+                'stage': idx + 1,
+                'latency': self.latency[idx],
+                'quality': self.quality[idx]
+            })
+
+        return tradeoff
+
 class MetaTasNetBackbone(nn.Module):
     def __init__(self,
         n_bases, kernel_size, stride=None,
@@ -1347,6 +1517,53 @@ def _test_meta_tasnet():
     for _input, _output in zip(input, output):
         print(_input.size(), _output.size())
 
+def _test_meta_tasnet_early_exit():
+    batch_size = 2
+    T = 2**13
+    n_sources = 4
+    D_l, B_l = 6, 5
+
+    B, H, Sc = 8, 10, 12
+    P = 3
+    R, X = 2, 4
+
+    sample_rate = [8000, 16000, 32000]
+    input, target = [], []
+
+    for idx in range(len(sample_rate)):
+        _target = torch.randn(batch_size, n_sources, T * 2**idx)
+        target.append(_target)
+        input.append(_target.sum(dim=1, keepdim=True))
+
+    num_stages = len(sample_rate)
+    K, S = 20, 6
+    F, M = 3, 256
+    N = 32
+    fft_size, hop_size = 1024 * (sample_rate[0]//8000), 256 * (sample_rate[0]//8000)
+
+    model = MetaTasNet(
+        N, K, stride=S,
+        enc_fft_size=fft_size, enc_hop_size=hop_size, num_filters=F, n_mels=M,
+        sep_hidden_channels=H, sep_bottleneck_channels=B, sep_skip_channels=Sc, sep_kernel_size=P, sep_num_blocks=X, sep_num_layers=R,
+        conv_name='generated', norm_name='generated',
+        num_stages=num_stages, n_sources=n_sources,
+        embed_dim=D_l, embed_bottleneck_channels=B_l
+    )
+    model.eval()
+
+    model = MetaTasNetEarlyExitWrapper(model)
+    latency, quality = model.profile(input, target=target)
+    print(model.tradeoff())
+
+    with torch.no_grad():
+        preview, state = model(input, latency_budget=latency[0])
+        output, state = model(input, state=state)
+
+    print(len(preview), len(output))
+
+    for _input, _output in zip(input, output):
+        print(_input.size(), _output.size())
+
 if __name__ == '__main__':
     import torchaudio
 
@@ -1369,4 +1586,8 @@ if __name__ == '__main__':
     print()
 
     print('='*10, "MetaTasNet", '='*10)
-    _test_meta_tasnet()
\ No newline at end of file
+    _test_meta_tasnet()
+    print()
+
+    print('='*10, "MetaTasNet (early exit)", '='*10)
+    _test_meta_tasnet_early_exit()
\ No newline at end of file
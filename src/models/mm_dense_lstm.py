@@ -5,7 +5,9 @@ import torch
 import torch.nn as nn
 
 from utils.audio import build_window
-from algorithm.frequency_mask import multichannel_wiener_filter
+from utils.model import load_checkpoint, cached_pretrained
+from algorithm.frequency_mask import multichannel_wiener_filter, multichannel_wiener_filter_real
+from algorithm.stft import BatchSTFT, BatchInvSTFT
 from transforms.stft import stft, istft
 from models.mm_dense_rnn import MMDenseRNN
 
@@ -73,6 +75,7 @@ class ParallelMMDenseLSTM(nn.Module):
         return output
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):        
         from utils.utils import download_pretrained_model_from_google_drive
 
@@ -109,7 +112,7 @@ class ParallelMMDenseLSTM(nn.Module):
             if not os.path.exists(model_path):
                 download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-            config = torch.load(model_path, map_location=lambda storage, loc: storage)
+            config = load_checkpoint(model_path)
             modules[target] = MMDenseLSTM.build_model(model_path, load_state_dict=load_state_dict)
 
             if task in ['musdb18', 'musdb18hq']:
@@ -201,6 +204,50 @@ class ParallelMMDenseLSTMTimeDomainWrapper(nn.Module):
     def sources(self):
         return list(self.base_model.sources)
 
+class ExportableParallelMMDenseLSTMTimeDomainWrapper(ParallelMMDenseLSTMTimeDomainWrapper):
+    """
+    Exportable version of ParallelMMDenseLSTMTimeDomainWrapper.
+    STFT and iSTFT are computed by convolution, and multichannel Wiener filter is computed by real arithmetic.
+    The whole waveform-in, waveform-out graph can be exported by torch.jit.trace or torch.onnx.export.
+    """
+    def __init__(self, base_model: ParallelMMDenseLSTM, n_fft, hop_length=None, window_fn='hann', iteration=1, eps=EPS):
+        super().__init__(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
+
+        self.iteration = iteration
+
+        self.stft = BatchSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+        self.istft = BatchInvSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (batch_size, 1, in_channels, T)
+        Returns:
+            output <torch.Tensor>: (batch_size, n_sources, in_channels, T)
+        """
+        batch_size, _, in_channels, T = input.size()
+
+        mixture_spectrogram = self.stft(input.reshape(batch_size * in_channels, T)) # (batch_size * in_channels, n_bins, n_frames, 2)
+        _, n_bins, n_frames, _ = mixture_spectrogram.size()
+        mixture_spectrogram = mixture_spectrogram.view(batch_size, in_channels, n_bins, n_frames, 2)
+        mixture_amplitude = torch.sqrt(torch.sum(mixture_spectrogram**2, dim=-1)) # (batch_size, in_channels, n_bins, n_frames)
+
+        estimated_amplitude = []
+
+        for target in self.sources:
+            _estimated_amplitude = self.base_model(mixture_amplitude, target=target)
+            estimated_amplitude.append(_estimated_amplitude)
+
+        estimated_amplitude = torch.stack(estimated_amplitude, dim=1) # (batch_size, n_sources, in_channels, n_bins, n_frames)
+        estimated_spectrogram = multichannel_wiener_filter_real(mixture_spectrogram, estimated_sources_amplitude=estimated_amplitude, iteration=self.iteration, eps=self.eps)
+
+        n_sources = estimated_spectrogram.size(1)
+        estimated_spectrogram = estimated_spectrogram.view(batch_size * n_sources * in_channels, n_bins, n_frames, 2)
+        output = self.istft(estimated_spectrogram, T=T)
+        output = output.view(batch_size, n_sources, in_channels, T)
+
+        return output
+
 class MMDenseLSTM(MMDenseRNN):
     pretrained_model_ids = {
         "musdb18": {
@@ -340,7 +387,7 @@ class MMDenseLSTM(MMDenseRNN):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, num_features = config['in_channels'], config['num_features']
         hidden_channels = config['hidden_channels']
@@ -389,6 +436,7 @@ class MMDenseLSTM(MMDenseRNN):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", target='vocals', quiet=False, load_state_dict=True, **kwargs):
         import os
 
@@ -425,7 +473,7 @@ class MMDenseLSTM(MMDenseRNN):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
         model = cls.build_model(model_path, load_state_dict=load_state_dict)
 
         if task in ['musdb18', 'musdb18hq']:
@@ -477,6 +525,43 @@ class MMDenseLSTMTimeDomainWrapper(nn.Module):
 
         return output
 
+class ExportableMMDenseLSTMTimeDomainWrapper(MMDenseLSTMTimeDomainWrapper):
+    """
+    Exportable version of MMDenseLSTMTimeDomainWrapper.
+    STFT and iSTFT are computed by convolution without complex tensors.
+    The whole waveform-in, waveform-out graph can be exported by torch.jit.trace or torch.onnx.export.
+    """
+    def __init__(self, base_model: nn.Module, n_fft, hop_length=None, window_fn='hann', eps=EPS):
+        super().__init__(base_model, n_fft, hop_length=hop_length, window_fn=window_fn)
+
+        self.eps = eps
+
+        self.stft = BatchSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+        self.istft = BatchInvSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (batch_size, in_channels, T)
+        Returns:
+            output <torch.Tensor>: (batch_size, in_channels, T)
+        """
+        batch_size, in_channels, T = input.size()
+
+        mixture_spectrogram = self.stft(input.reshape(batch_size * in_channels, T)) # (batch_size * in_channels, n_bins, n_frames, 2)
+        _, n_bins, n_frames, _ = mixture_spectrogram.size()
+        mixture_spectrogram = mixture_spectrogram.view(batch_size, in_channels, n_bins, n_frames, 2)
+        mixture_amplitude = torch.sqrt(torch.sum(mixture_spectrogram**2, dim=-1)) # (batch_size, in_channels, n_bins, n_frames)
+
+        estimated_amplitude = self.base_model(mixture_amplitude)
+        estimated_spectrogram = estimated_amplitude.unsqueeze(dim=-1) * mixture_spectrogram / (mixture_amplitude.unsqueeze(dim=-1) + self.eps) # Use phase of mixture
+
+        estimated_spectrogram = estimated_spectrogram.view(batch_size * in_channels, n_bins, n_frames, 2)
+        output = self.istft(estimated_spectrogram, T=T)
+        output = output.view(batch_size, in_channels, T)
+
+        return output
+
 def _test_mm_dense_lstm():
     config_path = "./data/mm_dense_lstm/parallel.yaml"
     batch_size, in_channels, n_bins, n_frames = 4, 2, 1025, 256
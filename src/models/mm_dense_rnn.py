@@ -6,6 +6,7 @@ import torch.nn.functional as F
 from utils.audio import build_window
 from utils.m_densenet import choose_layer_norm
 from utils.dense_rnn import choose_dense_rnn_block
+from utils.model import load_checkpoint
 from algorithm.frequency_mask import multichannel_wiener_filter
 from transforms.stft import stft, istft
 from models.transform import BandSplit
@@ -421,7 +422,7 @@ class MMDenseRNN(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, num_features = config['in_channels'], config['num_features']
         hidden_channels = config['hidden_channels']
@@ -5,6 +5,7 @@ import torch.nn.functional as F
 
 from utils.audio import build_window
 from utils.m_densenet import choose_layer_norm
+from utils.model import load_checkpoint
 from algorithm.frequency_mask import multichannel_wiener_filter
 from transforms.stft import stft, istft
 from models.transform import BandSplit
@@ -376,7 +377,7 @@ class MMDenseNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, num_features = config['in_channels'], config['num_features']
         growth_rate = config['growth_rate']
@@ -4,7 +4,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.audio import build_window
-from utils.model import choose_rnn
+from utils.model import choose_rnn, load_checkpoint
 from models.umx import TransformBlock1d
 
 __sources__ = ['music', 'speech', 'effects'] # ['bass', 'drums', 'other', 'vocals'] for MUSDB18
@@ -195,7 +195,7 @@ class MultiResolutionCrossNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels = config['in_channels']
         hidden_channels = config['hidden_channels']
@@ -5,7 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.filterbank import choose_filterbank
-from utils.model import choose_nonlinear
+from utils.model import choose_nonlinear, load_checkpoint, cached_pretrained
 from utils.tasnet import choose_layer_norm
 from models.transform import Segment1d, OverlapAdd1d
 from models.transformer import PositionalEncoding
@@ -179,7 +179,7 @@ class SepFormer(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels = config['in_channels']
         n_basis = config['n_basis']
@@ -227,6 +227,7 @@ class SepFormer(nn.Module):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):        
         from utils.utils import download_pretrained_model_from_google_drive
 
@@ -5,7 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.filterbank import choose_filterbank, compute_valid_basis
-from utils.model import choose_nonlinear, choose_rnn
+from utils.model import choose_nonlinear, choose_rnn, load_checkpoint, cached_pretrained
 from models.filterbank import FourierEncoder, FourierDecoder
 
 EPS = 1e-12
@@ -190,7 +190,7 @@ class TasNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels = config.get('in_channels') or 1
         n_basis = config.get('n_bases') or config['n_basis']
@@ -225,6 +225,7 @@ class TasNet(nn.Module):
         return model
 
     @classmethod
+    @cached_pretrained
     def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
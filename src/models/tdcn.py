@@ -40,6 +40,43 @@ class TimeDilatedConvNet(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <list>: States of blocks.
+        """
+        state = [
+            self.net[idx].init_state(batch_size) for idx in range(self.num_blocks)
+        ]
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Args:
+            input (batch_size, num_features, T): Block of input.
+            state <list>: States returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, skip_channels, T)
+            state <list>: Updated states.
+        """
+        num_blocks = self.num_blocks
+
+        x = input
+        skip_connection = 0
+        next_state = []
+
+        for idx in range(num_blocks):
+            x, skip, _state = self.net[idx].forward_step(x, state[idx])
+            skip_connection = skip_connection + skip
+            next_state.append(_state)
+
+        output = skip_connection
+
+        return output, next_state
+
 class TimeDilatedConvBlock1d(nn.Module):
     def __init__(self, num_features, hidden_channels=256, skip_channels=256, kernel_size=3, num_layers=10, dilated=True, separable=False, causal=True, nonlinear=None, norm=True, dual_head=True, eps=EPS):
         super().__init__()
@@ -74,6 +111,42 @@ class TimeDilatedConvBlock1d(nn.Module):
 
         return x, skip_connection
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <list>: States of residual blocks.
+        """
+        state = [
+            self.net[idx].init_state(batch_size) for idx in range(self.num_layers)
+        ]
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Args:
+            input (batch_size, num_features, T): Block of input.
+            state <list>: States returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, num_features, T) or None
+            skip (batch_size, skip_channels, T)
+            state <list>: Updated states.
+        """
+        num_layers = self.num_layers
+
+        x = input
+        skip_connection = 0
+        next_state = []
+
+        for idx in range(num_layers):
+            x, skip, _state = self.net[idx].forward_step(x, state[idx])
+            skip_connection = skip_connection + skip
+            next_state.append(_state)
+
+        return x, skip_connection, next_state
+
 class ResidualBlock1d(nn.Module):
     def __init__(self, num_features, hidden_channels=256, skip_channels=256, kernel_size=3, stride=2, dilation=1, separable=False, causal=True, nonlinear=None, norm=True, dual_head=True, eps=EPS):
         super().__init__()
@@ -146,6 +219,82 @@ class ResidualBlock1d(nn.Module):
 
         return output, skip
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Past frames of dilated convolution and running statistics of normalization.
+        """
+        kernel_size, stride, dilation = self.kernel_size, self.stride, self.dilation
+
+        if not self.causal:
+            raise ValueError("Streaming inference is supported only when causal=True.")
+
+        if stride != 1:
+            raise ValueError("Streaming inference is supported only when stride=1, but given {}.".format(stride))
+
+        weight = self.bottleneck_conv1d.weight
+        hidden_channels = weight.size(0)
+        buffer_size = (kernel_size - 1) * dilation
+
+        state = {
+            'buffer': torch.zeros((batch_size, hidden_channels, buffer_size), device=weight.device, dtype=weight.dtype)
+        }
+
+        if self.norm:
+            state['norm'] = self.norm1d.init_state(batch_size)
+
+        if self.separable:
+            state['separable'] = self.separable_conv1d.init_state(batch_size)
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Streaming version of `forward`. Only last (kernel_size - 1) * dilation frames are kept in `state` instead of padding whole sequence.
+        Args:
+            input (batch_size, num_features, T): Block of input.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, num_features, T) or None
+            skip (batch_size, skip_channels, T)
+            state <dict>: Updated state.
+        """
+        nonlinear, norm = self.nonlinear, self.norm
+        separable = self.separable
+        dual_head = self.dual_head
+
+        buffer = state['buffer']
+        buffer_size = buffer.size(-1)
+        next_state = {}
+
+        residual = input
+        x = self.bottleneck_conv1d(input)
+
+        if nonlinear:
+            x = self.nonlinear1d(x)
+        if norm:
+            x, next_state['norm'] = self.norm1d.forward_step(x, state['norm'])
+
+        x = torch.cat([buffer, x], dim=-1)
+        next_state['buffer'] = x[..., x.size(-1) - buffer_size:]
+
+        if separable:
+            output, skip, next_state['separable'] = self.separable_conv1d.forward_step(x, state['separable']) # output may be None
+        else:
+            if dual_head:
+                output = self.output_conv1d(x)
+            else:
+                output = None
+
+            skip = self.skip_conv1d(x)
+
+        if output is not None:
+            output = output + residual
+
+        return output, skip, next_state
+
 class DepthwiseSeparableConv1d(nn.Module):
     def __init__(self, in_channels, out_channels=256, skip_channels=256, kernel_size=3, stride=2, dilation=1, causal=True, nonlinear=None, norm=True, dual_head=True, eps=EPS):
         super().__init__()
@@ -195,6 +344,52 @@ class DepthwiseSeparableConv1d(nn.Module):
 
         return output, skip
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Running statistics of normalization.
+        """
+        state = {}
+
+        if self.norm:
+            state['norm'] = self.norm1d.init_state(batch_size)
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Args:
+            input (batch_size, in_channels, T + (kernel_size - 1) * dilation): Block of input with past frames.
+            state <dict>: State returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, out_channels, T) or None
+            skip (batch_size, skip_channels, T)
+            state <dict>: Updated state.
+        """
+        nonlinear, norm = self.nonlinear, self.norm
+        dual_head = self.dual_head
+
+        next_state = {}
+
+        x = self.depthwise_conv1d(input)
+
+        if nonlinear:
+            x = self.nonlinear1d(x)
+
+        if norm:
+            x, next_state['norm'] = self.norm1d.forward_step(x, state['norm'])
+
+        if dual_head:
+            output = self.output_pointwise_conv1d(x)
+        else:
+            output = None
+
+        skip = self.skip_pointwise_conv1d(x)
+
+        return output, skip, next_state
+
 def _test_tdcn():
     batch_size = 4
     T = 128
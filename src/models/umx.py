@@ -3,10 +3,12 @@ import os
 import yaml
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from utils.audio import build_window
-from utils.model import choose_nonlinear, choose_rnn
-from algorithm.frequency_mask import multichannel_wiener_filter
+from utils.model import choose_nonlinear, choose_rnn, quantize_dynamic, load_checkpoint, cached_pretrained
+from algorithm.frequency_mask import multichannel_wiener_filter, multichannel_wiener_filter_real, OnlineMultichannelWienerFilter
+from algorithm.stft import BatchSTFT, BatchInvSTFT
 from transforms.stft import stft, istft
 
 __sources__ = ['bass', 'drums', 'other', 'vocals']
@@ -76,7 +78,8 @@ class ParallelOpenUnmix(nn.Module):
         return output
 
     @classmethod
-    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
+    @cached_pretrained
+    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, quantized=False, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
         task = kwargs.get('task')
@@ -112,8 +115,8 @@ class ParallelOpenUnmix(nn.Module):
             if not os.path.exists(model_path):
                 download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-            config = torch.load(model_path, map_location=lambda storage, loc: storage)
-            modules[target] = OpenUnmix.build_model(model_path, load_state_dict=load_state_dict)
+            config = load_checkpoint(model_path)
+            modules[target] = OpenUnmix.build_model(model_path, load_state_dict=load_state_dict, quantized=quantized)
 
             if task in ['musdb18', 'musdb18hq']:
                 if n_fft is None:
@@ -147,6 +150,10 @@ class ParallelOpenUnmix(nn.Module):
     def TimeDomainWrapper(cls, base_model, n_fft, hop_length=None, window_fn='hann', eps=EPS):
         return ParallelOpenUnmixTimeDomainWrapper(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
 
+    @classmethod
+    def StreamingWrapper(cls, base_model, forgetting_factor=0.98, iteration=1, eps=EPS):
+        return ParallelOpenUnmixStreamingWrapper(base_model, forgetting_factor=forgetting_factor, iteration=iteration, eps=eps)
+
     @property
     def num_parameters(self):
         _num_parameters = 0
@@ -188,15 +195,96 @@ class ParallelOpenUnmixTimeDomainWrapper(nn.Module):
         mixture_spectrogram = stft(input, n_fft=self.n_fft, hop_length=self.hop_length, window=self.window, onesided=True, return_complex=True)
         mixture_amplitude = torch.abs(mixture_spectrogram)
 
+        estimated_amplitude = self.base_model(mixture_amplitude) # (batch_size, n_sources, in_channels, n_bins, n_frames)
+        estimated_spectrogram = multichannel_wiener_filter(mixture_spectrogram, estimated_sources_amplitude=estimated_amplitude, iteration=iteration, eps=eps)
+        output = istft(estimated_spectrogram, n_fft=self.n_fft, hop_length=self.hop_length, window=self.window, onesided=True, return_complex=False, length=T)
+
+        return output
+
+    @property
+    def sources(self):
+        return list(self.base_model.sources)
+
+class ExportableParallelOpenUnmixTimeDomainWrapper(ParallelOpenUnmixTimeDomainWrapper):
+    """
+    Exportable version of ParallelOpenUnmixTimeDomainWrapper.
+    STFT and iSTFT are computed by convolution, and multichannel Wiener filter is computed by real arithmetic.
+    The whole waveform-in, waveform-out graph can be exported by torch.jit.trace or torch.onnx.export.
+    """
+    def __init__(self, base_model: ParallelOpenUnmix, n_fft, hop_length=None, window_fn='hann', iteration=1, eps=EPS):
+        super().__init__(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
+
+        self.iteration = iteration
+
+        self.stft = BatchSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+        self.istft = BatchInvSTFT(n_fft, hop_length=self.hop_length, window_fn=window_fn, center=True)
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: (batch_size, 1, in_channels, T)
+        Returns:
+            output <torch.Tensor>: (batch_size, n_sources, in_channels, T)
+        """
+        batch_size, _, in_channels, T = input.size()
+
+        mixture_spectrogram = self.stft(input.reshape(batch_size * in_channels, T)) # (batch_size * in_channels, n_bins, n_frames, 2)
+        _, n_bins, n_frames, _ = mixture_spectrogram.size()
+        mixture_spectrogram = mixture_spectrogram.view(batch_size, in_channels, n_bins, n_frames, 2)
+        mixture_amplitude = torch.sqrt(torch.sum(mixture_spectrogram**2, dim=-1)) # (batch_size, in_channels, n_bins, n_frames)
+
+        estimated_amplitude = self.base_model(mixture_amplitude.unsqueeze(dim=1)) # (batch_size, n_sources, in_channels, n_bins, n_frames)
+        estimated_spectrogram = multichannel_wiener_filter_real(mixture_spectrogram, estimated_sources_amplitude=estimated_amplitude, iteration=self.iteration, eps=self.eps)
+
+        n_sources = estimated_spectrogram.size(1)
+        estimated_spectrogram = estimated_spectrogram.view(batch_size * n_sources * in_channels, n_bins, n_frames, 2)
+        output = self.istft(estimated_spectrogram, T=T)
+        output = output.view(batch_size, n_sources, in_channels, T)
+
+        return output
+
+class ParallelOpenUnmixStreamingWrapper(nn.Module):
+    """
+    Streaming separation by causal ParallelOpenUnmix with online multichannel Wiener filter.
+    Blocks of STFT frames are fed in order, and hidden states of RNNs and statistics of Wiener filter are carried over blocks.
+    """
+    def __init__(self, base_model: ParallelOpenUnmix, forgetting_factor=0.98, iteration=1, eps=EPS):
+        super().__init__()
+
+        for target in base_model.sources:
+            if not base_model.net[target].causal:
+                raise ValueError("All modules must be causal for streaming separation.")
+
+        self.base_model = base_model
+        self.wiener_filter = OnlineMultichannelWienerFilter(forgetting_factor=forgetting_factor, iteration=iteration, eps=eps)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Clear states of previous blocks. Call this before a new stream starts.
+        """
+        self.hidden = {target: None for target in self.sources}
+        self.wiener_filter.reset()
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: Complex mixture spectrogram with shape of (batch_size, 1, in_channels, n_bins, n_frames), where n_frames is block length.
+        Returns:
+            output <torch.Tensor>: Complex spectrogram with shape of (batch_size, n_sources, in_channels, n_bins, n_frames)
+        """
+        assert input.dim() == 5, "input is expected 5D input."
+
+        mixture_amplitude = torch.abs(input.squeeze(dim=1)) # (batch_size, in_channels, n_bins, n_frames)
         estimated_amplitude = []
 
         for target in self.sources:
-            _estimated_amplitude = self.base_model(mixture_amplitude.squeeze(dim=1), target=target)
+            _estimated_amplitude, self.hidden[target] = self.base_model.net[target](mixture_amplitude, hidden=self.hidden[target], return_hidden=True)
             estimated_amplitude.append(_estimated_amplitude)
 
-        estimated_amplitude = torch.stack(estimated_amplitude, dim=1)
-        estimated_spectrogram = multichannel_wiener_filter(mixture_spectrogram, estimated_sources_amplitude=estimated_amplitude, iteration=iteration, eps=eps)
-        output = istft(estimated_spectrogram, n_fft=self.n_fft, hop_length=self.hop_length, window=self.window, onesided=True, return_complex=False, length=T)
+        estimated_amplitude = torch.stack(estimated_amplitude, dim=1) # (batch_size, n_sources, in_channels, n_bins, n_frames)
+        output = self.wiener_filter(input, estimated_amplitude)
 
         return output
 
@@ -204,6 +292,164 @@ class ParallelOpenUnmixTimeDomainWrapper(nn.Module):
     def sources(self):
         return list(self.base_model.sources)
 
+class FusedParallelOpenUnmix(nn.Module):
+    """
+    Horizontally fused version of ParallelOpenUnmix.
+    Weights of all targets are stacked, so that fully connected layers of all targets run as batched matrix multiplications.
+    """
+    def __init__(self, modules, fuse_rnn=False):
+        """
+        Args:
+            modules <dict<OpenUnmix>> or <nn.ModuleDict>: OpenUnmix models of each target with identical configuration.
+            fuse_rnn <bool>: If True, LSTMs of all targets are also fused into FusedLSTM, whose recurrence is computed by batched matrix multiplications.
+                Otherwise, RNNs of each target are computed by native implementation one by one.
+        """
+        super().__init__()
+
+        if isinstance(modules, ParallelOpenUnmix):
+            modules = modules.net
+        elif not isinstance(modules, (dict, nn.ModuleDict)):
+            raise TypeError("Type of `modules` is expected nn.ModuleDict or dict, but given {}.".format(type(modules)))
+
+        sources = list(modules.keys())
+        config = None
+
+        for key in sources:
+            module = modules[key]
+
+            if not isinstance(module, OpenUnmix):
+                raise ValueError("All modules must be OpenUnmix.")
+
+            if config is None:
+                config = module.get_config()
+            else:
+                assert config == module.get_config(), "Configurations are different among modules."
+
+        modules = [modules[key] for key in sources]
+
+        self.sources = sources
+        self.n_sources = len(sources)
+
+        self.in_channels, self.n_bins = config['in_channels'], config['n_bins']
+        self.hidden_channels, self.out_channels = modules[0].hidden_channels, modules[0].out_channels
+        self.max_bin = config['max_bin']
+        self.eps = config['eps']
+
+        self.scale_in = nn.Parameter(torch.stack([module.scale_in.data for module in modules], dim=0)) # (n_sources, max_bin)
+        self.bias_in = nn.Parameter(torch.stack([module.bias_in.data for module in modules], dim=0)) # (n_sources, max_bin)
+        self.scale_out = nn.Parameter(torch.stack([module.scale_out.data for module in modules], dim=0)) # (n_sources, n_bins)
+        self.bias_out = nn.Parameter(torch.stack([module.bias_out.data for module in modules], dim=0)) # (n_sources, n_bins)
+
+        self.block = FusedTransformBlock1d([module.block for module in modules])
+        self.fuse_rnn = fuse_rnn
+
+        if self.fuse_rnn:
+            self.rnn = FusedLSTM([module.rnn for module in modules])
+        else:
+            self.rnn = nn.ModuleList([module.rnn for module in modules])
+
+        net = []
+        net.append(FusedTransformBlock1d([module.net[0] for module in modules]))
+        net.append(FusedTransformBlock1d([module.net[1] for module in modules]))
+
+        self.net = nn.Sequential(*net)
+        self.relu2d = nn.ReLU()
+
+    def forward(self, input, target=None):
+        """
+        Args:
+            input: Nonnegative tensor with shape of
+                (batch_size, in_channels, n_bins, n_frames) if target is specified.
+                (batch_size, 1, in_channels, n_bins, n_frames) if target is None.
+        Returns:
+            output:
+                (batch_size, in_channels, n_bins, n_frames) if target is specified.
+                (batch_size, n_sources, in_channels, n_bins, n_frames) if target is None.
+        """
+        if target is None:
+            assert input.dim() == 5, "input is expected 5D, but given {}.".format(input.dim())
+            output = self.forward_all(input.squeeze(dim=1))
+        else:
+            if type(target) is not str:
+                raise TypeError("`target` is expected str, but given {}".format(type(target)))
+
+            assert input.dim() == 4, "input is expected 4D, but given {}.".format(input.dim())
+
+            # All targets are computed at once, so target=None is preferable to estimate all targets.
+            source_idx = self.sources.index(target)
+            output = self.forward_all(input)[:, source_idx]
+
+        return output
+
+    def forward_all(self, input):
+        """
+        Args:
+            input: (batch_size, in_channels, n_bins, n_frames)
+        Returns:
+            output: (batch_size, n_sources, in_channels, n_bins, n_frames)
+        """
+        n_sources = self.n_sources
+        n_bins, max_bin = self.n_bins, self.max_bin
+        in_channels, hidden_channels, out_channels = self.in_channels, self.hidden_channels, self.out_channels
+        eps = self.eps
+
+        batch_size, _, _, n_frames = input.size()
+
+        if max_bin == n_bins:
+            x_valid = input
+        else:
+            sections = [max_bin, n_bins - max_bin]
+            x_valid, _ = torch.split(input, sections, dim=2)
+
+        scale_in, bias_in = self.scale_in.view(n_sources, 1, 1, max_bin, 1), self.bias_in.view(n_sources, 1, 1, max_bin, 1)
+        x = (x_valid - bias_in) / (torch.abs(scale_in) + eps) # (n_sources, batch_size, in_channels, max_bin, n_frames)
+        x = x.permute(1, 4, 0, 2, 3).contiguous() # (batch_size, n_frames, n_sources, in_channels, max_bin)
+        x = x.view(batch_size * n_frames, n_sources, in_channels * max_bin)
+        x = self.block(x) # (batch_size * n_frames, n_sources, hidden_channels)
+        x_rnn = x.view(batch_size, n_frames, n_sources, hidden_channels)
+        x_rnn = x_rnn.permute(2, 0, 1, 3) # (n_sources, batch_size, n_frames, hidden_channels)
+
+        if self.fuse_rnn:
+            x_rnn = self.rnn(x_rnn) # (n_sources, batch_size, n_frames, out_channels)
+        else:
+            x_rnn_sources = []
+
+            for source_idx, rnn in enumerate(self.rnn):
+                rnn.flatten_parameters()
+                _x_rnn, _ = rnn(x_rnn[source_idx]) # (batch_size, n_frames, out_channels)
+                x_rnn_sources.append(_x_rnn)
+
+            x_rnn = torch.stack(x_rnn_sources, dim=0) # (n_sources, batch_size, n_frames, out_channels)
+
+        x_rnn = x_rnn.permute(1, 2, 0, 3).contiguous() # (batch_size, n_frames, n_sources, out_channels)
+        x_rnn = x_rnn.view(batch_size * n_frames, n_sources, out_channels)
+        x = torch.cat([x, x_rnn], dim=2) # (batch_size * n_frames, n_sources, hidden_channels + out_channels)
+        x_full = self.net(x) # (batch_size * n_frames, n_sources, in_channels * n_bins)
+        x_full = x_full.view(batch_size, n_frames, n_sources, in_channels, n_bins)
+        x_full = x_full.permute(0, 2, 3, 4, 1).contiguous() # (batch_size, n_sources, in_channels, n_bins, n_frames)
+
+        scale_out, bias_out = self.scale_out.view(n_sources, 1, n_bins, 1), self.bias_out.view(n_sources, 1, n_bins, 1)
+        x_full = scale_out * x_full + bias_out
+        x_full = self.relu2d(x_full)
+
+        output = x_full * input.unsqueeze(dim=1)
+
+        return output
+
+    @classmethod
+    def TimeDomainWrapper(cls, base_model, n_fft, hop_length=None, window_fn='hann', eps=EPS):
+        return ParallelOpenUnmixTimeDomainWrapper(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
+
+    @property
+    def num_parameters(self):
+        _num_parameters = 0
+
+        for p in self.parameters():
+            if p.requires_grad:
+                _num_parameters += p.numel()
+
+        return _num_parameters
+
 """
 Open-Unmix
     Reference: "Open-unmix: a reference implementation for source separation"
@@ -292,19 +538,27 @@ class OpenUnmix(nn.Module):
         self.scale_out.data.fill_(1)
         self.bias_out.data.zero_()
 
-    def forward(self, input):
+    def forward(self, input, hidden=None, return_hidden=False):
         """
         Args:
             input: (batch_size, in_channels, n_bins, n_frames)
+            hidden: Hidden state of RNN carried over from previous frames. Only causal model supports it.
+            return_hidden <bool>: If True, hidden state of RNN is also returned.
         Returns:
             output: (batch_size, in_channels, n_bins, n_frames)
+            hidden: Hidden state of RNN, only if return_hidden=True.
         """
+        if hidden is not None and not self.causal:
+            raise ValueError("hidden is supported only by causal model.")
+
         n_bins, max_bin = self.n_bins, self.max_bin
         in_channels, hidden_channels, out_channels = self.in_channels, self.hidden_channels, self.out_channels
 
         batch_size, _, _, n_frames = input.size()
 
-        self.rnn.flatten_parameters()
+        if isinstance(self.rnn, nn.RNNBase):
+            # Dynamically quantized RNN does not have flatten_parameters.
+            self.rnn.flatten_parameters()
 
         if max_bin == n_bins:
             x_valid = input
@@ -317,7 +571,7 @@ class OpenUnmix(nn.Module):
         x = x.view(batch_size * n_frames, in_channels * max_bin)
         x = self.block(x) # (batch_size * n_frames, hidden_channels)
         x = x.view(batch_size, n_frames, hidden_channels)
-        x_rnn, _ = self.rnn(x) # (batch_size, n_frames, out_channels)
+        x_rnn, hidden = self.rnn(x, hidden) # (batch_size, n_frames, out_channels)
         x = torch.cat([x, x_rnn], dim=2) # (batch_size, n_frames, hidden_channels + out_channels)
         x = x.view(batch_size * n_frames, hidden_channels + out_channels)
         x_full = self.net(x) # (batch_size * n_frames, n_bins)
@@ -329,6 +583,9 @@ class OpenUnmix(nn.Module):
 
         output = x_full * input
 
+        if return_hidden:
+            return output, hidden
+
         return output
     
     def transform_affine_in(self, input):
@@ -401,8 +658,8 @@ class OpenUnmix(nn.Module):
         return model
 
     @classmethod
-    def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+    def build_model(cls, model_path, load_state_dict=False, quantized=False, weights_only=True):
+        config = load_checkpoint(model_path, weights_only=weights_only)
 
         in_channels = config['in_channels']
         hidden_channels = config['hidden_channels']
@@ -426,13 +683,23 @@ class OpenUnmix(nn.Module):
             eps=eps
         )
 
+        if config.get('quantized'):
+            # int8 weights are saved in checkpoint.
+            model = quantize_dynamic(model, backend=config.get('backend'))
+
         if load_state_dict:
             model.load_state_dict(config['state_dict'])
 
+        if quantized and not config.get('quantized'):
+            if not load_state_dict:
+                raise ValueError("Set load_state_dict=True to quantize float model.")
+            model = quantize_dynamic(model)
+
         return model
 
     @classmethod
-    def build_from_pretrained(cls, root="./pretrained", target='vocals', quiet=False, load_state_dict=True, **kwargs):
+    @cached_pretrained
+    def build_from_pretrained(cls, root="./pretrained", target='vocals', quiet=False, load_state_dict=True, quantized=False, **kwargs):
         import os
 
         from utils.utils import download_pretrained_model_from_google_drive
@@ -468,8 +735,8 @@ class OpenUnmix(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
-        model = cls.build_model(model_path, load_state_dict=load_state_dict)
+        config = load_checkpoint(model_path)
+        model = cls.build_model(model_path, load_state_dict=load_state_dict, quantized=quantized)
 
         if task in ['musdb18', 'musdb18hq']:
             additional_attributes.update({
@@ -559,6 +826,161 @@ class TransformBlock1d(nn.Module):
 
         return output
 
+class FusedTransformBlock1d(nn.Module):
+    def __init__(self, modules):
+        """
+        Args:
+            modules <list<TransformBlock1d>>: Blocks with identical configuration.
+        """
+        super().__init__()
+
+        fc, norm1d = modules[0].fc, modules[0].norm1d
+        n_sources = len(modules)
+
+        self.n_sources = n_sources
+        self.out_channels = fc.out_features
+
+        self.weight = nn.Parameter(torch.stack([module.fc.weight.data for module in modules], dim=0)) # (n_sources, out_channels, in_channels)
+
+        if fc.bias is None:
+            self.bias = None
+        else:
+            self.bias = nn.Parameter(torch.stack([module.fc.bias.data for module in modules], dim=0)) # (n_sources, out_channels)
+
+        self.norm1d = nn.BatchNorm1d(n_sources * fc.out_features, eps=norm1d.eps, momentum=norm1d.momentum)
+        self.norm1d.load_state_dict({
+            key: torch.cat([module.norm1d.state_dict()[key].view(-1) for module in modules], dim=0) if key != 'num_batches_tracked' else norm1d.num_batches_tracked for key in norm1d.state_dict().keys()
+        })
+
+        self.nonlinear = modules[0].nonlinear
+
+        if self.nonlinear:
+            self.nonlinear1d = modules[0].nonlinear1d
+
+    def forward(self, input):
+        """
+        Args:
+            input: (batch_size, n_sources, in_channels)
+        Returns:
+            output: (batch_size, n_sources, out_channels)
+        """
+        n_sources, out_channels = self.n_sources, self.out_channels
+        batch_size = input.size(0)
+
+        x = torch.einsum('bsi,soi->bso', input, self.weight).contiguous()
+
+        if self.bias is not None:
+            x = x + self.bias
+
+        x = x.view(batch_size, n_sources * out_channels)
+        x = self.norm1d(x)
+        x = x.view(batch_size, n_sources, out_channels)
+
+        if self.nonlinear:
+            output = self.nonlinear1d(x)
+        else:
+            output = x
+
+        return output
+
+class FusedLSTM(nn.Module):
+    def __init__(self, modules):
+        """
+        Args:
+            modules <list<nn.LSTM>>: LSTMs with identical configuration. batch_first=True is expected.
+        """
+        super().__init__()
+
+        rnn = modules[0]
+
+        if not isinstance(rnn, nn.LSTM):
+            raise NotImplementedError("Not support {}.".format(type(rnn).__name__))
+
+        self.n_sources = len(modules)
+        self.hidden_size = rnn.hidden_size
+        self.num_layers = rnn.num_layers
+        self.num_directions = 2 if rnn.bidirectional else 1
+        self.dropout = rnn.dropout
+
+        suffixes = ['', '_reverse'][:self.num_directions]
+
+        for layer_idx in range(self.num_layers):
+            weight_ih, weight_hh, bias = [], [], []
+
+            for module in modules:
+                for suffix in suffixes:
+                    weight_ih.append(getattr(module, 'weight_ih_l{}{}'.format(layer_idx, suffix)).data)
+                    weight_hh.append(getattr(module, 'weight_hh_l{}{}'.format(layer_idx, suffix)).data)
+
+                    if rnn.bias:
+                        _bias_ih = getattr(module, 'bias_ih_l{}{}'.format(layer_idx, suffix)).data
+                        _bias_hh = getattr(module, 'bias_hh_l{}{}'.format(layer_idx, suffix)).data
+                        bias.append(_bias_ih + _bias_hh)
+                    else:
+                        bias.append(torch.zeros_like(weight_ih[-1][:, 0]))
+
+            # (n_sources * num_directions, 4 * hidden_size, *)
+            self.register_parameter('weight_ih_l{}'.format(layer_idx), nn.Parameter(torch.stack(weight_ih, dim=0)))
+            self.register_parameter('weight_hh_l{}'.format(layer_idx), nn.Parameter(torch.stack(weight_hh, dim=0)))
+            self.register_parameter('bias_l{}'.format(layer_idx), nn.Parameter(torch.stack(bias, dim=0)))
+
+    def forward(self, input):
+        """
+        Args:
+            input: (n_sources, batch_size, n_frames, input_size)
+        Returns:
+            output: (n_sources, batch_size, n_frames, num_directions * hidden_size)
+        """
+        n_sources = self.n_sources
+        hidden_size = self.hidden_size
+        num_directions = self.num_directions
+
+        _, batch_size, n_frames, _ = input.size()
+
+        x = input
+
+        for layer_idx in range(self.num_layers):
+            weight_ih = getattr(self, 'weight_ih_l{}'.format(layer_idx))
+            weight_hh = getattr(self, 'weight_hh_l{}'.format(layer_idx))
+            bias = getattr(self, 'bias_l{}'.format(layer_idx))
+
+            if layer_idx > 0 and self.dropout > 0:
+                x = F.dropout(x, p=self.dropout, training=self.training)
+
+            if num_directions == 2:
+                x = torch.stack([x, torch.flip(x, dims=(2,))], dim=1) # (n_sources, num_directions, batch_size, n_frames, in_channels)
+
+            x = x.reshape(n_sources * num_directions, batch_size * n_frames, -1)
+
+            # Input-to-hidden projection of all time steps at once
+            x_gates = torch.baddbmm(bias.unsqueeze(dim=1), x, weight_ih.transpose(1, 2)) # (n_sources * num_directions, batch_size * n_frames, 4 * hidden_size)
+            x_gates = x_gates.view(n_sources * num_directions, batch_size, n_frames, 4 * hidden_size)
+            x_gates = x_gates.permute(2, 0, 1, 3).contiguous() # (n_frames, n_sources * num_directions, batch_size, 4 * hidden_size)
+
+            h = x.new_zeros((n_sources * num_directions, batch_size, hidden_size))
+            c = x.new_zeros((n_sources * num_directions, batch_size, hidden_size))
+            weight_hh = weight_hh.transpose(1, 2)
+            x = []
+
+            for frame_idx in range(n_frames):
+                gates = torch.baddbmm(x_gates[frame_idx], h, weight_hh)
+                gate_i, gate_f, gate_g, gate_o = torch.chunk(gates, 4, dim=-1)
+                c = torch.sigmoid(gate_f) * c + torch.sigmoid(gate_i) * torch.tanh(gate_g)
+                h = torch.sigmoid(gate_o) * torch.tanh(c)
+                x.append(h)
+
+            x = torch.stack(x, dim=2) # (n_sources * num_directions, batch_size, n_frames, hidden_size)
+
+            if num_directions == 2:
+                x = x.view(n_sources, num_directions, batch_size, n_frames, hidden_size)
+                x_forward, x_backward = torch.unbind(x, dim=1)
+                x_backward = torch.flip(x_backward, dims=(2,))
+                x = torch.cat([x_forward, x_backward], dim=-1) # (n_sources, batch_size, n_frames, num_directions * hidden_size)
+
+        output = x
+
+        return output
+
 def _test_openunmix():
     batch_size = 4
     in_channels = 2
@@ -585,8 +1007,117 @@ def _test_openunmix():
     print(model)
     print(input.size(), output.size())
 
+def _test_fused_openunmix():
+    batch_size = 4
+    in_channels = 2
+    n_bins, max_bin = 2049, 1487
+    n_frames = 100
+    sources = __sources__
+
+    input = torch.abs(torch.randn(batch_size, 1, in_channels, n_bins, n_frames))
+
+    modules = {}
+
+    for target in sources:
+        modules[target] = OpenUnmix(in_channels=in_channels, n_bins=n_bins, max_bin=max_bin)
+
+    model = ParallelOpenUnmix(modules)
+    model.eval()
+
+    with torch.no_grad():
+        output = model(input)
+
+    for fuse_rnn in [False, True]:
+        print('-'*10, "fuse_rnn={}".format(fuse_rnn), '-'*10)
+        fused_model = FusedParallelOpenUnmix(model, fuse_rnn=fuse_rnn)
+        fused_model.eval()
+
+        with torch.no_grad():
+            fused_output = fused_model(input)
+
+        print(input.size(), fused_output.size())
+        print("Max absolute error: {}".format(torch.max(torch.abs(fused_output - output)).item()))
+        print()
+
+def _test_exportable_openunmix():
+    batch_size = 2
+    in_channels = 2
+    n_fft, hop_length = 4096, 1024
+    n_bins, max_bin = n_fft // 2 + 1, 1487
+    T = 44100
+    sources = __sources__
+
+    input = torch.randn(batch_size, 1, in_channels, T)
+
+    modules = {}
+
+    for target in sources:
+        modules[target] = OpenUnmix(in_channels=in_channels, n_bins=n_bins, max_bin=max_bin)
+
+    base_model = ParallelOpenUnmix(modules)
+    model = ParallelOpenUnmixTimeDomainWrapper(base_model, n_fft, hop_length=hop_length)
+    exportable_model = ExportableParallelOpenUnmixTimeDomainWrapper(base_model, n_fft, hop_length=hop_length)
+    model.eval()
+    exportable_model.eval()
+
+    with torch.no_grad():
+        output = model(input)
+        traced_model = torch.jit.trace(exportable_model, input)
+        traced_output = traced_model(input)
+
+    print(input.size(), traced_output.size())
+    print("Max absolute error: {}".format(torch.max(torch.abs(traced_output - output)).item()))
+
+def _test_streaming_openunmix():
+    batch_size = 2
+    in_channels = 2
+    n_fft = 512
+    n_bins, max_bin = n_fft // 2 + 1, 200
+    n_frames, block_size = 50, 16
+    sources = __sources__
+
+    input = torch.randn(batch_size, 1, in_channels, n_bins, n_frames, dtype=torch.cfloat)
+
+    modules = {}
+
+    for target in sources:
+        modules[target] = OpenUnmix(in_channels=in_channels, hidden_channels=64, n_bins=n_bins, max_bin=max_bin, causal=True)
+
+    base_model = ParallelOpenUnmix(modules)
+    model = ParallelOpenUnmixStreamingWrapper(base_model, forgetting_factor=0.95)
+    base_model.eval()
+
+    with torch.no_grad():
+        # Full sequence by causal model, then online Wiener filter with same blocks
+        estimated_amplitude = base_model(torch.abs(input))
+        wiener_filter = OnlineMultichannelWienerFilter(forgetting_factor=0.95)
+        output, streaming_output = [], []
+
+        for start_idx in range(0, n_frames, block_size):
+            end_idx = min(start_idx + block_size, n_frames)
+            output.append(wiener_filter(input[..., start_idx:end_idx], estimated_amplitude[..., start_idx:end_idx]))
+            streaming_output.append(model(input[..., start_idx:end_idx]))
+
+        output = torch.cat(output, dim=-1)
+        streaming_output = torch.cat(streaming_output, dim=-1)
+
+    print(input.size(), streaming_output.size())
+    print("Max absolute error: {}".format(torch.max(torch.abs(streaming_output - output)).item()))
+
 if __name__ == '__main__':
     torch.manual_seed(111)
 
     print("="*10, "Open-Unmix (UMX)", "="*10)
-    _test_openunmix()
\ No newline at end of file
+    _test_openunmix()
+    print()
+
+    print("="*10, "Fused Open-Unmix", "="*10)
+    _test_fused_openunmix()
+    print()
+
+    print("="*10, "Exportable Open-Unmix", "="*10)
+    _test_exportable_openunmix()
+    print()
+
+    print("="*10, "Streaming Open-Unmix", "="*10)
+    _test_streaming_openunmix()
\ No newline at end of file
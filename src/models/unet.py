@@ -3,7 +3,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.nn.modules.utils import _pair
 
-from utils.model import choose_nonlinear
+from utils.model import choose_nonlinear, load_checkpoint
 from conv import DepthwiseSeparableConv1d, DepthwiseSeparableConvTranspose1d, DepthwiseSeparableConv2d, DepthwiseSeparableConvTranspose2d
 
 EPS = 1e-12
@@ -16,7 +16,7 @@ class UNetBase(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         channels = config['channels']
         kernel_size, stride, dilated = config['kernel_size'], config['stride'], config['dilated']
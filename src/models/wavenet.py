@@ -2,7 +2,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from utils.model import choose_nonlinear
+from utils.model import choose_nonlinear, load_checkpoint
 from utils.tasnet import choose_layer_norm
 from conv import DepthwiseSeparableConv1d
 
@@ -58,7 +58,7 @@ class WaveNet(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         model = cls(in_channels=config['in_channels'], out_channels=config['out_channels'], hidden_channels=config['hidden_channels'], skip_channels=config['skip_channels'], kernel_size=config['kernel_size'], num_blocks=config['num_blocks'], num_layers=config['num_layers'], dilated=config['dilated'], separable=config['separable'], causal=config['causal'], nonlinear=config['nonlinear'], norm=config['norm'], output_nonlinear=config['output_nonlinear'], conditioning=config['conditioning'], enc_dim=config['enc_dim'], enc_kernel_size=config['enc_kernel_size'], enc_stride=config['enc_stride'])
 
@@ -6,6 +6,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from utils.tasnet import choose_layer_norm
+from utils.model import load_checkpoint
 from models.film import FiLM1d
 
 EPS = 1e-12
@@ -87,9 +88,7 @@ class WaveSplitBase(nn.Module):
         spk_vector = spk_vector.permute(0, 3, 1, 2).contiguous() # (batch_size, T, n_sources, latent_dim)
 
         # Use oracle sorted_idx during training. You can use oracle sorted_idx during evaluation if speakers in validation set are equal to training one.
-        mask = torch.eye(self.n_sources)[sorted_idx] # (batch_size, T, n_sources, n_sources)
-        mask = mask.to(spk_vector.device)
-        sorted_spk_vector = torch.sum(mask.unsqueeze(dim=4) * spk_vector.unsqueeze(dim=3), dim=2) # (batch_size, T, n_sources, latent_dim)
+        sorted_spk_vector = sort_speaker_vector(spk_vector, sorted_idx) # (batch_size, T, n_sources, latent_dim)
         sorted_spk_vector = sorted_spk_vector.permute(0, 2, 3, 1).contiguous() # (batch_size, n_sources, latent_dim, T)
         spk_centroids = sorted_spk_vector.mean(dim=3) # (batch_size, n_sources, latent_dim)
         
@@ -121,16 +120,22 @@ class WaveSplitBase(nn.Module):
 
         patterns = list(itertools.permutations(range(self.n_sources)))
         patterns = torch.Tensor(patterns).long()
-        
-        P = len(patterns)
-        possible_loss = []
-        
-        for idx in range(P):
-            pattern = patterns[idx]
-            loss = self.spk_criterion(spk_vector[:, :, pattern], spk_embedding, all_spk_embedding, feature_last=feature_last, batch_mean=False, time_mean=False) # (batch_size, T)
-            possible_loss.append(loss)
-        
-        possible_loss = torch.stack(possible_loss, dim=2) # (batch_size, T, P)
+        patterns = patterns.to(spk_vector.device)
+
+        if hasattr(self.spk_criterion, "compute_permutation_loss"):
+            # Loss of every permutation is gathered from pairwise distances.
+            possible_loss = self.spk_criterion.compute_permutation_loss(spk_vector, spk_embedding, all_spk_embedding, patterns, feature_last=feature_last) # (batch_size, T, P)
+        else:
+            P = len(patterns)
+            possible_loss = []
+
+            for idx in range(P):
+                pattern = patterns[idx]
+                loss = self.spk_criterion(spk_vector[:, :, pattern], spk_embedding, all_spk_embedding, feature_last=feature_last, batch_mean=False, time_mean=False) # (batch_size, T)
+                possible_loss.append(loss)
+
+            possible_loss = torch.stack(possible_loss, dim=2) # (batch_size, T, P)
+
         loss, indices = torch.min(possible_loss, dim=2) # loss (batch_size, T), indices (batch_size, T)
         
         if batch_mean:
@@ -149,14 +154,18 @@ class WaveSplitBase(nn.Module):
             spk_vector = spk_vector.permute(0, 3, 1, 2).contiguous() # (batch_size, T, n_sources, latent_dim)
 
         n_sources = self.n_sources
+        identity_idx = torch.arange(n_sources, device=spk_vector.device)
 
         for idx in range(iter_clustering):
             centroids = spk_vector.mean(dim=1, keepdim=True) # (batch_size, 1, n_clusters, latent_dim)
-            distance = torch.norm(spk_vector.unsqueeze(dim=3) - centroids.unsqueeze(dim=2), dim=4) # (batch_size, T, n_sources, n_clusters)
+            distance = torch.sum(spk_vector**2, dim=3, keepdim=True) - 2 * torch.matmul(spk_vector, centroids.transpose(2, 3)) + torch.sum(centroids**2, dim=3).unsqueeze(dim=2) # (batch_size, T, n_sources, n_clusters)
             cluster_idx = torch.argmin(distance, dim=3) # (batch_size, T, n_sources)
-            mask = torch.eye(n_sources)[cluster_idx] # (batch_size, T, n_sources, n_clusters)
-            mask = mask.to(spk_vector.device)
-            spk_vector = torch.sum(mask.unsqueeze(dim=4) * spk_vector.unsqueeze(dim=3), dim=2) # (batch_size, T, n_clusters, latent_dim)
+
+            if torch.all(cluster_idx == identity_idx):
+                # Every speaker vector stays in its own cluster, so spk_vector does not change any more.
+                break
+
+            spk_vector = sort_speaker_vector(spk_vector, cluster_idx) # (batch_size, T, n_clusters, latent_dim)
 
         if not feature_last:    
             spk_vector = spk_vector.permute(0, 2, 3, 1).contiguous() # (batch_size, n_clusters, latent_dim, T)
@@ -192,7 +201,7 @@ class WaveSplitBase(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, spk_stack_cls, sep_stack_cls, spk_criterion, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         speaker_stack = spk_stack_cls(
             **config['spk_stack']
@@ -318,6 +327,22 @@ class WaveSplit(WaveSplitBase):
     
         return sorted_idx
 
+def sort_speaker_vector(spk_vector, sorted_idx):
+    """
+    Args:
+        spk_vector: (batch_size, T, n_sources, latent_dim)
+        sorted_idx: (batch_size, T, n_sources), destination of each speaker vector.
+    Returns:
+        sorted_spk_vector: (batch_size, T, n_sources, latent_dim), where speaker vectors with same destination are summed.
+    """
+    latent_dim = spk_vector.size(-1)
+
+    sorted_idx = sorted_idx.to(spk_vector.device)
+    sorted_idx = sorted_idx.unsqueeze(dim=-1).expand(-1, -1, -1, latent_dim)
+    sorted_spk_vector = torch.zeros_like(spk_vector).scatter_add(2, sorted_idx, spk_vector)
+
+    return sorted_spk_vector
+
 class SpeakerStack(nn.Module):
     def __init__(self, in_channels, latent_dim=512, kernel_size=3, num_layers=14, dilated=True, separable=True, causal=False, nonlinear=None, norm=True, n_sources=2, eps=EPS):
         super().__init__()
@@ -404,7 +429,7 @@ class SpeakerStack(nn.Module):
 
     @classmethod
     def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels, latent_dim = config['in_channels'], config['latent_dim']
         kernel_size = config['kernel_size']
@@ -546,7 +571,7 @@ class SeparationStack(nn.Module):
     
     @classmethod
     def build_model(cls, model_path, load_state_dict=True):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+        config = load_checkpoint(model_path)
 
         in_channels = config['in_channels']
         latent_dim = config['latent_dim']
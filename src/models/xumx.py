@@ -5,7 +5,8 @@ import torch
 import torch.nn as nn
 
 from utils.audio import build_window
-from algorithm.frequency_mask import multichannel_wiener_filter
+from utils.model import quantize_dynamic, load_checkpoint, cached_pretrained
+from algorithm.frequency_mask import multichannel_wiener_filter, OnlineMultichannelWienerFilter
 from transforms.stft import stft, istft
 from models.umx import OpenUnmix
 
@@ -70,13 +71,22 @@ class CrossNetOpenUnmix(nn.Module):
 
         self.eps = eps
         
-    def forward(self, input):
+    def forward(self, input, hidden=None, return_hidden=False):
         """
         Args:
             input <torch.Tensor>: (batch_size, 1, in_channels, n_bins, n_frames)
+            hidden <dict>: Hidden states of RNNs of sources carried over from previous frames. Only causal model supports it.
+            return_hidden <bool>: If True, hidden states of RNNs are also returned.
         Returns:
             output <torch.Tensor>: (batch_size, n_sources, in_channels, n_bins, n_frames)
+            hidden <dict>: Hidden states of RNNs of sources, only if return_hidden=True.
         """
+        if hidden is not None and not self.causal:
+            raise ValueError("hidden is supported only by causal model.")
+
+        if hidden is None:
+            hidden = {source: None for source in self.sources}
+
         n_bins, max_bin = self.n_bins, self.max_bin
 
         input = input.squeeze(dim=1)
@@ -88,16 +98,20 @@ class CrossNetOpenUnmix(nn.Module):
             x_valid, _ = torch.split(input, sections, dim=2)
 
         for source in self.sources:
-            self.backbone[source].rnn.flatten_parameters()
+            if isinstance(self.backbone[source].rnn, nn.RNNBase):
+                self.backbone[source].rnn.flatten_parameters()
 
         if self.bridge:
-            output = self.forward_bridge(input, x_valid)
+            output, hidden = self.forward_bridge(input, x_valid, hidden=hidden)
         else:
-            output = self.forward_no_bridge(input, x_valid)
+            output, hidden = self.forward_no_bridge(input, x_valid, hidden=hidden)
+
+        if return_hidden:
+            return output, hidden
 
         return output
 
-    def forward_no_bridge(self, input, x_valid):
+    def forward_no_bridge(self, input, x_valid, hidden):
         n_bins, max_bin = self.n_bins, self.max_bin
         in_channels, hidden_channels, out_channels = self.in_channels, self.hidden_channels, self.out_channels
 
@@ -115,10 +129,11 @@ class CrossNetOpenUnmix(nn.Module):
 
         x_sources_block = torch.stack(x_sources, dim=0) # (n_sources, batch_size, n_frames, hidden_channels)
         x_sources = []
+        hidden = hidden.copy()
 
         for idx, source in enumerate(self.sources):
             x_source = x_sources_block[idx]
-            x_source_lstm, _ = self.backbone[source].rnn(x_source) # (batch_size, n_frames, out_channels)
+            x_source_lstm, hidden[source] = self.backbone[source].rnn(x_source, hidden[source]) # (batch_size, n_frames, out_channels)
             x_source = torch.cat([x_source, x_source_lstm], dim=2) # (batch_size, n_frames, hidden_channels + out_channels)
             x_source = x_source.view(batch_size * n_frames, hidden_channels + out_channels)
             x_sources.append(x_source)
@@ -138,9 +153,9 @@ class CrossNetOpenUnmix(nn.Module):
 
         output = torch.stack(output, dim=1) # (batch_size, n_sources, in_channels, n_bins, n_frames)
 
-        return output
+        return output, hidden
 
-    def forward_bridge(self, input, x_valid):
+    def forward_bridge(self, input, x_valid, hidden):
         n_bins, max_bin = self.n_bins, self.max_bin
         in_channels, hidden_channels, out_channels = self.in_channels, self.hidden_channels, self.out_channels
 
@@ -159,10 +174,11 @@ class CrossNetOpenUnmix(nn.Module):
         x_sources_block = torch.stack(x_sources, dim=0) # (n_sources, batch_size, n_frames, hidden_channels)
         x_mean = x_sources_block.mean(dim=0) # (batch_size, n_frames, hidden_channels)
         x_sources = []
+        hidden = hidden.copy()
 
         for idx, source in enumerate(self.sources):
             x_source = x_sources_block[idx]
-            x_source_rnn, _ = self.backbone[source].rnn(x_mean) # (batch_size, n_frames, out_channels)
+            x_source_rnn, hidden[source] = self.backbone[source].rnn(x_mean, hidden[source]) # (batch_size, n_frames, out_channels)
             x_source = torch.cat([x_source, x_source_rnn], dim=2) # (batch_size, n_frames, hidden_channels + out_channels)
             x_source = x_source.view(batch_size * n_frames, hidden_channels + out_channels)
             x_sources.append(x_source)
@@ -182,7 +198,7 @@ class CrossNetOpenUnmix(nn.Module):
 
         output = torch.stack(output, dim=1) # (batch_size, n_sources, in_channels, n_bins, n_frames)
 
-        return output
+        return output, hidden
 
     def get_config(self):
         config = {
@@ -236,8 +252,8 @@ class CrossNetOpenUnmix(nn.Module):
         return model
 
     @classmethod
-    def build_model(cls, model_path, load_state_dict=False):
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
+    def build_model(cls, model_path, load_state_dict=False, quantized=False, weights_only=True):
+        config = load_checkpoint(model_path, weights_only=weights_only)
 
         in_channels = config['in_channels']
         hidden_channels = config['hidden_channels']
@@ -265,13 +281,23 @@ class CrossNetOpenUnmix(nn.Module):
             eps=eps
         )
 
+        if config.get('quantized'):
+            # int8 weights are saved in checkpoint.
+            model = quantize_dynamic(model, backend=config.get('backend'))
+
         if load_state_dict:
             model.load_state_dict(config['state_dict'])
 
+        if quantized and not config.get('quantized'):
+            if not load_state_dict:
+                raise ValueError("Set load_state_dict=True to quantize float model.")
+            model = quantize_dynamic(model)
+
         return model
 
     @classmethod
-    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, **kwargs):
+    @cached_pretrained
+    def build_from_pretrained(cls, root="./pretrained", quiet=False, load_state_dict=True, quantized=False, **kwargs):
         from utils.utils import download_pretrained_model_from_google_drive
 
         task = kwargs.get('task')
@@ -301,8 +327,8 @@ class CrossNetOpenUnmix(nn.Module):
         if not os.path.exists(model_path):
             download_pretrained_model_from_google_drive(model_id, download_dir, quiet=quiet)
 
-        config = torch.load(model_path, map_location=lambda storage, loc: storage)
-        model = cls.build_model(model_path, load_state_dict=load_state_dict)
+        config = load_checkpoint(model_path)
+        model = cls.build_model(model_path, load_state_dict=load_state_dict, quantized=quantized)
 
         if task in ['musdb18']:
             additional_attributes.update({
@@ -321,6 +347,10 @@ class CrossNetOpenUnmix(nn.Module):
     def TimeDomainWrapper(cls, base_model, n_fft, hop_length=None, window_fn='hann', eps=EPS):
         return CrossNetOpenUnmixTimeDomainWrapper(base_model, n_fft, hop_length=hop_length, window_fn=window_fn, eps=eps)
 
+    @classmethod
+    def StreamingWrapper(cls, base_model, forgetting_factor=0.98, iteration=1, eps=EPS):
+        return CrossNetOpenUnmixStreamingWrapper(base_model, forgetting_factor=forgetting_factor, iteration=iteration, eps=eps)
+
     @property
     def num_parameters(self):
         _num_parameters = 0
@@ -369,6 +399,46 @@ class CrossNetOpenUnmixTimeDomainWrapper(nn.Module):
 
         return output
 
+class CrossNetOpenUnmixStreamingWrapper(nn.Module):
+    """
+    Streaming separation by causal CrossNetOpenUnmix with online multichannel Wiener filter.
+    Blocks of STFT frames are fed in order, and hidden states of RNNs and statistics of Wiener filter are carried over blocks.
+    """
+    def __init__(self, base_model: CrossNetOpenUnmix, forgetting_factor=0.98, iteration=1, eps=EPS):
+        super().__init__()
+
+        if not base_model.causal:
+            raise ValueError("base_model must be causal for streaming separation.")
+
+        self.base_model = base_model
+        self.wiener_filter = OnlineMultichannelWienerFilter(forgetting_factor=forgetting_factor, iteration=iteration, eps=eps)
+
+        self.sources = self.base_model.sources
+
+        self.reset()
+
+    def reset(self):
+        """
+        Clear states of previous blocks. Call this before a new stream starts.
+        """
+        self.hidden = None
+        self.wiener_filter.reset()
+
+    def forward(self, input):
+        """
+        Args:
+            input <torch.Tensor>: Complex mixture spectrogram with shape of (batch_size, 1, in_channels, n_bins, n_frames), where n_frames is block length.
+        Returns:
+            output <torch.Tensor>: Complex spectrogram with shape of (batch_size, n_sources, in_channels, n_bins, n_frames)
+        """
+        assert input.dim() == 5, "input is expected 5D input."
+
+        mixture_amplitude = torch.abs(input)
+        estimated_amplitude, self.hidden = self.base_model(mixture_amplitude, hidden=self.hidden, return_hidden=True) # (batch_size, n_sources, in_channels, n_bins, n_frames)
+        output = self.wiener_filter(input, estimated_amplitude)
+
+        return output
+
 def _test_crossnet_openunmix():
     batch_size = 6
     in_channels = 2
@@ -387,8 +457,42 @@ def _test_crossnet_openunmix():
     print(model.num_parameters)
     print(input.size(), output.size())
 
+def _test_streaming_crossnet_openunmix():
+    batch_size = 2
+    in_channels = 2
+    n_fft = 512
+    n_bins, max_bin = n_fft // 2 + 1, 200
+    n_frames, block_size = 50, 16
+
+    input = torch.randn(batch_size, 1, in_channels, n_bins, n_frames, dtype=torch.cfloat)
+
+    base_model = CrossNetOpenUnmix(in_channels=in_channels, hidden_channels=64, n_bins=n_bins, max_bin=max_bin, causal=True)
+    model = CrossNetOpenUnmixStreamingWrapper(base_model, forgetting_factor=0.95)
+    base_model.eval()
+
+    with torch.no_grad():
+        # Full sequence by causal model, then online Wiener filter with same blocks
+        estimated_amplitude = base_model(torch.abs(input))
+        wiener_filter = OnlineMultichannelWienerFilter(forgetting_factor=0.95)
+        output, streaming_output = [], []
+
+        for start_idx in range(0, n_frames, block_size):
+            end_idx = min(start_idx + block_size, n_frames)
+            output.append(wiener_filter(input[..., start_idx:end_idx], estimated_amplitude[..., start_idx:end_idx]))
+            streaming_output.append(model(input[..., start_idx:end_idx]))
+
+        output = torch.cat(output, dim=-1)
+        streaming_output = torch.cat(streaming_output, dim=-1)
+
+    print(input.size(), streaming_output.size())
+    print("Max absolute error: {}".format(torch.max(torch.abs(streaming_output - output)).item()))
+
 if __name__ == '__main__':
     torch.manual_seed(111)
 
     print("="*10, "Cross-Net Open-Unmix (X-UMX)", "="*10)
-    _test_crossnet_openunmix()
\ No newline at end of file
+    _test_crossnet_openunmix()
+    print()
+
+    print("="*10, "Streaming Cross-Net Open-Unmix", "="*10)
+    _test_streaming_crossnet_openunmix()
\ No newline at end of file
@@ -357,8 +357,10 @@ class QuantizableConvTranspose2d(nn.Module):
     def forward(self, input):
         (Kh, Kw), (Sh, Sw) = self.kernel_size, self.stride
 
-        input_pad = F.pad(input.unsqueeze(dim=-1), (0, Sw - 1, 0, Sh - 1))
-        input_pad = input_pad.view(*input_pad.size()[:-2], -1)
+        input_pad = F.pad(input.unsqueeze(dim=-1), (0, Sw - 1))
+        input_pad = input_pad.view(*input_pad.size()[:-2], -1) # (batch_size, in_channels, H, W * Sw)
+        input_pad = F.pad(input_pad.unsqueeze(dim=-2), (0, 0, 0, Sh - 1))
+        input_pad = input_pad.view(*input_pad.size()[:-3], -1, input_pad.size(-1)) # (batch_size, in_channels, H * Sh, W * Sw)
         input_pad = F.pad(input_pad, (Kw - 1, Kw - Sw, Kh - 1, Kh - Sh))
 
         output = self.backend(input_pad)
@@ -94,6 +94,62 @@ class CumulativeLayerNorm1d(nn.Module):
 
         return output
 
+    def init_state(self, batch_size=1):
+        """
+        Args:
+            batch_size <int>: Batch size of streaming input.
+        Returns:
+            state <dict>: Running statistics for `forward_step`.
+        """
+        factory_kwargs = {
+            'device': self.gamma.device,
+            'dtype': self.gamma.dtype
+        }
+        state = {
+            'cum_sum': torch.zeros((batch_size,), **factory_kwargs),
+            'cum_squared_sum': torch.zeros((batch_size,), **factory_kwargs),
+            'n_frames': 0
+        }
+
+        return state
+
+    def forward_step(self, input, state):
+        """
+        Streaming version of `forward`. Cumulative statistics are carried by `state`, so calling forward_step block by block gives the same output as forward on the concatenated input.
+        Args:
+            input (batch_size, C, T): Block of input.
+            state <dict>: Running statistics returned by `init_state` or previous `forward_step`.
+        Returns:
+            output (batch_size, C, T): Same shape as the input.
+            state <dict>: Updated running statistics.
+        """
+        eps = self.eps
+
+        _, C, T = input.size()
+        n_frames = state['n_frames']
+
+        step_sum = torch.sum(input, dim=1) # (batch_size, T)
+        step_squared_sum = torch.sum(input**2, dim=1) # (batch_size, T)
+        cum_sum = state['cum_sum'].unsqueeze(dim=1) + torch.cumsum(step_sum, dim=1) # (batch_size, T)
+        cum_squared_sum = state['cum_squared_sum'].unsqueeze(dim=1) + torch.cumsum(step_squared_sum, dim=1) # (batch_size, T)
+
+        cum_num = torch.arange(C * (n_frames + 1), C * (n_frames + T + 1), C, dtype=input.dtype, device=input.device) # (T, )
+        cum_mean = cum_sum / cum_num # (batch_size, T)
+        cum_squared_mean = cum_squared_sum / cum_num
+        cum_var = cum_squared_mean - cum_mean**2
+
+        cum_mean, cum_var = cum_mean.unsqueeze(dim=1), cum_var.unsqueeze(dim=1)
+
+        output = (input - cum_mean) / (torch.sqrt(cum_var) + eps) * self.gamma + self.beta
+
+        state = {
+            'cum_sum': cum_sum[:, -1],
+            'cum_squared_sum': cum_squared_sum[:, -1],
+            'n_frames': n_frames + T
+        }
+
+        return output, state
+
     def __repr__(self):
         s = '{}'.format(self.__class__.__name__)
         s += '({num_features}, eps={eps})'
@@ -1,3 +1,4 @@
+import math
 import subprocess
 
 import numpy as np
@@ -42,6 +43,27 @@ def build_optimal_window(window, hop_length=None):
 
     return optimal_window
 
+def build_Fourier_bases(n_fft, normalize=False):
+    """
+    Args:
+        n_fft <int>:
+        normalize <bool>:
+    """
+    k = torch.arange(0, n_fft, dtype=torch.long)
+    n = torch.arange(0, n_fft, dtype=torch.long)
+    k, n = torch.meshgrid(k, n, indexing='ij')
+    kn = (k * n) % n_fft # to keep precision of phase for large n_fft
+
+    cos_bases = torch.cos(2*math.pi*kn/n_fft)
+    sin_bases = torch.sin(2*math.pi*kn/n_fft)
+
+    if normalize:
+        norm = math.sqrt(n_fft)
+        cos_bases = cos_bases / norm
+        sin_bases = sin_bases / norm
+
+    return cos_bases, sin_bases
+
 def load_midi(midi_path, sample_rate, hop_length, frame_offset=0, num_frames=-1, load_type="piano_roll", dtype=torch.uint8):
     assert load_type in ["pianoroll", "piano_roll"]
 
@@ -1,5 +1,24 @@
+import os
+import copy
+import pickle
+import inspect
+import warnings
+import functools
+import contextlib
+from collections import OrderedDict
+
+import torch
 import torch.nn as nn
 
+EPS = 1e-12
+TRAINING_KEYS = ['optim_dict', 'scheduler_dict', 'train_loss', 'valid_loss', 'best_loss', 'no_improvement']
+INFERENCE_SUFFIX = ".inference"
+CHECKPOINT_CACHE_SIZE = 8
+PRETRAINED_CACHE_SIZE = 4
+
+_checkpoint_cache = OrderedDict()
+_pretrained_cache = OrderedDict()
+
 def choose_nonlinear(name, **kwargs):
     if name == 'relu':
         nonlinear = nn.ReLU()
@@ -29,4 +48,296 @@ def choose_rnn(name, **kwargs):
     else:
         raise NotImplementedError("Invalid RNN is specified. Choose 'rnn', 'lstm', or 'gru' instead of {}.".format(name))
     
-    return rnn
\ No newline at end of file
+    return rnn
+
+def choose_autocast(dtype, device_type='cpu'):
+    """
+    Context manager to run model body in reduced precision.
+    STFT, iSTFT, and Wiener filter should be computed outside of it, i.e. in fp32.
+    Args:
+        dtype <str>: 'fp32', 'bf16', or 'fp16'.
+        device_type <str>: 'cpu' or 'cuda'.
+    """
+    if dtype == 'fp32':
+        return contextlib.nullcontext()
+    elif dtype == 'bf16':
+        return torch.autocast(device_type, dtype=torch.bfloat16)
+    elif dtype == 'fp16':
+        return torch.autocast(device_type, dtype=torch.float16)
+    else:
+        raise NotImplementedError("Invalid dtype is specified. Choose 'fp32', 'bf16', or 'fp16' instead of {}.".format(dtype))
+
+def estimate_sources_amplitude_by_patch(model, mixture_amplitude, sources, batch_size=None, memory_budget=None, dtype='fp32'):
+    """
+    Estimate amplitude spectrograms of all targets patch by patch. Patches are fed to the model in mini-batches instead of one by one.
+    Args:
+        model <nn.Module>: Parallel model, which accepts `target` as keyword argument. Can be wrapped by nn.DataParallel.
+        mixture_amplitude <torch.Tensor>: (n_patches, 1, n_mics, n_bins, n_frames)
+        sources <list<str>>: Target sources.
+        batch_size <int>: Maximum number of patches in one forward computation. If None or 0, all patches are processed at once.
+        memory_budget <float>: Memory budget [MiB] of input and estimated patches in one forward computation. If None or 0, memory budget is not considered.
+        dtype <str>: Precision of model body. 'fp32', 'bf16', or 'fp16'. Input and output are fp32.
+    Returns:
+        estimated_sources_amplitude <torch.Tensor>: (n_sources, n_patches, n_mics, n_bins, n_frames)
+    """
+    n_patches, _, n_mics, n_bins, n_frames = mixture_amplitude.size()
+    mixture_amplitude = mixture_amplitude.view(n_patches, n_mics, n_bins, n_frames)
+
+    if not batch_size:
+        batch_size = n_patches
+
+    if memory_budget:
+        bytes_per_patch = 2 * n_mics * n_bins * n_frames * mixture_amplitude.element_size() # input and output
+        batch_size = min(batch_size, max(int(memory_budget * 2**20) // bytes_per_patch, 1))
+
+    estimated_sources_amplitude = []
+
+    for target in sources:
+        _estimated_sources_amplitude = []
+
+        for _mixture_amplitude in torch.split(mixture_amplitude, batch_size, dim=0):
+            # _mixture_amplitude: (batch_size, n_mics, n_bins, n_frames)
+            with choose_autocast(dtype, device_type=_mixture_amplitude.device.type):
+                _estimated_source_amplitude = model(_mixture_amplitude, target=target)
+            _estimated_sources_amplitude.append(_estimated_source_amplitude.float())
+
+        _estimated_sources_amplitude = torch.cat(_estimated_sources_amplitude, dim=0) # (n_patches, n_mics, n_bins, n_frames)
+        estimated_sources_amplitude.append(_estimated_sources_amplitude)
+
+    estimated_sources_amplitude = torch.stack(estimated_sources_amplitude, dim=0) # (n_sources, n_patches, n_mics, n_bins, n_frames)
+
+    return estimated_sources_amplitude
+
+def quantize_dynamic(model, backend=None, dtype=torch.qint8):
+    """
+    Post training dynamic quantization of RNNs and fully connected layers.
+    Weights are stored in int8, and activations are quantized on the fly. Calibration data is not required.
+    Quantization is applied to copy of model, so given float model is still available.
+    Args:
+        model <nn.Module>: Float model.
+        backend <str>: Quantization backend. 'fbgemm' (x86) or 'qnnpack' (ARM). If None, current engine is used.
+        dtype <torch.dtype>: torch.qint8 or torch.float16.
+    Returns:
+        model <nn.Module>: Quantized model. Only CPU is supported.
+    """
+    if backend is not None:
+        torch.backends.quantized.engine = backend
+
+    model = copy.deepcopy(model)
+    model.cpu()
+    model.eval()
+
+    model = torch.quantization.quantize_dynamic(model, {nn.LSTM, nn.GRU, nn.Linear}, dtype=dtype, inplace=True)
+    model.backend = torch.backends.quantized.engine
+
+    return model
+
+def quantize_static(model, calibration_data=None, backend='fbgemm'):
+    """
+    Post training static quantization of model which has QuantStub and DeQuantStub.
+    Quantization is applied to copy of model, so given float model is still available.
+    Args:
+        model <nn.Module>: Quantizable float model.
+        calibration_data <iterable<torch.Tensor>>: Inputs for calibration. If None, observers are not calibrated, which is used to build structure of int8 model.
+        backend <str>: 'fbgemm' (x86) or 'qnnpack' (ARM).
+    Returns:
+        model <nn.Module>: Quantized model. Only CPU is supported.
+    """
+    torch.backends.quantized.engine = backend
+
+    model = copy.deepcopy(model)
+    model.cpu()
+    model.eval()
+    model.qconfig = torch.quantization.get_default_qconfig(backend)
+
+    torch.quantization.prepare(model, inplace=True)
+
+    if calibration_data is not None:
+        with torch.no_grad():
+            for input in calibration_data:
+                model(input)
+
+    torch.quantization.convert(model, inplace=True)
+    model.backend = backend
+
+    return model
+
+def build_quantizable_state_dict(model, eps=EPS):
+    """
+    Convert state_dict of float model (e.g. D3Net, MDenseNet) for its quantizable counterpart.
+    Scaling of input and output is replaced with depthwise nn.Conv1d (affine_in and affine_out),
+    and nn.ConvTranspose2d is replaced with nn.Conv2d applied to zero-inserted input.
+    Args:
+        model <nn.Module>: Float model which has scale_in, bias_in, scale_out, and bias_out.
+        eps <float>: Small value used by model in scaling of input.
+    Returns:
+        state_dict <dict>: state_dict of quantizable model.
+    """
+    state_dict = {}
+
+    for key, value in model.state_dict().items():
+        if key in ['scale_in', 'bias_in', 'scale_out', 'bias_out']:
+            continue
+
+        if 'upsample2d.' in key:
+            # nn.ConvTranspose2d -> nn.Conv2d applied to zero-inserted input
+            key = key.replace('upsample2d.', 'upsample2d.backend.')
+
+            if key.endswith('.weight'):
+                value = torch.flip(value.transpose(0, 1), dims=(2, 3))
+
+        state_dict[key] = value
+
+    scale_in = torch.abs(model.scale_in.data) + eps
+    state_dict['affine_in.weight'] = (1 / scale_in).view(-1, 1, 1)
+    state_dict['affine_in.bias'] = - model.bias_in.data / scale_in
+    state_dict['affine_out.weight'] = model.scale_out.data.view(-1, 1, 1)
+    state_dict['affine_out.bias'] = model.bias_out.data
+
+    return state_dict
+
+def export_model(model, path, example_input, format='torchscript', opset_version=17):
+    """
+    Export model by TorchScript or ONNX.
+    Use Exportable*TimeDomainWrapper to export waveform-in, waveform-out graph including STFT and iSTFT.
+    Args:
+        model <nn.Module>: Model to be exported.
+        path <str>: Path to save exported model.
+        example_input <torch.Tensor>: Example input used for tracing. First and last dimensions (batch size and length) are dynamic in exported model.
+        format <str>: 'torchscript' or 'onnx'.
+        opset_version <int>: Opset version of ONNX.
+    """
+    model.eval()
+
+    with torch.no_grad():
+        if format == 'torchscript':
+            traced_model = torch.jit.trace(model, example_input)
+            traced_model.save(path)
+        elif format == 'onnx':
+            dynamic_axes = {
+                'input': {0: 'batch_size', example_input.dim() - 1: 'length'},
+                'output': {0: 'batch_size', example_input.dim() - 1: 'length'}
+            }
+            kwargs = {}
+
+            if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+                kwargs['dynamo'] = False # Use TorchScript based exporter, which supports RNNs with dynamic length.
+
+            torch.onnx.export(model, (example_input,), path, input_names=['input'], output_names=['output'], dynamic_axes=dynamic_axes, opset_version=opset_version, **kwargs)
+        else:
+            raise ValueError("Not support format={}.".format(format))
+
+
+def save_inference_checkpoint(model_path, inference_path=None):
+    """
+    Save weights-only checkpoint for inference. Training states (optimizer, loss histories, ...) are dropped.
+    Args:
+        model_path <str>: Path to checkpoint saved by training.
+        inference_path <str>: Path to save. If None, <model_path without extension>.inference.pth is used, which is preferred by load_checkpoint.
+    Returns:
+        inference_path <str>: Path to saved checkpoint.
+    """
+    if inference_path is None:
+        root, ext = os.path.splitext(model_path)
+        inference_path = root + INFERENCE_SUFFIX + ext
+
+    config = torch.load(model_path, map_location=lambda storage, loc: storage)
+
+    if isinstance(config, dict):
+        for key in TRAINING_KEYS:
+            config.pop(key, None)
+
+    torch.save(config, inference_path) # zipfile format, which is able to be memory-mapped.
+
+    return inference_path
+
+def load_checkpoint(model_path, weights_only=True):
+    """
+    Load checkpoint on CPU for inference.
+    If <model_path without extension>.inference.pth made by save_inference_checkpoint exists, it is memory-mapped instead of model_path.
+    Loaded checkpoints are cached by path and modification time, so build_from_pretrained and build_model read each file only once.
+    Args:
+        model_path <str>: Path to checkpoint.
+        weights_only <bool>: If True, only tensors and primitive types are unpickled.
+            Set False only for trusted checkpoints which need full unpickling, e.g. packed parameters of dynamically quantized RNNs.
+    Returns:
+        config <dict>: Checkpoint without training states. Do not modify it in place, because it is shared by cache.
+    """
+    root, ext = os.path.splitext(model_path)
+    inference_path = root + INFERENCE_SUFFIX + ext
+
+    if os.path.exists(inference_path) and (not os.path.exists(model_path) or os.path.getmtime(inference_path) >= os.path.getmtime(model_path)):
+        model_path, mmap = inference_path, True
+    else:
+        mmap = False
+
+    stat = os.stat(model_path)
+    key = (os.path.abspath(model_path), stat.st_mtime_ns, stat.st_size, weights_only)
+
+    if key in _checkpoint_cache:
+        _checkpoint_cache.move_to_end(key)
+        return _checkpoint_cache[key]
+
+    parameters = inspect.signature(torch.load).parameters
+    kwargs = {}
+
+    if mmap and 'mmap' in parameters:
+        kwargs['mmap'] = True
+
+    if 'weights_only' in parameters:
+        if not weights_only:
+            warnings.warn("{} is loaded with weights_only=False, which can execute arbitrary code. Load only trusted checkpoints.".format(model_path))
+
+        try:
+            config = torch.load(model_path, map_location=lambda storage, loc: storage, weights_only=weights_only, **kwargs)
+        except pickle.UnpicklingError as e:
+            raise pickle.UnpicklingError("Cannot load {} with weights_only=True. If it is trusted (e.g. dynamically quantized model), pass weights_only=False.".format(model_path)) from e
+    else:
+        config = torch.load(model_path, map_location=lambda storage, loc: storage, **kwargs)
+
+    if isinstance(config, dict):
+        for key_training in TRAINING_KEYS:
+            config.pop(key_training, None)
+
+    _checkpoint_cache[key] = config
+
+    if len(_checkpoint_cache) > CHECKPOINT_CACHE_SIZE:
+        _checkpoint_cache.popitem(last=False)
+
+    return config
+
+def cached_pretrained(build_from_pretrained):
+    """
+    Decorator of build_from_pretrained. Built models are kept in LRU cache keyed by class and arguments (task, config, sample_rate, model_choice, ...).
+    Each call returns a copy of cached model, so callers can modify it (e.g. fine-tuning, .cuda(), .train()) without affecting others.
+    Pass cache=False to build new model without caching.
+    """
+    @functools.wraps(build_from_pretrained)
+    def _build_from_pretrained(cls, *args, cache=True, **kwargs):
+        if not cache:
+            return build_from_pretrained(cls, *args, **kwargs)
+
+        key = (cls.__module__, cls.__qualname__, args, tuple(sorted(kwargs.items())))
+
+        try:
+            hash(key)
+        except TypeError:
+            return build_from_pretrained(cls, *args, **kwargs)
+
+        if key in _pretrained_cache:
+            _pretrained_cache.move_to_end(key)
+            return copy.deepcopy(_pretrained_cache[key])
+
+        model = build_from_pretrained(cls, *args, **kwargs)
+        _pretrained_cache[key] = model
+
+        if len(_pretrained_cache) > PRETRAINED_CACHE_SIZE:
+            _pretrained_cache.popitem(last=False)
+
+        return copy.deepcopy(model)
+
+    return _build_from_pretrained
+
+def clear_cache():
+    _checkpoint_cache.clear()
+    _pretrained_cache.clear()
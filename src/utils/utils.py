@@ -33,7 +33,13 @@ def draw_loss_curve(train_loss, valid_loss=None, save_path='./loss.png'):
     plt.savefig(save_path, bbox_inches='tight')
     plt.close()
 
-def download_pretrained_model_from_google_drive(model_id, path="./tmp", quiet=False, remove_zip=True):
+def download_pretrained_model_from_google_drive(model_id, path="./tmp", quiet=False, remove_zip=True, save_inference=True):
+    """
+    Args:
+        model_id <str>: File ID of zip file on Google Drive.
+        path <str>: Directory to extract zip file.
+        save_inference <bool>: If True, weights-only checkpoints (<name>.inference.pth) are saved next to extracted checkpoints for faster loading.
+    """
     import gdown
 
     tmp_ID = str(uuid.uuid4())
@@ -44,4 +50,12 @@ def download_pretrained_model_from_google_drive(model_id, path="./tmp", quiet=Fa
         f.extractall(path)
     
     if remove_zip:
-        os.remove(zip_path)
\ No newline at end of file
+        os.remove(zip_path)
+
+    if save_inference:
+        from utils.model import INFERENCE_SUFFIX, save_inference_checkpoint
+
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                if filename.endswith(".pth") and not filename.endswith(INFERENCE_SUFFIX + ".pth"):
+                    save_inference_checkpoint(os.path.join(root, filename))
\ No newline at end of file
@@ -30,24 +30,9 @@ def inv_mu_law_compand(y, mu=255):
     return np.sign(y) * ((1 + mu)**np.abs(y) - 1) / mu
 
 def build_Fourier_bases(n_fft, normalize=False):
-    """
-    Args:
-        n_fft <int>:
-        normalize <bool>:
-    """
-    k = torch.arange(0, n_fft, dtype=torch.float)
-    n = torch.arange(0, n_fft, dtype=torch.float)
-    k, n = torch.meshgrid(k, n)
+    warnings.warn("Use utils.audio.build_Fourier_bases instead.", DeprecationWarning)
 
-    cos_bases = torch.cos(2*math.pi*k*n/n_fft)
-    sin_bases = torch.sin(2*math.pi*k*n/n_fft)
-    
-    if normalize:
-        norm = math.sqrt(n_fft)
-        cos_bases = cos_bases / norm
-        sin_bases = sin_bases / norm
-    
-    return cos_bases, sin_bases
+    return backend.build_Fourier_bases(n_fft, normalize=normalize)
     
 def build_window(n_fft, window_fn='hann', **kwargs):
     warnings.warn("Use utils.audio.build_window instead.", DeprecationWarning)